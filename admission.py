@@ -0,0 +1,175 @@
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+from redis.exceptions import RedisError
+import metrics
+from redis_client import get_async_redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Chat turns (LLM-bound work) each worker runs at once; 0 disables the limit
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "32"))
+# Turns that may wait for a free slot; beyond that requests get a 503 at once
+MAX_QUEUED_TURNS = int(os.getenv("MAX_QUEUED_TURNS", "64"))
+# Seconds a queued turn waits for a slot before giving up with a 503
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+# Retry-After sent with 503s
+OVERLOAD_RETRY_AFTER = int(os.getenv("OVERLOAD_RETRY_AFTER", "2"))
+
+# Token buckets shared by every worker through Redis: sustained requests per
+# minute and burst size, per session and per client IP; 0 disables either
+SESSION_RATE_LIMIT = float(os.getenv("SESSION_RATE_LIMIT", "20"))
+SESSION_RATE_BURST = int(os.getenv("SESSION_RATE_BURST", "5"))
+IP_RATE_LIMIT = float(os.getenv("IP_RATE_LIMIT", "120"))
+IP_RATE_BURST = int(os.getenv("IP_RATE_BURST", "30"))
+
+RATE_KEY_PREFIX = "rate_limit:"
+
+REJECTED_REQUESTS = metrics.Counter(
+    "chatbot_rejected_requests_total",
+    "Requests turned away by admission control.",
+    ["reason"],
+)
+
+# Refills the bucket for the time since it was last used, then takes a token.
+# Uses the Redis clock so workers with skewed clocks agree. Returns
+# {allowed, seconds until a token is available}; Lua numbers would be
+# truncated to integers, hence the string.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait = 0, (1 - tokens) / rate
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed, wait = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+class RequestRejected(Exception):
+    """A request turned away before any work; maps to an HTTP error with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Permit:
+    """One held concurrency slot; releasing it twice is harmless."""
+
+    def __init__(self, release=None):
+        self._release = release
+
+    def release(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the turns running at once in this worker. Up to `queue_size` more
+    wait (at most `queue_timeout` seconds) for a slot; anything beyond is
+    rejected straight away so overload shows up as fast 503s rather than
+    every request timing out together.
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        # A semaphore belongs to the event loop that first waits on it
+        self._loop = None
+        self._semaphore = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def _reject(self, reason: str, detail: str):
+        REJECTED_REQUESTS.inc(reason=reason)
+        return RequestRejected(503, detail, OVERLOAD_RETRY_AFTER)
+
+    async def acquire(self) -> Permit:
+        if self.limit <= 0:
+            return Permit()
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.queue_size:
+            raise self._reject("queue_full", "Server is busy, please retry shortly")
+
+        self.waiting += 1
+        try:
+            with metrics.timed(metrics.STAGE_SECONDS, stage="queue"):
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout", "Server is busy, please retry shortly")
+        finally:
+            self.waiting -= 1
+        return Permit(semaphore.release)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a slot for the block."""
+        permit = await self.acquire()
+        try:
+            yield
+        finally:
+            permit.release()
+
+
+limiter = ConcurrencyLimiter(MAX_CONCURRENT_TURNS, MAX_QUEUED_TURNS, QUEUE_TIMEOUT)
+
+
+async def _take_token(redis_url: str, key: str, per_minute: float, burst: int):
+    """Returns (allowed, seconds until the bucket has a token)."""
+    client = get_async_redis(redis_url)
+    allowed, wait = await client.register_script(TOKEN_BUCKET_SCRIPT)(
+        keys=[RATE_KEY_PREFIX + key], args=[per_minute / 60, burst]
+    )
+    return bool(int(allowed)), float(wait)
+
+
+async def check_rate_limits(
+    session_id: Optional[str], client_ip: Optional[str], redis_url: str
+):
+    """
+    Takes a token from the session's and the client's buckets, or raises a
+    429. Pass None for either to skip its bucket.
+    """
+    buckets = [
+        ("session", session_id, SESSION_RATE_LIMIT, SESSION_RATE_BURST),
+        ("ip", client_ip, IP_RATE_LIMIT, IP_RATE_BURST),
+    ]
+    for scope, value, per_minute, burst in buckets:
+        if per_minute <= 0 or not value:
+            continue
+        try:
+            allowed, wait = await _take_token(
+                redis_url, f"{scope}:{value}", per_minute, burst
+            )
+        except RedisError as e:
+            # Rate limiting is best-effort; a Redis outage shouldn't stop chat
+            print(f"Rate limit check failed: {e}")
+            return
+        if not allowed:
+            REJECTED_REQUESTS.inc(reason=f"rate_limit_{scope}")
+            raise RequestRejected(
+                429, f"Rate limit exceeded ({scope}), please slow down", wait
+            )
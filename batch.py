@@ -0,0 +1,148 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, List, NamedTuple, Sequence
+from langchain_core.messages import HumanMessage
+from admission import RequestRejected, check_rate_limits, limiter
+from chatbot import SUMMARY_ENABLED, arun_turn
+from history import (
+    HISTORY_WRITE_BEHIND,
+    AsyncRedisChatMessageHistory,
+    aload_histories,
+    asave_turns,
+    history_writer,
+)
+from session_guard import SESSION_BUSY_DETAIL, SessionBusyError, session_lock
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Most messages one /chat/batch request may carry
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "1000"))
+# Turns of one batch running at once
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "16"))
+# Turns sharing one pipelined history read and one pipelined write. Their
+# sessions stay locked until the whole chunk is saved (or queued, with
+# HISTORY_WRITE_BEHIND).
+CHAT_BATCH_CHUNK_SIZE = int(os.getenv("CHAT_BATCH_CHUNK_SIZE", "8"))
+
+
+class BatchItem(NamedTuple):
+    index: int
+    session_id: str
+    message: str
+
+
+def _error(item: BatchItem, status: int, detail: str) -> dict:
+    return {
+        "index": item.index,
+        "session_id": item.session_id,
+        "status": status,
+        "error": detail,
+    }
+
+
+def waves(items: Sequence[BatchItem]) -> List[List[BatchItem]]:
+    """
+    Groups items so each session appears at most once per wave: wave k holds
+    every session's k-th message. Waves run one after another, so a
+    session's messages are answered in order, each seeing the previous one.
+    """
+    grouped, seen = [], {}
+    for item in items:
+        position = seen.get(item.session_id, 0)
+        seen[item.session_id] = position + 1
+        if position == len(grouped):
+            grouped.append([])
+        grouped[position].append(item)
+    return grouped
+
+
+async def _answer(item: BatchItem, loaded, redis_url: str):
+    async def load_history():
+        return loaded
+
+    await check_rate_limits(item.session_id, None, redis_url)
+    async with limiter.slot():
+        return await arun_turn(
+            item.session_id, HumanMessage(content=item.message), load_history
+        )
+
+
+async def _run_chunk(chunk: Sequence[BatchItem], redis_url: str) -> List[dict]:
+    """Answers a chunk of distinct sessions with one history read and one write."""
+    results = {}
+    async with AsyncExitStack() as locks:
+        held = []
+        # A fixed order keeps two batches from each holding a lock the other needs
+        for item in sorted(chunk, key=lambda item: item.session_id):
+            try:
+                await locks.enter_async_context(
+                    session_lock(item.session_id, redis_url)
+                )
+                held.append(item)
+            except SessionBusyError:
+                results[item.index] = _error(item, 409, SESSION_BUSY_DETAIL)
+
+        histories = [
+            AsyncRedisChatMessageHistory(item.session_id, url=redis_url)
+            for item in held
+        ]
+        loaded = await aload_histories(histories, whole=SUMMARY_ENABLED)
+        outcomes = await asyncio.gather(
+            *(_answer(item, history, redis_url) for item, history in zip(held, loaded)),
+            return_exceptions=True,
+        )
+
+        turns = []
+        for item, history, outcome in zip(held, histories, outcomes):
+            if isinstance(outcome, RequestRejected):
+                results[item.index] = _error(item, outcome.status_code, outcome.detail)
+                continue
+            if isinstance(outcome, Exception):
+                results[item.index] = _error(item, 500, str(outcome))
+                continue
+            result, keep = outcome
+            final_message = result["messages"][-1]
+            summary = (result["summary"], keep) if keep is not None else None
+            turns.append(
+                (history, [HumanMessage(content=item.message), final_message], summary)
+            )
+            results[item.index] = {
+                "index": item.index,
+                "session_id": item.session_id,
+                "response": final_message.content,
+            }
+        if HISTORY_WRITE_BEHIND:
+            await history_writer.submit(turns)
+        else:
+            await asave_turns(turns)
+    return [results[item.index] for item in chunk]
+
+
+async def arun_batch(items: Sequence[BatchItem], redis_url: str) -> AsyncIterator[dict]:
+    """
+    Answers every item, yielding results (with their `index`) chunk by chunk
+    as each is saved. An item that fails gets `status` and `error` instead
+    of `response` without affecting the others.
+    """
+    chunk_size = max(1, min(CHAT_BATCH_CHUNK_SIZE, CHAT_BATCH_CONCURRENCY))
+    running = asyncio.Semaphore(max(1, CHAT_BATCH_CONCURRENCY // chunk_size))
+
+    async def run(chunk):
+        async with running:
+            return await _run_chunk(chunk, redis_url)
+
+    for wave in waves(items):
+        tasks = [
+            asyncio.ensure_future(run(wave[start : start + chunk_size]))
+            for start in range(0, len(wave), chunk_size)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            # The client went away; don't keep answering for nobody
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,422 @@
+"""
+Offline load test for the chat API.
+
+Runs the real FastAPI app and LangGraph graph in-process against local
+stand-ins: a scripted fake chat model with configurable latency, fakeredis
+for history, mongomock for the inventory and an httpx stub of the Node
+backend. Reports p50/p95/p99 latency and requests/sec for concurrent
+sessions, and compares them with a stored baseline.
+
+    python -m benchmarks.harness                    # run and print results
+    python -m benchmarks.harness --save-baseline    # record a new baseline
+    python -m benchmarks.harness --check            # exit 1 on regression
+    python -m benchmarks.harness --scaling 1,2,4    # throughput per worker count
+
+With --workers N (and for every point of --scaling) the sessions are split
+across N processes, each running its own copy of the app the way `uvicorn
+--workers N` does. The processes share one fakeredis server over TCP, with
+the Redis-backed inventory snapshot and response cache turned on, as in a
+multi-worker deployment. Session locks and rate limits stay off because
+fakeredis can't run their Lua scripts.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+# main refuses to start without these; nothing connects to them here
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/benchmark")
+
+import httpx
+import mongomock
+from fakeredis import TcpFakeServer, aioredis as fake_aioredis
+import fakeredis
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCHMARK_DIR / "baseline.json"
+RESULTS_PATH = BENCHMARK_DIR / "results" / "latest.json"
+SCALING_PATH = BENCHMARK_DIR / "results" / "scaling.json"
+
+SWEETS = [
+    {"name": "Gulab Jamun", "price": 25.5, "quantity": 10_000, "category": "syrup"},
+    {"name": "Rasgulla", "price": 20.0, "quantity": 10_000, "category": "syrup"},
+    {"name": "Kaju Katli", "price": 45.0, "quantity": 10_000, "category": "barfi"},
+    {"name": "Ladoo", "price": 15.0, "quantity": 10_000, "category": "ladoo"},
+]
+
+# One session's turns: a fast-path question, a tool-using question and a purchase
+SCRIPT = [
+    "What sweets do you have?",
+    "Which sweet would you recommend for a party?",
+    "Please buy 2 Gulab Jamun for me",
+]
+
+# Settings every worker process starts with, besides REDIS_URL
+SHARED_STORE_ENV = {
+    "INVENTORY_CACHE_BACKEND": "redis",
+    "RESPONSE_CACHE_ENABLED": "true",
+    "RESPONSE_CACHE_BACKEND": "redis",
+}
+
+
+@dataclass
+class BenchmarkConfig:
+    sessions: int = 20
+    turns: int = 3
+    llm_latency: float = 0.05
+    backend_latency: float = 0.01
+    workers: int = 1
+
+
+@dataclass
+class BenchmarkResult:
+    requests: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    requests_per_second: float
+
+
+# Unique tool call IDs across every session
+_call_ids = itertools.count()
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the OpenAI model. A customer message gets a
+    tool call (buy_sweet when it mentions buying, get_available_sweets
+    otherwise); a tool result gets a final answer. Each call sleeps for
+    `latency` seconds to simulate the API round trip.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            first_line = str(last.content).splitlines()[0]
+            return AIMessage(content=f"Done! {first_line}")
+        text = str(last.content).lower() if isinstance(last, HumanMessage) else ""
+        if "buy" in text:
+            call = {
+                "name": "buy_sweet",
+                "args": {"sweet_name": "Gulab Jamun", "quantity": 2},
+            }
+        else:
+            call = {"name": "get_available_sweets", "args": {}}
+        call["id"] = f"call_{next(_call_ids)}"
+        return AIMessage(content="", tool_calls=[call])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+class AsyncCollection:
+    """The slice of pymongo's async collection API the app uses, over mongomock."""
+
+    class _Cursor:
+        def __init__(self, documents):
+            self._documents = documents
+
+        async def to_list(self, length=None):
+            return self._documents
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.database = self
+
+    def find(self, *args, **kwargs):
+        return self._Cursor(list(self._collection.find(*args, **kwargs)))
+
+    async def create_index(self, keys, **kwargs):
+        return self._collection.create_index(keys, **kwargs)
+
+    async def command(self, name, *args, **kwargs):
+        return {"ok": 1}
+
+
+def stub_backend(latency: float) -> httpx.MockTransport:
+    """In-process stand-in for the Node backend's /search and /purchase routes."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path == "/search":
+            name = request.url.params.get("name", "")
+            return httpx.Response(200, json=[{"_id": "stub-id", "name": name}])
+        if request.url.path.startswith("/purchase/"):
+            return httpx.Response(200, json={"message": "Purchase successful"})
+        return httpx.Response(404, json={"message": "Not found"})
+
+    return httpx.MockTransport(handler)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(
+        int(round(percentile / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1
+    )
+    return sorted_values[index]
+
+
+async def _run_sessions(app, config: BenchmarkConfig, session_ids):
+    """Returns (latencies, errors, start, end) with wall-clock start and end."""
+    latencies, errors = [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def session(session_index: int):
+            nonlocal errors
+            for turn in range(config.turns):
+                message = SCRIPT[turn % len(SCRIPT)]
+                start = time.perf_counter()
+                response = await client.post(
+                    "/chat",
+                    json={"message": message, "session_id": f"bench-{session_index}"},
+                )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.time()
+        await asyncio.gather(*(session(i) for i in session_ids))
+        end = time.time()
+
+    return latencies, errors, start, end
+
+
+def _summarize(latencies: List[float], errors: int, elapsed: float):
+    latencies = sorted(latencies)
+    return BenchmarkResult(
+        requests=len(latencies),
+        errors=errors,
+        p50_ms=round(statistics.median(latencies) * 1000, 2),
+        p95_ms=round(_percentile(latencies, 95) * 1000, 2),
+        p99_ms=round(_percentile(latencies, 99) * 1000, 2),
+        requests_per_second=round(len(latencies) / elapsed, 2),
+    )
+
+
+def _run_app(config: BenchmarkConfig, session_ids, ready=None, shared=False):
+    """
+    Runs `session_ids` against an in-process app, after `ready` if given.
+    With `shared`, Redis is the server at REDIS_URL instead of a private
+    fakeredis; MongoDB stays a private mongomock, which is only read on
+    inventory cache misses (purchases go to the stub backend).
+    """
+    import chatbot
+    import database
+    import http_client
+    import main
+
+    collection = mongomock.MongoClient().benchmark.sweets
+    collection.insert_many([dict(sweet) for sweet in SWEETS])
+    redis_server = fakeredis.FakeServer()
+    model = ScriptedChatModel(latency=config.llm_latency)
+    backend = httpx.AsyncClient(
+        transport=stub_backend(config.backend_latency),
+        base_url=http_client.API_BASE_URL,
+    )
+
+    with ExitStack() as stack:
+        for target, value in [
+            ("chatbot.llm", model),
+            ("chatbot.llm_with_tools", model),
+            ("chatbot.llm_without_tool_calls", model),
+            ("database.sweets_collection", collection),
+            ("database.async_sweets_collection", AsyncCollection(collection)),
+            ("http_client._async_client", backend),
+            # fakeredis has no Lua, which Redis locks and rate limits need
+            ("session_guard.SESSION_REDIS_LOCK", False),
+            ("admission.SESSION_RATE_LIMIT", 0),
+            ("admission.IP_RATE_LIMIT", 0),
+        ]:
+            stack.enter_context(patch(target, value))
+        if not shared:
+            stack.enter_context(
+                patch(
+                    "history.get_async_redis",
+                    side_effect=lambda url: fake_aioredis.FakeRedis(
+                        server=redis_server
+                    ),
+                )
+            )
+        database.invalidate_inventory_cache()
+        # Compile outside the timed section, as the app's warm-up does
+        chatbot.get_agent_graph()
+        if ready is not None:
+            ready.wait()
+        return asyncio.run(_run_sessions(main.app, config, session_ids))
+
+
+def _worker(config: BenchmarkConfig, session_ids, ready, results):
+    results.put(_run_app(config, session_ids, ready, shared=True))
+
+
+def _run_workers(config: BenchmarkConfig) -> BenchmarkResult:
+    """Runs the sessions across `config.workers` processes sharing one Redis."""
+    redis_server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+    host, port = redis_server.server_address
+    env = {**SHARED_STORE_ENV, "REDIS_URL": f"redis://{host}:{port}/0"}
+
+    # Workers start together once all of them have built their app
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Barrier(config.workers), context.Queue()
+    processes = [
+        context.Process(
+            target=_worker,
+            args=(config, range(i, config.sessions, config.workers), ready, results),
+        )
+        for i in range(config.workers)
+    ]
+    try:
+        # Spawned processes read their settings from the environment at start
+        with patch.dict(os.environ, env):
+            for process in processes:
+                process.start()
+        runs = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        redis_server.shutdown()
+        redis_server.server_close()
+
+    latencies = [latency for run in runs for latency in run[0]]
+    elapsed = max(run[3] for run in runs) - min(run[2] for run in runs)
+    return _summarize(latencies, sum(run[1] for run in runs), elapsed)
+
+
+def run_benchmark(config: BenchmarkConfig = BenchmarkConfig()) -> BenchmarkResult:
+    """
+    Runs `config.sessions` concurrent sessions of `config.turns` turns each,
+    split across `config.workers` processes.
+    """
+    if config.workers <= 1:
+        latencies, errors, start, end = _run_app(config, range(config.sessions))
+        return _summarize(latencies, errors, end - start)
+    return _run_workers(config)
+
+
+def scaling_curve(config: BenchmarkConfig, worker_counts: List[int]) -> List[dict]:
+    """
+    Throughput and latency of the same load for each worker count. Every
+    point, one worker included, runs in worker processes on the shared store.
+    """
+    curve = []
+    for workers in worker_counts:
+        result = _run_workers(BenchmarkConfig(**{**asdict(config), "workers": workers}))
+        curve.append({"workers": workers, **asdict(result)})
+    return curve
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline`, allowing `tolerance` (e.g. 0.5)."""
+    problems = []
+    if result["errors"]:
+        problems.append(f"{result['errors']} requests failed")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        limit = baseline[key] * (1 + tolerance)
+        if result[key] > limit:
+            problems.append(
+                f"{key} {result[key]} > {limit:.2f} (baseline {baseline[key]})"
+            )
+    floor = baseline["requests_per_second"] * (1 - tolerance)
+    if result["requests_per_second"] < floor:
+        problems.append(
+            f"requests_per_second {result['requests_per_second']} < {floor:.2f} "
+            f"(baseline {baseline['requests_per_second']})"
+        )
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    defaults = BenchmarkConfig()
+    parser.add_argument("--sessions", type=int, default=defaults.sessions)
+    parser.add_argument("--turns", type=int, default=defaults.turns)
+    parser.add_argument("--llm-latency", type=float, default=defaults.llm_latency)
+    parser.add_argument(
+        "--backend-latency", type=float, default=defaults.backend_latency
+    )
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument(
+        "--scaling",
+        help="comma-separated worker counts to compare, e.g. 1,2,4",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    # Shared CI runners vary by ~20% between runs
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        sessions=args.sessions,
+        turns=args.turns,
+        llm_latency=args.llm_latency,
+        backend_latency=args.backend_latency,
+        workers=args.workers,
+    )
+    if args.scaling:
+        curve = scaling_curve(config, [int(n) for n in args.scaling.split(",")])
+        report = {"config": asdict(config), "cpus": os.cpu_count(), "curve": curve}
+        print(json.dumps(report, indent=2))
+        RESULTS_PATH.parent.mkdir(exist_ok=True)
+        SCALING_PATH.write_text(json.dumps(report, indent=2) + "\n")
+        return 0
+
+    result = asdict(run_benchmark(config))
+    report = {"config": asdict(config), "result": result}
+    print(json.dumps(report, indent=2))
+
+    RESULTS_PATH.parent.mkdir(exist_ok=True)
+    RESULTS_PATH.write_text(json.dumps(report, indent=2) + "\n")
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.check:
+        baseline = json.loads(BASELINE_PATH.read_text())
+        if baseline["config"] != report["config"]:
+            print("Baseline was recorded with a different configuration")
+            return 1
+        problems = compare(result, baseline["result"], args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
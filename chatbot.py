@@ -1,25 +1,63 @@
 import operator
 import os
-from typing import TypedDict, Annotated, Sequence, Optional
-from langchain_core.messages import BaseMessage, AIMessage
+import threading
+from typing import TypedDict, Annotated, NotRequired, Sequence, Optional
+from langchain_core.messages import BaseMessage, AIMessage, ToolMessage
 from langchain_openai import ChatOpenAI
-from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.runnables import RunnableLambda
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langgraph.prebuilt import ToolNode
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage
-from tools import buy_sweet, get_available_sweets
+from tools import (
+    buy_sweet,
+    buy_sweets,
+    get_available_sweets,
+    search_sweets,
+    with_timeout,
+)
+from history import (
+    HISTORY_WRITE_BEHIND,
+    AsyncRedisChatMessageHistory,
+    WindowedRedisChatMessageHistory,
+    history_writer,
+    recent_window,
+)
+from tokens import count_message_tokens
+import fast_path
+import metrics
+import response_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # --- 1. Define Tools and Agent State ---
-tools = [buy_sweet, get_available_sweets]
+# Every tool call is bounded by TOOL_TIMEOUT_SECONDS
+tools = [
+    with_timeout(buy_sweet, side_effects=True),
+    with_timeout(buy_sweets, side_effects=True),
+    with_timeout(get_available_sweets),
+    with_timeout(search_sweets),
+]
+
+# Maximum agent -> tools -> agent round trips per request
+MAX_AGENT_ITERATIONS = int(os.getenv("MAX_AGENT_ITERATIONS", "6"))
+# Parallel tool calls from one AI message on the sync path (async uses asyncio)
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
 
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
+    # Rolling summary of turns older than the ones in `messages`
+    summary: NotRequired[str]
+    # How many leading `messages` were folded into `summary` this turn
+    summarized_count: NotRequired[int]
+    # How many leading `messages` are stored history outside the prompt
+    # window; they are folded into `summary` before the agent runs
+    older_count: NotRequired[int]
+    # LLM calls made so far this turn
+    iterations: Annotated[int, operator.add]
 
 
 # --- 2. Define Graph Nodes ---
@@ -32,10 +70,12 @@ SYSTEM_PROMPT = """You are a helpful assistant for a sweet shop. Here are import
 2. **Role**: You help customers browse available sweets and process purchases.
 3. **Tools**: You have access to:
    - get_available_sweets: To check current inventory
+   - search_sweets: To look up only the sweets a question is about (by name, category, price range or stock, optionally sorted, e.g. the 3 cheapest)
    - buy_sweet: To process purchases
+   - buy_sweets: To purchase several different sweets in one order with a single call
 4. **Behavior**: Be friendly, helpful, and always confirm purchase details before processing.
 
-Always call get_available_sweets first to show available sweets and rely on that data, dont depend on data available in previous message history.
+Always check the inventory with get_available_sweets, or search_sweets when the customer asks about specific sweets, and rely on that data, dont depend on data available in previous message history.
 
 For purchased, in success message, always say user that purchase is successful, you can check dashboard that quantity is decreased. Because i am showing this app to someone, to whom i want that he/she notice that after purchase, quantity is decreased in dashboard.
 
@@ -43,24 +83,249 @@ Only give answer in plain text, no HTML or Markdown formatting.
 
 When showing prices, always use the ₹ symbol (e.g., ₹15.99) or mention "INR" to be clear about the currency."""
 
-llm = ChatOpenAI(model="gpt-4o")
-llm_with_tools = llm.bind_tools(tools)
+# Print each turn's LLM token usage (prompt, cached prompt, completion)
+LOG_TOKEN_USAGE = os.getenv("LOG_TOKEN_USAGE", "true").lower() == "true"
+
+# Rolling summarization of long sessions (off by default)
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+# Summarize once the unsummarized history exceeds this many tokens, or once
+# stored turns leave the prompt window (so none are trimmed unsummarized)
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "2000"))
+# Most recent messages always kept verbatim
+SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "6"))
+
+SUMMARY_PROMPT = """Summarize the conversation between a sweet shop assistant and a customer below.
+Keep customer preferences, sweets discussed, quantities, and purchases made or pending.
+Leave out stock levels and prices, they are always re-checked. Reply with the summary only.
+
+Summary so far:
+{summary}"""
+
+# --- Model tiers ---
+# The large model does everything unless MODEL_ROUTING is on. Then each step
+# uses the tier MODEL_TIERS gives it:
+#   route     - agent steps answering a customer message (usually picking tools)
+#   answer    - agent steps after tool results (usually the final answer)
+#   summarize - the summarize node
+LARGE, SMALL = "large", "small"
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "false").lower() == "true"
+LARGE_MODEL = os.getenv("LARGE_MODEL", "gpt-4o")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "gpt-4o-mini")
+# Re-ask the large model when the small one answers without calling a tool
+# (ambiguous or off-script questions) or makes a malformed tool call
+MODEL_ESCALATE = os.getenv("MODEL_ESCALATE", "true").lower() == "true"
+# Tags small-model runs so their tokens aren't streamed before we know
+# whether the reply will be kept
+SMALL_MODEL_TAG = "small_model"
+
+
+def _parse_model_tiers(spec: str):
+    """Parses "route=small,answer=large" over the defaults."""
+    tiers = {"route": SMALL, "answer": LARGE, "summarize": SMALL}
+    for rule in filter(None, (part.strip() for part in spec.split(","))):
+        step, _, tier = rule.partition("=")
+        step, tier = step.strip(), tier.strip().lower()
+        if step not in tiers or tier not in (LARGE, SMALL):
+            raise ValueError(f"Invalid MODEL_TIERS rule: {rule!r}")
+        tiers[step] = tier
+    return tiers
+
+
+MODEL_TIERS = _parse_model_tiers(os.getenv("MODEL_TIERS", ""))
+
+# Models and the compiled graph are built on first use, or ahead of traffic
+# by warm_up(), so importing this module stays cheap.
+llm = None
+llm_with_tools = None
+# Used for the last allowed iteration so the turn ends with an answer
+llm_without_tool_calls = None
+small_llm = None
+small_llm_with_tools = None
+graph = None
+
+_build_lock = threading.Lock()
+
+
+def _chat_model(model: str):
+    # stream_usage so streamed turns report tokens too
+    return ChatOpenAI(model=model, stream_usage=True)
+
+
+def get_llm(tier: str = LARGE):
+    """Returns the chat model for `tier`, created on first use."""
+    global llm, small_llm
+    if tier == SMALL:
+        if small_llm is None:
+            with _build_lock:
+                if small_llm is None:
+                    small_llm = _chat_model(SMALL_MODEL)
+        return small_llm
+    if llm is None:
+        with _build_lock:
+            if llm is None:
+                llm = _chat_model(LARGE_MODEL)
+    return llm
+
+
+def get_llm_with_tools(tier: str = LARGE):
+    """The chat model for `tier` with the tools bound."""
+    global llm_with_tools, small_llm_with_tools
+    if tier == SMALL:
+        if small_llm_with_tools is None:
+            small_llm_with_tools = (
+                get_llm(SMALL).bind_tools(tools).with_config(tags=[SMALL_MODEL_TAG])
+            )
+        return small_llm_with_tools
+    if llm_with_tools is None:
+        llm_with_tools = get_llm().bind_tools(tools)
+    return llm_with_tools
+
+
+def get_llm_without_tool_calls():
+    """The chat model with the tools bound but tool calls disabled."""
+    global llm_without_tool_calls
+    if llm_without_tool_calls is None:
+        llm_without_tool_calls = get_llm().bind_tools(tools, tool_choice="none")
+    return llm_without_tool_calls
+
+
 tool_node = ToolNode(tools)
 
 
+def _with_system_prompt(messages, summary: str = ""):
+    """Add system prompt (and summary) if it's not already the first message."""
+    if not messages or not isinstance(messages[0], SystemMessage):
+        prefix = [SystemMessage(content=SYSTEM_PROMPT)]
+        if summary:
+            prefix.append(
+                SystemMessage(
+                    content=f"Summary of the earlier conversation:\n{summary}"
+                )
+            )
+        messages = prefix + list(messages)
+    return messages
+
+
+def _prompt_messages(state: AgentState):
+    """
+    Messages sent to the LLM, most stable first so provider-side prompt
+    caching can reuse the longest possible prefix: the system prompt (after
+    the tool schemas, which OpenAI puts first), the summary, stored history,
+    then this turn's messages. Tool results such as inventory listings only
+    ever appear in the last part, and the window over stored history moves
+    in steps (see HISTORY_WINDOW_STEP).
+    """
+    messages = state["messages"][state.get("summarized_count", 0) :]
+    return _with_system_prompt(messages, state.get("summary", ""))
+
+
+def _tier_for(step: str) -> str:
+    return MODEL_TIERS[step] if MODEL_ROUTING else LARGE
+
+
+def _model_for(state: AgentState):
+    """
+    Returns (model, tier, step): the tool-calling model of the step's tier,
+    or the large model that must answer once the cap is reached (step None).
+    """
+    if state.get("iterations", 0) + 1 >= MAX_AGENT_ITERATIONS:
+        return get_llm_without_tool_calls(), LARGE, None
+    step = "answer" if isinstance(state["messages"][-1], ToolMessage) else "route"
+    tier = _tier_for(step)
+    return get_llm_with_tools(tier), tier, step
+
+
+def _should_escalate(step: Optional[str], tier: str, response) -> bool:
+    """
+    Whether a small-model reply should be redone by the large model: broken
+    tool calls on any step, a customer message answered without looking
+    anything up ("route"), or an empty answer from tool results ("answer").
+    A final answer never has tool calls, so that alone isn't a reason.
+    """
+    if tier != SMALL or not MODEL_ESCALATE:
+        return False
+    escalate = bool(response.invalid_tool_calls)
+    if not response.tool_calls:
+        if step == "route":
+            escalate = True
+        elif step == "answer":
+            escalate = escalate or not response.content
+    if escalate:
+        metrics.MODEL_ESCALATIONS.inc()
+    return escalate
+
+
 def call_model(state: AgentState):
     """The node that calls the LLM to decide on the next action."""
-    messages = state["messages"]
+    messages = _prompt_messages(state)
+
+    model, tier, step = _model_for(state)
+    response = model.invoke(messages)
+    if _should_escalate(step, tier, response):
+        response = get_llm_with_tools().invoke(messages)
+    return {"messages": [response], "iterations": 1}
+
+
+async def acall_model(state: AgentState):
+    """Async version of call_model, used when the graph runs via ainvoke."""
+    messages = _prompt_messages(state)
+
+    model, tier, step = _model_for(state)
+    response = await model.ainvoke(messages)
+    if _should_escalate(step, tier, response):
+        response = await get_llm_with_tools().ainvoke(messages)
+    return {"messages": [response], "iterations": 1}
+
+
+def _fold_point(messages, older_count: int = 0) -> int:
+    """
+    Index splitting turns to summarize from the recent turns kept verbatim.
+    The `older_count` messages outside the prompt window are always folded.
+    """
+    cut = max(len(messages) - SUMMARY_KEEP_MESSAGES, older_count, 0)
+    # Keep whole exchanges: the kept part must start on a human message
+    while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+        cut += 1
+    return cut
 
-    # Add system prompt if it's not already the first message
-    if not messages or not isinstance(messages[0], SystemMessage):
-        messages = [SystemMessage(content=SYSTEM_PROMPT)] + list(messages)
 
-    response = llm_with_tools.invoke(messages)
-    return {"messages": [response]}
+def _summary_request(state: AgentState, cut: int):
+    summary = state.get("summary", "") or "(none)"
+    return [SystemMessage(content=SUMMARY_PROMPT.format(summary=summary))] + list(
+        state["messages"][:cut]
+    )
+
+
+def summarize_history(state: AgentState):
+    """Folds older turns into the rolling summary."""
+    cut = _fold_point(state["messages"], state.get("older_count", 0))
+    response = get_llm(_tier_for("summarize")).invoke(_summary_request(state, cut))
+    return {"summary": response.content, "summarized_count": cut}
+
+
+async def asummarize_history(state: AgentState):
+    """Async version of summarize_history."""
+    cut = _fold_point(state["messages"], state.get("older_count", 0))
+    response = await get_llm(_tier_for("summarize")).ainvoke(
+        _summary_request(state, cut)
+    )
+    return {"summary": response.content, "summarized_count": cut}
 
 
 # --- 3. Define the Graph's Conditional Logic ---
+def should_summarize(state: AgentState):
+    """
+    Summarize first when the history has grown past the token budget or
+    stored turns have left the prompt window.
+    """
+    older_count = state.get("older_count", 0)
+    if not SUMMARY_ENABLED or _fold_point(state["messages"], older_count) == 0:
+        return "agent"
+    if older_count or count_message_tokens(state["messages"]) > SUMMARY_TRIGGER_TOKENS:
+        return "summarize"
+    return "agent"
+
+
 def should_continue(state: AgentState):
     """If the LLM made a tool call, run the tool. Otherwise, end."""
     last_message = state["messages"][-1]
@@ -71,9 +336,15 @@ def should_continue(state: AgentState):
 
 # --- 4. Wire up the Simplified Graph ---
 workflow = StateGraph(AgentState)
-workflow.add_node("agent", call_model)
+workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model))
 workflow.add_node("tools", tool_node)
-workflow.set_entry_point("agent")
+workflow.add_node(
+    "summarize", RunnableLambda(summarize_history, afunc=asummarize_history)
+)
+workflow.set_conditional_entry_point(
+    should_summarize, {"summarize": "summarize", "agent": "agent"}
+)
+workflow.add_edge("summarize", "agent")
 workflow.add_conditional_edges(
     "agent",
     should_continue,
@@ -81,10 +352,150 @@ workflow.add_conditional_edges(
 )
 workflow.add_edge("tools", "agent")
 
-graph = workflow.compile()
+
+def get_agent_graph():
+    """Returns the compiled graph, compiling it on first use."""
+    global graph
+    if graph is None:
+        with _build_lock:
+            if graph is None:
+                # The recursion limit is only a backstop, MAX_AGENT_ITERATIONS
+                # ends turns first
+                graph = workflow.compile().with_config(
+                    recursion_limit=2 * MAX_AGENT_ITERATIONS + 2,
+                    max_concurrency=TOOL_MAX_CONCURRENCY,
+                )
+    return graph
+
+
+def warm_up():
+    """Builds the models and compiles the graph before the first request."""
+    get_llm_with_tools()
+    get_llm_without_tool_calls()
+    if MODEL_ROUTING:
+        get_llm_with_tools(SMALL)
+    get_agent_graph()
 
 
 # --- 5. Add History to the Graph ---
+def _kept_after_summary(result, loaded_count: int) -> Optional[int]:
+    """
+    Number of stored messages to keep once this turn's summary is saved,
+    or None when the graph didn't summarize.
+    """
+    folded = result.get("summarized_count", 0)
+    if not folded:
+        return None
+    # Unsummarized history plus the user and AI messages just appended
+    return loaded_count - folded + 2
+
+
+def _turn_state(existing_messages, summary: str, new_message) -> AgentState:
+    """
+    Graph input for a turn. With summaries on, `existing_messages` is every
+    stored message, and the ones before the prompt window get folded into
+    the summary so trimming the list never drops a turn it hasn't seen.
+    """
+    older_count = 0
+    if SUMMARY_ENABLED:
+        older_count = len(existing_messages) - len(recent_window(existing_messages))
+    return AgentState(
+        messages=list(existing_messages) + [new_message],
+        summary=summary,
+        older_count=older_count,
+    )
+
+
+def _load_messages(history):
+    """Stored messages a turn needs: the window, or all of them for summaries."""
+    return history.messages if SUMMARY_ENABLED else history.get_recent_messages()
+
+
+async def _aload_messages(history):
+    """Async version of _load_messages."""
+    if SUMMARY_ENABLED:
+        return await history.aget_messages()
+    return await history.aget_recent_messages()
+
+
+def _turn_config(usage: Optional[metrics.TokenUsage] = None):
+    """
+    Per-turn run config. Inventory tools keep the last listing they sent in
+    `inventory_snapshot` so repeat listings within the turn can be diffs.
+    """
+    # Times nodes, tools and LLM calls and counts tokens
+    callbacks = [metrics.graph_metrics]
+    if usage is not None:
+        callbacks.append(usage)
+    return {
+        "configurable": {"inventory_snapshot": {}},
+        "callbacks": callbacks,
+    }
+
+
+def _log_usage(session_id: str, usage: metrics.TokenUsage):
+    if LOG_TOKEN_USAGE and usage.calls:
+        print(f"LLM tokens for session {session_id}: {usage}")
+
+
+def _stage(name: str):
+    """Times one stage of a turn for /metrics and Server-Timing."""
+    return metrics.timed(metrics.STAGE_SECONDS, stage=name)
+
+
+def _fast_path(user_message: str) -> Optional[str]:
+    """Answers simple inventory questions from inventory data, or None."""
+    with _stage("shortcut"):
+        answer = fast_path.answer(user_message)
+    metrics.cache_result("fast_path", answer is not None)
+    return answer
+
+
+async def _afast_path(user_message: str) -> Optional[str]:
+    """Async version of _fast_path."""
+    with _stage("shortcut"):
+        answer = await fast_path.aanswer(user_message)
+    metrics.cache_result("fast_path", answer is not None)
+    return answer
+
+
+def _count_probe(cache_probe):
+    if cache_probe is not None:
+        metrics.cache_result("response", cache_probe.response is not None)
+
+
+def _probe_cache(user_message: str, existing_messages, summary: str):
+    """
+    Looks the message up in the response cache, only for a session with no
+    history: as with storing, a reused answer must not depend on earlier
+    turns ("yes" to a purchase confirmation isn't the "yes" of a new chat).
+    """
+    if existing_messages or summary:
+        return None
+    with _stage("shortcut"):
+        cache_probe = response_cache.probe(user_message)
+    _count_probe(cache_probe)
+    return cache_probe
+
+
+async def _aprobe_cache(user_message: str, existing_messages, summary: str):
+    """Async version of _probe_cache."""
+    if existing_messages or summary:
+        return None
+    with _stage("shortcut"):
+        cache_probe = await response_cache.aprobe(user_message)
+    _count_probe(cache_probe)
+    return cache_probe
+
+
+def _cached_answer(cache_probe) -> Optional[str]:
+    return cache_probe.response if cache_probe is not None else None
+
+
+def _count_iterations(result):
+    metrics.AGENT_ITERATIONS.observe(result.get("iterations", 0))
+
+
 def get_agent_with_history(session_id: str, redis_url: Optional[str] = None):
     """
     Create an agent with chat history using Redis.
@@ -96,34 +507,217 @@ def get_agent_with_history(session_id: str, redis_url: Optional[str] = None):
 
     def chat_with_history(user_message: str):
         # Get chat history
-        history = RedisChatMessageHistory(session_id, url=redis_url)
-
-        # Prepare the state with history + new message
-        # Get existing messages from history
-        existing_messages = history.messages
+        history = WindowedRedisChatMessageHistory(session_id, url=redis_url)
 
         # Add the new user message
         new_message = HumanMessage(content=user_message)
-        all_messages = existing_messages + [new_message]
-
-        # Create state
-        state = AgentState(messages=all_messages)
 
-        # Run the graph
-        result = graph.invoke(state)
+        # Answer simple inventory questions directly
+        answer = _fast_path(user_message)
+        existing_messages, cache_probe = [], None
+        if answer is None:
+            # Only the most recent window of history is sent to the model
+            with _stage("history_load"):
+                existing_messages = _load_messages(history)
+                summary = history.get_summary()
+            # A new session may reuse the answer to an identical question
+            cache_probe = _probe_cache(user_message, existing_messages, summary)
+            answer = _cached_answer(cache_probe)
+        if answer is not None:
+            result = {"messages": [AIMessage(content=answer)]}
+        else:
+            # Create state with history + new message, including the summary
+            # of older turns if any
+            state = _turn_state(existing_messages, summary, new_message)
+
+            # Run the graph
+            usage = metrics.TokenUsage()
+            with _stage("graph"):
+                result = get_agent_graph().invoke(state, _turn_config(usage))
+            _count_iterations(result)
+            _log_usage(session_id, usage)
+            response_cache.remember(cache_probe, result)
 
         # Get the final response
         final_message = result["messages"][-1]
 
-        # Save the conversation to history
-        history.add_message(new_message)
-        history.add_message(final_message)
+        # Save the conversation to history in one round trip
+        with _stage("history_save"):
+            history.add_messages([new_message, final_message])
+
+            # Replace folded turns with the refreshed summary
+            keep = _kept_after_summary(result, len(existing_messages))
+            if keep is not None:
+                history.save_summary(result["summary"], keep)
 
         return final_message
 
     return chat_with_history
 
 
+def get_async_agent_with_history(session_id: str, redis_url: Optional[str] = None):
+    """
+    Async counterpart of get_agent_with_history.
+    Returns a coroutine function so Redis I/O, LLM calls and tool calls
+    never block the event loop.
+    """
+    if redis_url is None:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+    async def achat_with_history(user_message: str):
+        history = AsyncRedisChatMessageHistory(session_id, url=redis_url)
+
+        async def load_history():
+            return await _aload_messages(history), await history.aget_summary()
+
+        new_message = HumanMessage(content=user_message)
+        result, keep = await arun_turn(session_id, new_message, load_history)
+        final_message = result["messages"][-1]
+
+        await _asave_turn(history, [new_message, final_message], result, keep)
+        return final_message
+
+    return achat_with_history
+
+
+async def _asave_turn(history, messages, result, keep: Optional[int]):
+    """
+    Saves a turn's messages and, if the graph summarized, its new summary.
+    With HISTORY_WRITE_BEHIND they are only queued, so the reply isn't held
+    up by Redis.
+    """
+    with _stage("history_save"):
+        if HISTORY_WRITE_BEHIND:
+            summary = (result["summary"], keep) if keep is not None else None
+            await history_writer.submit([(history, messages, summary)])
+            return
+        await history.aadd_messages(messages)
+        if keep is not None:
+            await history.asave_summary(result["summary"], keep)
+
+
+async def arun_turn(session_id: str, new_message: HumanMessage, load_history):
+    """
+    Answers one message without saving it: from the fast path or response
+    cache, or by running the graph on the history `load_history()` returns
+    as (messages, summary). Returns (final graph state, keep), where keep
+    is None or, when the graph summarized, how many stored messages to keep
+    once the new messages and `result["summary"]` are saved.
+    """
+    answer = await _afast_path(new_message.content)
+    if answer is not None:
+        return {"messages": [AIMessage(content=answer)]}, None
+
+    with _stage("history_load"):
+        existing_messages, summary = await load_history()
+    cache_probe = await _aprobe_cache(new_message.content, existing_messages, summary)
+    answer = _cached_answer(cache_probe)
+    if answer is not None:
+        return {"messages": [AIMessage(content=answer)]}, None
+
+    state = _turn_state(existing_messages, summary, new_message)
+    usage = metrics.TokenUsage()
+    with _stage("graph"):
+        result = await get_agent_graph().ainvoke(state, _turn_config(usage))
+    _count_iterations(result)
+    _log_usage(session_id, usage)
+    await response_cache.aremember(cache_probe, result)
+    return result, _kept_after_summary(result, len(existing_messages))
+
+
+def _client_event(event):
+    """Translates a LangGraph stream event into a client event, or None."""
+    kind = event["event"]
+    node = event.get("metadata", {}).get("langgraph_node")
+    if (
+        kind == "on_chat_model_stream"
+        and node == "agent"
+        and SMALL_MODEL_TAG not in event.get("tags", ())
+    ):
+        # Tool-call chunks carry no text, only forward real tokens
+        content = event["data"]["chunk"].content
+        if content:
+            return {"event": "token", "data": content}
+    elif kind == "on_tool_start":
+        return {
+            "event": "tool_start",
+            "data": {"name": event["name"], "input": event["data"].get("input")},
+        }
+    elif kind == "on_tool_end":
+        output = event["data"].get("output")
+        return {
+            "event": "tool_end",
+            "data": {
+                "name": event["name"],
+                "output": str(getattr(output, "content", output)),
+            },
+        }
+    return None
+
+
+def get_streaming_agent_with_history(session_id: str, redis_url: Optional[str] = None):
+    """
+    Streaming counterpart of get_async_agent_with_history.
+    Returns an async generator function yielding {"event", "data"} dicts:
+    "token" for each LLM token from the agent node (summary calls are not
+    streamed, and small-model replies come as one token once kept),
+    "tool_start" and "tool_end" around every tool call, and a final "end"
+    with the full reply once it has been saved to history.
+    """
+    if redis_url is None:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+    async def astream_chat_with_history(user_message: str):
+        history = AsyncRedisChatMessageHistory(session_id, url=redis_url)
+        new_message = HumanMessage(content=user_message)
+
+        answer = await _afast_path(user_message)
+        existing_messages, cache_probe = [], None
+        if answer is None:
+            with _stage("history_load"):
+                existing_messages = await _aload_messages(history)
+                summary = await history.aget_summary()
+            cache_probe = await _aprobe_cache(user_message, existing_messages, summary)
+            answer = _cached_answer(cache_probe)
+        if answer is not None:
+            result = {"messages": [AIMessage(content=answer)]}
+            yield {"event": "token", "data": answer}
+        else:
+            state = _turn_state(existing_messages, summary, new_message)
+
+            result = None
+            streamed = False
+            usage = metrics.TokenUsage()
+            async for event in get_agent_graph().astream_events(
+                state, _turn_config(usage), version="v2"
+            ):
+                if event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                    # The root run ending carries the final graph state
+                    result = event["data"]["output"]
+                    continue
+                client_event = _client_event(event)
+                if client_event:
+                    if client_event["event"] in ("token", "tool_start"):
+                        # Only tokens after the last tool call count
+                        streamed = client_event["event"] == "token"
+                    yield client_event
+            _count_iterations(result)
+            _log_usage(session_id, usage)
+            if not streamed and result["messages"][-1].content:
+                # A small-model answer that wasn't escalated
+                yield {"event": "token", "data": result["messages"][-1].content}
+            await response_cache.aremember(cache_probe, result)
+
+        # Save the conversation to history, same as the non-streaming path
+        final_message = result["messages"][-1]
+        keep = _kept_after_summary(result, len(existing_messages))
+        await _asave_turn(history, [new_message, final_message], result, keep)
+
+        yield {"event": "end", "data": final_message.content}
+
+    return astream_chat_with_history
+
+
 # --- 6. Graph Visualization ---
 def generate_graph_diagram(output_path: str = "agent_graph.png"):
     """
@@ -137,7 +731,7 @@ def generate_graph_diagram(output_path: str = "agent_graph.png"):
     """
     try:
         # Generate the graph visualization
-        graph_image = graph.get_graph().draw_mermaid_png()
+        graph_image = get_agent_graph().get_graph().draw_mermaid_png()
 
         # Save the image to file
         with open(output_path, "wb") as f:
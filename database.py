@@ -1,16 +1,570 @@
+import hashlib
+import json
+import math
 import pymongo
 import os
+import re
+import threading
+import time
+import uuid
+from pymongo.errors import OperationFailure, PyMongoError
+from redis.exceptions import RedisError
+import metrics
+from redis_client import get_async_redis, get_redis
+from sweet_index import SweetIndex
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
-client = pymongo.MongoClient(MONGO_URI)
-db = client.get_database()
-sweets_collection = db.sweets
+
+# Clients are created on first use (or by the app's startup warm-up) so that
+# importing this module doesn't start pymongo's monitoring threads.
+client = None
+db = None
+sweets_collection = None
+
+# Async client for the non-blocking request path
+async_client = None
+async_db = None
+async_sweets_collection = None
+
+_client_lock = threading.Lock()
+
+
+def get_sweets_collection():
+    """Returns the sweets collection, connecting the sync client on first use."""
+    global client, db, sweets_collection
+    if sweets_collection is None:
+        with _client_lock:
+            if sweets_collection is None:
+                client = pymongo.MongoClient(MONGO_URI)
+                db = client.get_database()
+                sweets_collection = db.sweets
+    return sweets_collection
+
+
+def get_async_sweets_collection():
+    """Returns the sweets collection on the asyncio client, created on first use."""
+    global async_client, async_db, async_sweets_collection
+    if async_sweets_collection is None:
+        with _client_lock:
+            if async_sweets_collection is None:
+                async_client = pymongo.AsyncMongoClient(MONGO_URI)
+                async_db = async_client.get_database()
+                async_sweets_collection = async_db.sweets
+    return async_sweets_collection
+
+
+async def aping():
+    """Round trip to MongoDB, used to warm the connection pool on startup."""
+    await get_async_sweets_collection().database.command("ping")
+
+
+async def aclose_connections():
+    """Closes both MongoDB clients, used on application shutdown."""
+    global client, db, sweets_collection
+    global async_client, async_db, async_sweets_collection
+    if client is not None:
+        client.close()
+        client = db = sweets_collection = None
+    if async_client is not None:
+        await async_client.close()
+        async_client = async_db = async_sweets_collection = None
+
+
+# Seconds an inventory snapshot may be served from memory (0 disables caching)
+INVENTORY_CACHE_TTL = float(os.getenv("INVENTORY_CACHE_TTL", "30"))
+# Seconds between polls when change streams are unavailable
+INVENTORY_POLL_INTERVAL = float(os.getenv("INVENTORY_POLL_INTERVAL", "5"))
+# "local" caches the inventory in each process; "redis" shares one snapshot
+# between all workers and nodes, and only one of them watches MongoDB
+INVENTORY_CACHE_BACKEND = os.getenv("INVENTORY_CACHE_BACKEND", "local")
+# Seconds a worker holds the watcher lease without renewing it
+INVENTORY_WATCHER_LEASE = float(os.getenv("INVENTORY_WATCHER_LEASE", "15"))
+
+SNAPSHOT_KEY = "inventory:snapshot"
+GENERATION_KEY = "inventory:generation"
+WATCHER_LEASE_KEY = "inventory:watcher"
+
+
+class InventoryCache:
+    """
+    In-process TTL cache for the sweets inventory.
+    `version` increases on every invalidation so callers can tell whether
+    a snapshot they derived something from is still current.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._sweets = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def lookup(self):
+        """Returns (cached sweets or None, version to pass to `set` after a load)."""
+        version = self.version
+        return self.get(), version
+
+    async def alookup(self):
+        return self.lookup()
+
+    def get(self):
+        """Returns the cached sweets, or None when empty or expired."""
+        with self._lock:
+            if self._sweets is None:
+                return None
+            if time.monotonic() - self._loaded_at >= self.ttl:
+                self._sweets = None
+                return None
+            return list(self._sweets)
+
+    def set(self, sweets, version: int):
+        """Stores a snapshot unless the cache was invalidated while it was loading."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if version == self.version:
+                self._sweets = list(sweets)
+                self._loaded_at = time.monotonic()
+
+    async def aset(self, sweets, version: int):
+        self.set(sweets, version)
+
+    def invalidate(self):
+        """Drops the cached snapshot."""
+        with self._lock:
+            self._sweets = None
+            self.version += 1
+
+    async def ainvalidate(self):
+        self.invalidate()
+
+
+class RedisInventoryCache:
+    """
+    Inventory snapshot shared by every worker through Redis. Invalidation
+    bumps a generation counter; snapshots are stored with the generation
+    they were loaded under and ignored once it has moved on, so a slow load
+    can't overwrite a newer change. Redis errors count as misses.
+    """
+
+    def __init__(self, url: str, ttl: float):
+        self.url = url
+        self.ttl = ttl
+
+    @property
+    def redis_client(self):
+        return get_redis(self.url)
+
+    @property
+    def async_redis_client(self):
+        return get_async_redis(self.url)
+
+    def _reading(self, pipe):
+        pipe.get(GENERATION_KEY)
+        pipe.get(SNAPSHOT_KEY)
+        return pipe
+
+    @staticmethod
+    def _decode(generation, snapshot):
+        generation = int(generation or 0)
+        if snapshot is None:
+            return None, generation
+        data = json.loads(snapshot)
+        if data["generation"] != generation:
+            return None, generation
+        return data["sweets"], generation
+
+    def _encode(self, sweets, generation: int) -> str:
+        # default=str stores values exactly as inventory_hash sees them, so
+        # every worker computes the same hash for the same snapshot
+        return json.dumps({"generation": generation, "sweets": sweets}, default=str)
+
+    def lookup(self):
+        """Returns (shared sweets or None, generation to pass to `set`)."""
+        if self.ttl <= 0:
+            return None, 0
+        try:
+            return self._decode(
+                *self._reading(self.redis_client.pipeline(transaction=False)).execute()
+            )
+        except RedisError:
+            return None, -1
+
+    async def alookup(self):
+        if self.ttl <= 0:
+            return None, 0
+        try:
+            pipe = self._reading(self.async_redis_client.pipeline(transaction=False))
+            return self._decode(*await pipe.execute())
+        except RedisError:
+            return None, -1
+
+    def set(self, sweets, version: int):
+        if self.ttl <= 0 or version < 0:
+            return
+        try:
+            self.redis_client.set(
+                SNAPSHOT_KEY, self._encode(sweets, version), ex=math.ceil(self.ttl)
+            )
+        except RedisError:
+            pass
+
+    async def aset(self, sweets, version: int):
+        if self.ttl <= 0 or version < 0:
+            return
+        try:
+            await self.async_redis_client.set(
+                SNAPSHOT_KEY, self._encode(sweets, version), ex=math.ceil(self.ttl)
+            )
+        except RedisError:
+            pass
+
+    @staticmethod
+    def _invalidating(pipe):
+        pipe.incr(GENERATION_KEY)
+        pipe.delete(SNAPSHOT_KEY)
+        return pipe
+
+    def invalidate(self):
+        """Makes every worker's next read go to MongoDB once."""
+        try:
+            self._invalidating(self.redis_client.pipeline(transaction=False)).execute()
+        except RedisError as e:
+            # The TTL still bounds staleness
+            print(f"Inventory cache invalidation failed: {e}")
+
+    async def ainvalidate(self):
+        try:
+            pipe = self._invalidating(
+                self.async_redis_client.pipeline(transaction=False)
+            )
+            await pipe.execute()
+        except RedisError as e:
+            print(f"Inventory cache invalidation failed: {e}")
+
+
+def _create_inventory_cache():
+    if INVENTORY_CACHE_BACKEND == "redis":
+        return RedisInventoryCache(
+            os.getenv("REDIS_URL", "redis://localhost:6379"), INVENTORY_CACHE_TTL
+        )
+    return InventoryCache(INVENTORY_CACHE_TTL)
+
+
+inventory_cache = _create_inventory_cache()
+
+# Name -> _id index rebuilt from every fresh inventory load. IDs don't change
+# when stock does, so it deliberately survives cache invalidation.
+sweet_index = SweetIndex()
+
+
+def invalidate_inventory_cache():
+    """Forces the next inventory read to go to MongoDB."""
+    inventory_cache.invalidate()
+
+
+async def ainvalidate_inventory_cache():
+    """Async version of invalidate_inventory_cache, for the async purchase path."""
+    await inventory_cache.ainvalidate()
+
+
+def find_sweet_id(name: str):
+    """Resolves a sweet's ID from the local index, or None on a miss."""
+    return sweet_index.lookup(name)
+
+
+# Inventory version the name index was last built from
+_indexed_version = None
+
+
+def _index(documents, version: int):
+    """Rebuilds the name index when `documents` are newer than its source."""
+    global _indexed_version
+    if version != _indexed_version:
+        sweet_index.rebuild(documents)
+        _indexed_version = version
+
+
+def _loaded(documents, version: int):
+    """Prepares freshly loaded documents for caching (stringified `_id`s)."""
+    global _indexed_version
+    for document in documents:
+        if "_id" in document:
+            document["_id"] = str(document["_id"])
+    sweet_index.rebuild(documents)
+    _indexed_version = version
+    return documents
+
+
+def _without_ids(documents):
+    return [
+        {key: value for key, value in document.items() if key != "_id"}
+        for document in documents
+    ]
+
+
+def inventory_hash(sweets) -> str:
+    """Content hash of an inventory snapshot; equal snapshots hash equally in every process."""
+    payload = json.dumps(sweets, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# Fields kept in the inventory snapshot; `_id` feeds the name index and is
+# stripped before the sweets are returned
+INVENTORY_PROJECTION = {"_id": 1, "name": 1, "price": 1, "quantity": 1, "category": 1}
 
 
 def get_all_sweets():
     """Fetches all sweets from the MongoDB collection."""
-    sweets = list(sweets_collection.find({}, {"_id": 0}))
-    return sweets
+    documents, version = inventory_cache.lookup()
+    metrics.cache_result("inventory", documents is not None)
+    if documents is not None:
+        # Snapshots shared by another worker haven't been indexed here yet
+        _index(documents, version)
+        return _without_ids(documents)
+
+    with metrics.timed(
+        metrics.EXTERNAL_SECONDS, "mongo", service="mongo", operation="find"
+    ):
+        documents = _loaded(
+            list(get_sweets_collection().find({}, INVENTORY_PROJECTION)), version
+        )
+    inventory_cache.set(documents, version)
+    return _without_ids(documents)
+
+
+async def aget_all_sweets():
+    """Fetches all sweets from the MongoDB collection without blocking the event loop."""
+    documents, version = await inventory_cache.alookup()
+    metrics.cache_result("inventory", documents is not None)
+    if documents is not None:
+        _index(documents, version)
+        return _without_ids(documents)
+
+    with metrics.timed(
+        metrics.EXTERNAL_SECONDS, "mongo", service="mongo", operation="find"
+    ):
+        cursor = get_async_sweets_collection().find({}, INVENTORY_PROJECTION)
+        documents = _loaded(await cursor.to_list(length=None), version)
+    await inventory_cache.aset(documents, version)
+    return _without_ids(documents)
+
+
+# --- Filtered inventory queries ---
+# Only the fields the tools show to the model are sent over the wire
+SWEET_PROJECTION = {"_id": 0, "name": 1, "price": 1, "quantity": 1, "category": 1}
+SORT_FIELDS = ("price", "quantity", "name")
+
+# Indexes backing the filtered queries below
+SWEET_INDEXES = [
+    [("name", pymongo.ASCENDING)],
+    [("quantity", pymongo.ASCENDING)],
+    [("price", pymongo.ASCENDING)],
+    [("category", pymongo.ASCENDING), ("price", pymongo.ASCENDING)],
+    # The inventory poller reads the latest update every few seconds
+    [("updatedAt", pymongo.DESCENDING)],
+]
+
+
+def sweets_filter(
+    name=None, category=None, min_price=None, max_price=None, in_stock_only=False
+) -> dict:
+    """Builds the MongoDB filter for an inventory question."""
+    query = {}
+    if name:
+        # Substring match; escaped so customer text can't inject a pattern
+        query["name"] = {"$regex": re.escape(name.strip()), "$options": "i"}
+    if category:
+        query["category"] = {
+            "$regex": f"^{re.escape(category.strip())}$",
+            "$options": "i",
+        }
+    if min_price is not None or max_price is not None:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if in_stock_only:
+        query["quantity"] = {"$gt": 0}
+    return query
+
+
+def _find_kwargs(sort_by=None, descending=False, limit=0) -> dict:
+    if sort_by is not None and sort_by not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort sweets by '{sort_by}'")
+    kwargs = {"projection": SWEET_PROJECTION, "limit": max(int(limit or 0), 0)}
+    if sort_by:
+        direction = pymongo.DESCENDING if descending else pymongo.ASCENDING
+        kwargs["sort"] = [(sort_by, direction)]
+    return kwargs
+
+
+def find_sweets(sort_by=None, descending=False, limit=0, **filters):
+    """
+    Fetches only the sweets matching `filters` (see sweets_filter), optionally
+    sorted and capped at `limit` results, with a tight projection.
+    """
+    query, kwargs = sweets_filter(**filters), _find_kwargs(sort_by, descending, limit)
+    with metrics.timed(
+        metrics.EXTERNAL_SECONDS, "mongo", service="mongo", operation="query"
+    ):
+        return list(get_sweets_collection().find(query, **kwargs))
+
+
+async def afind_sweets(sort_by=None, descending=False, limit=0, **filters):
+    """Async version of find_sweets."""
+    query, kwargs = sweets_filter(**filters), _find_kwargs(sort_by, descending, limit)
+    with metrics.timed(
+        metrics.EXTERNAL_SECONDS, "mongo", service="mongo", operation="query"
+    ):
+        cursor = get_async_sweets_collection().find(query, **kwargs)
+        return await cursor.to_list(length=None)
+
+
+def ensure_indexes():
+    """Creates the indexes used by find_sweets; a no-op when they exist."""
+    for keys in SWEET_INDEXES:
+        get_sweets_collection().create_index(keys)
+
+
+async def aensure_indexes():
+    """Async version of ensure_indexes, used on application startup."""
+    for keys in SWEET_INDEXES:
+        await get_async_sweets_collection().create_index(keys)
+
+
+# --- Inventory change detection ---
+_watcher_thread = None
+_watcher_stop = threading.Event()
+
+
+def _inventory_fingerprint():
+    """Cheap summary of the collection that changes whenever stock changes."""
+    collection = get_sweets_collection()
+    latest = collection.find_one(
+        {}, {"_id": 0, "updatedAt": 1}, sort=[("updatedAt", pymongo.DESCENDING)]
+    )
+    return (
+        collection.estimated_document_count(),
+        (latest or {}).get("updatedAt"),
+    )
+
+
+def _poll_inventory(stop_event: threading.Event):
+    """Invalidates the cache when the collection's fingerprint changes."""
+    fingerprint = None
+    while True:
+        try:
+            current = _inventory_fingerprint()
+        except PyMongoError:
+            # Transient outage (even on the first poll); the TTL still
+            # bounds staleness
+            current = fingerprint
+        if fingerprint is not None and current != fingerprint:
+            inventory_cache.invalidate()
+        fingerprint = current
+        if stop_event.wait(INVENTORY_POLL_INTERVAL):
+            return
+
+
+def _watch_inventory(stop_event: threading.Event):
+    """Invalidates the cache from a change stream, falling back to polling."""
+    try:
+        with get_sweets_collection().watch(max_await_time_ms=1000) as stream:
+            while not stop_event.is_set():
+                if stream.try_next() is not None:
+                    inventory_cache.invalidate()
+    except OperationFailure:
+        # Change streams need a replica set; standalone servers get polled
+        _poll_inventory(stop_event)
+    except Exception as e:
+        print(f"Inventory watcher failed, retrying: {e}")
+
+
+class _WatcherLease:
+    """
+    Stop signal for the inventory watcher that also keeps its Redis lease,
+    so only one worker watches MongoDB for a shared cache. Reads as set once
+    the app stops or the lease has been lost.
+    """
+
+    def __init__(self, stop_event: threading.Event, url: str):
+        self._stop = stop_event
+        self.url = url
+        self._token = uuid.uuid4().hex.encode()
+        self._renewed_at = 0.0
+
+    def hold(self) -> bool:
+        """Takes the lease if it's free, or renews it if it's ours."""
+        client = get_redis(self.url)
+        ttl = math.ceil(INVENTORY_WATCHER_LEASE)
+        try:
+            held = client.set(WATCHER_LEASE_KEY, self._token, nx=True, ex=ttl)
+            if not held and client.get(WATCHER_LEASE_KEY) == self._token:
+                # Racy only right at expiry, where two workers may briefly
+                # both watch; invalidating twice is harmless
+                held = client.expire(WATCHER_LEASE_KEY, ttl)
+        except RedisError:
+            held = False
+        if held:
+            self._renewed_at = time.monotonic()
+        return bool(held)
+
+    def release(self):
+        """Frees the lease so another worker takes over without waiting for expiry."""
+        try:
+            client = get_redis(self.url)
+            if client.get(WATCHER_LEASE_KEY) == self._token:
+                client.delete(WATCHER_LEASE_KEY)
+        except RedisError:
+            pass
+
+    def is_set(self) -> bool:
+        if self._stop.is_set():
+            return True
+        if time.monotonic() - self._renewed_at >= INVENTORY_WATCHER_LEASE / 3:
+            return not self.hold()
+        return False
+
+    def wait(self, timeout: float) -> bool:
+        self._stop.wait(timeout)
+        return self.is_set()
+
+
+def _run_watcher(stop_event: threading.Event):
+    """Watches the inventory; with a shared cache, only while holding the lease."""
+    if not isinstance(inventory_cache, RedisInventoryCache):
+        # Watch again after an error (e.g. MongoDB unreachable) until stopped
+        while not stop_event.is_set():
+            _watch_inventory(stop_event)
+            stop_event.wait(INVENTORY_POLL_INTERVAL)
+        return
+    lease = _WatcherLease(stop_event, inventory_cache.url)
+    while not stop_event.is_set():
+        if lease.hold():
+            _watch_inventory(lease)
+        stop_event.wait(INVENTORY_WATCHER_LEASE / 3)
+    lease.release()
+
+
+def start_inventory_watcher():
+    """Starts the background thread that keeps the inventory cache fresh."""
+    global _watcher_thread
+    if INVENTORY_CACHE_TTL <= 0 or (_watcher_thread and _watcher_thread.is_alive()):
+        return
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(
+        target=_run_watcher, args=(_watcher_stop,), daemon=True
+    )
+    _watcher_thread.start()
+
+
+def stop_inventory_watcher():
+    """Stops the inventory watcher thread."""
+    _watcher_stop.set()
+    if _watcher_thread:
+        _watcher_thread.join(timeout=2)
@@ -0,0 +1,155 @@
+import difflib
+import os
+import re
+from typing import Optional, Tuple
+from database import aget_all_sweets, get_all_sweets
+from sweet_index import SWEET_MATCH_CUTOFF, normalize_name
+from inventory_format import format_sweets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Answer simple inventory questions without calling the LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+LIST_INTENT = "list"
+PRICE_INTENT = "price"
+STOCK_INTENT = "stock"
+
+# Anything that could be an order goes to the LLM, which confirms purchases
+_PURCHASE_WORDS = re.compile(
+    r"\b(buy|order|purchase|want|need|add|take|get me|give me|send|deliver)\b"
+)
+
+_LIST_PATTERNS = [
+    re.compile(
+        r"(what|which) (sweets|items|products) (do you have|are available|do you sell|are in stock|you have)"
+    ),
+    re.compile(
+        r"(show|list)( me)?( all)?( the| your)? (sweets|menu|items|inventory|stock)"
+    ),
+    re.compile(
+        r"what do you have|what s available|what is available|(show|see)( me)? the menu|menu"
+    ),
+]
+
+_PRICE_PATTERNS = [
+    re.compile(
+        r"how much (is|are|does|do|for)( a| one| the)? (?P<name>.+?)( cost| costs)?"
+    ),
+    re.compile(r"what (is|s) the (price|cost) of( a| one| the)? (?P<name>.+)"),
+    re.compile(r"(price|cost) of( a| one| the)? (?P<name>.+)"),
+    re.compile(r"(?P<name>.+?) price"),
+]
+
+_STOCK_PATTERNS = [
+    re.compile(
+        r"how many (?P<name>.+?) (do you have|are (left|available|in stock)|in stock)"
+    ),
+    re.compile(r"(is|are)( the)? (?P<name>.+?) (available|in stock)"),
+    re.compile(r"do you have( any)? (?P<name>.+?)( in stock| available)?"),
+]
+
+# "how much for 10 gulab jamun" asks about a quantity, not a unit price; the
+# fuzzy name match would otherwise read "10 gulab jamun" as the sweet itself
+_QUANTITY = re.compile(
+    r"\d|\b(two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|"
+    r"fifteen|twenty|thirty|forty|fifty|hundred|dozen|couple|pair)s?\b"
+)
+
+
+def _normalize(message: str) -> str:
+    words = re.sub(r"[^\w\s]", " ", message.casefold()).split()
+    # Politeness doesn't change the intent
+    return " ".join(w for w in words if w not in ("please", "pls", "kindly"))
+
+
+def detect_intent(message: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Classifies a message as a simple inventory question.
+    Returns (intent, sweet name or None), or None for anything else.
+    """
+    text = _normalize(message)
+    if not text or _PURCHASE_WORDS.search(text):
+        return None
+    if any(pattern.fullmatch(text) for pattern in _LIST_PATTERNS):
+        return LIST_INTENT, None
+    for intent, patterns in (
+        (PRICE_INTENT, _PRICE_PATTERNS),
+        (STOCK_INTENT, _STOCK_PATTERNS),
+    ):
+        for pattern in patterns:
+            match = pattern.fullmatch(text)
+            if match:
+                return intent, match.group("name")
+    return None
+
+
+def _find_sweet(name: str, sweets):
+    """The one sweet whose name matches `name`, allowing small typos."""
+    if _QUANTITY.search(name):
+        return None
+    by_key = {}
+    for sweet in sweets:
+        by_key.setdefault(normalize_name(sweet.get("name", "")), []).append(sweet)
+    key = normalize_name(name)
+    if key not in by_key:
+        close = difflib.get_close_matches(
+            key, by_key.keys(), n=2, cutoff=SWEET_MATCH_CUTOFF
+        )
+        if len(close) != 1:
+            return None
+        key = close[0]
+    matches = by_key[key]
+    return matches[0] if len(matches) == 1 else None
+
+
+def render(intent: str, name: Optional[str], sweets) -> Optional[str]:
+    """Formats the answer from inventory data, or None if the LLM should answer."""
+    if intent == LIST_INTENT:
+        return format_sweets(sweets)
+
+    sweet = _find_sweet(name, sweets)
+    if sweet is None:
+        return None
+    sweet_name = sweet.get("name", name)
+    quantity = sweet.get("quantity", 0)
+
+    if intent == PRICE_INTENT:
+        try:
+            price = f"₹{float(sweet['price']):.2f}"
+        except (KeyError, ValueError, TypeError):
+            return None
+        stock_note = "" if quantity else " It is currently out of stock."
+        return f"{sweet_name} costs {price}.{stock_note}"
+
+    if quantity:
+        return f"Yes, we have {quantity} {sweet_name} in stock."
+    return f"Sorry, {sweet_name} is currently out of stock."
+
+
+def answer(user_message: str) -> Optional[str]:
+    """Answers simple inventory questions from cached inventory, else None."""
+    if not FAST_PATH_ENABLED:
+        return None
+    intent = detect_intent(user_message)
+    if intent is None:
+        return None
+    try:
+        return render(*intent, get_all_sweets())
+    except Exception:
+        # Let the agent handle it (and report inventory errors properly)
+        return None
+
+
+async def aanswer(user_message: str) -> Optional[str]:
+    """Async version of answer."""
+    if not FAST_PATH_ENABLED:
+        return None
+    intent = detect_intent(user_message)
+    if intent is None:
+        return None
+    try:
+        return render(*intent, await aget_all_sweets())
+    except Exception:
+        return None
@@ -0,0 +1,445 @@
+import asyncio
+import contextvars
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.messages import (
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+    trim_messages,
+)
+import history_codec
+import metrics
+from redis_client import get_async_redis, get_redis
+from session_guard import SESSION_REDIS_LOCK, hold_session
+from tokens import count_message_tokens
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Same key layout as langchain's RedisChatMessageHistory so the sync and async
+# paths read and write the same sessions.
+KEY_PREFIX = "message_store:"
+# Rolling conversation summaries live next to the session list
+SUMMARY_KEY_SUFFIX = ":summary"
+
+# Most recent messages loaded into the prompt each turn
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "20"))
+# Old messages leave the window this many at a time, so the history right
+# after the system prompt stays the same for several turns and provider-side
+# prompt caching keeps hitting (0 or 1 slides the window every turn)
+HISTORY_WINDOW_STEP = int(os.getenv("HISTORY_WINDOW_STEP", "10"))
+# Optional token budget for the loaded window (0 disables token trimming)
+HISTORY_WINDOW_TOKENS = int(os.getenv("HISTORY_WINDOW_TOKENS", "0"))
+# Messages kept per session in Redis; older ones are trimmed server-side
+HISTORY_MAX_STORED = int(os.getenv("HISTORY_MAX_STORED", "200"))
+# Session keys expire after this many idle seconds (0 keeps them forever)
+HISTORY_TTL_SECONDS = int(os.getenv("HISTORY_TTL_SECONDS", "604800"))
+
+# Save turns from a background queue instead of before the reply is sent.
+# A session's next turn still sees its earlier ones: in this worker, reads
+# wait for the queue; in others, the session lock is held until the save.
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "false").lower() == "true"
+# Turns waiting to be saved; requests wait for room once it is full
+HISTORY_WRITE_QUEUE_SIZE = int(os.getenv("HISTORY_WRITE_QUEUE_SIZE", "1000"))
+# Most turns saved per Redis pipeline
+HISTORY_WRITE_BATCH_SIZE = int(os.getenv("HISTORY_WRITE_BATCH_SIZE", "64"))
+
+if (
+    HISTORY_WRITE_BEHIND
+    and not SESSION_REDIS_LOCK
+    and int(os.getenv("WEB_CONCURRENCY", "1")) > 1
+):
+    # Without the lock, another worker could read a session before its
+    # queued turn is saved
+    raise ValueError(
+        "HISTORY_WRITE_BEHIND with several workers needs SESSION_REDIS_LOCK"
+    )
+
+
+def window_messages(
+    messages: Sequence[BaseMessage],
+    max_messages: int = HISTORY_WINDOW_MESSAGES,
+    max_tokens: int = HISTORY_WINDOW_TOKENS,
+) -> List[BaseMessage]:
+    """
+    Keeps the newest messages that fit the message and token limits.
+    The window always starts on a human turn so the model never sees a
+    reply without the question it answers.
+    """
+    messages = trim_messages(
+        messages,
+        max_tokens=max_messages,
+        token_counter=len,
+        strategy="last",
+        start_on="human",
+    )
+    if max_tokens:
+        messages = trim_messages(
+            messages,
+            max_tokens=max_tokens,
+            token_counter=count_message_tokens,
+            strategy="last",
+            start_on="human",
+        )
+    return messages
+
+
+def stable_window(
+    messages: Sequence[BaseMessage],
+    total: int,
+    max_messages: int = HISTORY_WINDOW_MESSAGES,
+    step: int = HISTORY_WINDOW_STEP,
+) -> List[BaseMessage]:
+    """
+    Cuts the newest `messages` of a `total`-message history so the window
+    starts on a multiple of `step`. It then holds between
+    `max_messages - step + 1` and `max_messages` messages and its start only
+    moves every `step` messages. Sessions trimmed to HISTORY_MAX_STORED
+    slide again, which takes well over a hundred turns.
+    """
+    step = min(step, max_messages // 2)
+    if step <= 1 or total <= max_messages:
+        return list(messages)
+    start = -(-(total - max_messages) // step) * step
+    return list(messages[start - (total - len(messages)) :])
+
+
+def recent_window(
+    messages: Sequence[BaseMessage],
+    max_messages: int = HISTORY_WINDOW_MESSAGES,
+    max_tokens: int = HISTORY_WINDOW_TOKENS,
+) -> List[BaseMessage]:
+    """The prompt window over a session's whole stored history."""
+    messages = stable_window(messages, len(messages), max_messages)
+    return window_messages(messages, max_messages, max_tokens)
+
+
+def _decode(items) -> List[BaseMessage]:
+    """Turns LRANGE output (newest first) into messages, oldest first."""
+    return messages_from_dict([history_codec.decode(m) for m in items[::-1]])
+
+
+def _encode(message: BaseMessage) -> bytes:
+    return history_codec.encode(message_to_dict(message))
+
+
+async def aping(url: str) -> None:
+    """Round trip to Redis, used to open the shared pool on startup."""
+    await get_async_redis(url).ping()
+
+
+class WindowedRedisChatMessageHistory(RedisChatMessageHistory):
+    """
+    RedisChatMessageHistory that only reads the tail of the session list,
+    caps the list length in Redis and refreshes the key's TTL on write.
+    Every instance shares the process-wide connection pool for its URL.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        url: str = "redis://localhost:6379/0",
+        key_prefix: str = KEY_PREFIX,
+        ttl: Optional[int] = HISTORY_TTL_SECONDS,
+        max_stored: int = HISTORY_MAX_STORED,
+    ):
+        # Deliberately not calling super().__init__, which opens a new
+        # connection pool for every session
+        self.redis_client = get_redis(url)
+        self.session_id = session_id
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.max_stored = max_stored
+
+    def get_recent_messages(
+        self,
+        max_messages: int = HISTORY_WINDOW_MESSAGES,
+        max_tokens: int = HISTORY_WINDOW_TOKENS,
+    ) -> List[BaseMessage]:
+        """Retrieve only the newest messages needed for the prompt window."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.llen(self.key)
+        pipe.lrange(self.key, 0, max_messages - 1)
+        total, items = pipe.execute()
+        messages = stable_window(_decode(items), total, max_messages)
+        return window_messages(messages, max_messages, max_tokens)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Retrieve all messages from Redis, whatever codec wrote them"""
+        return _decode(self.redis_client.lrange(self.key, 0, -1))
+
+    @property
+    def summary_key(self) -> str:
+        """Key holding the rolling summary of turns folded out of the list"""
+        return self.key + SUMMARY_KEY_SUFFIX
+
+    def get_summary(self) -> str:
+        """Retrieve the session's rolling summary, if any."""
+        summary = self.redis_client.get(self.summary_key)
+        return summary.decode("utf-8") if summary else ""
+
+    def save_summary(self, summary: str, keep_messages: int) -> None:
+        """Store a new summary and drop the turns it replaced from the list."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(self.summary_key, summary, ex=self.ttl or None)
+        pipe.ltrim(self.key, 0, keep_messages - 1)
+        pipe.execute()
+
+    def clear(self) -> None:
+        """Clear session memory and summary from Redis"""
+        self.redis_client.delete(self.key, self.summary_key)
+
+    def add_message(self, message: BaseMessage) -> None:
+        """Append the message, trimming the list and refreshing its TTL."""
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append the messages in one round trip, trimming and refreshing the TTL."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for message in messages:
+            pipe.lpush(self.key, _encode(message))
+        if self.max_stored:
+            pipe.ltrim(self.key, 0, self.max_stored - 1)
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+            pipe.expire(self.summary_key, self.ttl)
+        pipe.execute()
+
+
+class AsyncRedisChatMessageHistory:
+    """
+    Non-blocking counterpart of WindowedRedisChatMessageHistory built on
+    redis.asyncio. Messages are LPUSHed as JSON, newest first, exactly like
+    the sync store. Instances share the process-wide pool for their URL,
+    so they must be created inside the event loop that uses them.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        url: str = "redis://localhost:6379/0",
+        key_prefix: str = KEY_PREFIX,
+        ttl: Optional[int] = HISTORY_TTL_SECONDS,
+        max_stored: int = HISTORY_MAX_STORED,
+    ):
+        self.redis_client = get_async_redis(url)
+        self.session_id = session_id
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.max_stored = max_stored
+
+    @property
+    def key(self) -> str:
+        """Construct the record key to use"""
+        return self.key_prefix + self.session_id
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        """Retrieve all messages from Redis"""
+        await history_writer.wait_for(self.key)
+        return _decode(await self.redis_client.lrange(self.key, 0, -1))
+
+    def _queue_recent(self, pipe, max_messages: int):
+        pipe.llen(self.key)
+        pipe.lrange(self.key, 0, max_messages - 1)
+
+    async def aget_recent_messages(
+        self,
+        max_messages: int = HISTORY_WINDOW_MESSAGES,
+        max_tokens: int = HISTORY_WINDOW_TOKENS,
+    ) -> List[BaseMessage]:
+        """Retrieve only the newest messages needed for the prompt window."""
+        await history_writer.wait_for(self.key)
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_recent(pipe, max_messages)
+        total, items = await pipe.execute()
+        messages = stable_window(_decode(items), total, max_messages)
+        return window_messages(messages, max_messages, max_tokens)
+
+    @property
+    def summary_key(self) -> str:
+        """Key holding the rolling summary of turns folded out of the list"""
+        return self.key + SUMMARY_KEY_SUFFIX
+
+    async def aget_summary(self) -> str:
+        """Retrieve the session's rolling summary, if any."""
+        await history_writer.wait_for(self.key)
+        summary = await self.redis_client.get(self.summary_key)
+        return summary.decode("utf-8") if summary else ""
+
+    def _queue_summary(self, pipe, summary: str, keep_messages: int):
+        pipe.set(self.summary_key, summary, ex=self.ttl or None)
+        pipe.ltrim(self.key, 0, keep_messages - 1)
+
+    async def asave_summary(self, summary: str, keep_messages: int) -> None:
+        """Store a new summary and drop the turns it replaced from the list."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_summary(pipe, summary, keep_messages)
+        await pipe.execute()
+
+    def _queue_add(self, pipe, messages: Sequence[BaseMessage]):
+        for message in messages:
+            pipe.lpush(self.key, _encode(message))
+        if self.max_stored:
+            pipe.ltrim(self.key, 0, self.max_stored - 1)
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+            pipe.expire(self.summary_key, self.ttl)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append the messages, trimming the list and refreshing its TTL."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_add(pipe, messages)
+        await pipe.execute()
+
+    async def aclear(self) -> None:
+        """Clear session memory from Redis"""
+        # Otherwise queued turns would bring the session back afterwards
+        await history_writer.wait_for(self.key)
+        await self.redis_client.delete(self.key, self.summary_key)
+
+
+# --- Many sessions per round trip, for batch requests ---
+async def aload_histories(
+    histories: Sequence[AsyncRedisChatMessageHistory],
+    max_messages: int = HISTORY_WINDOW_MESSAGES,
+    max_tokens: int = HISTORY_WINDOW_TOKENS,
+    whole: bool = False,
+) -> List[Tuple[List[BaseMessage], str]]:
+    """
+    Loads (recent window, summary) for every session in one pipeline, or
+    (every stored message, summary) when `whole` is set. The histories must
+    share a Redis URL.
+    """
+    if not histories:
+        return []
+    for history in histories:
+        await history_writer.wait_for(history.key)
+    pipe = histories[0].redis_client.pipeline(transaction=False)
+    for history in histories:
+        # LRANGE 0 -1 reads the whole list
+        history._queue_recent(pipe, 0 if whole else max_messages)
+        pipe.get(history.summary_key)
+    values = await pipe.execute()
+
+    loaded = []
+    for total, items, summary in zip(values[::3], values[1::3], values[2::3]):
+        messages = _decode(items)
+        if not whole:
+            messages = stable_window(messages, total, max_messages)
+            messages = window_messages(messages, max_messages, max_tokens)
+        loaded.append((messages, summary.decode("utf-8") if summary else ""))
+    return loaded
+
+
+async def asave_turns(
+    turns: Sequence[
+        Tuple[AsyncRedisChatMessageHistory, Sequence[BaseMessage], Optional[tuple]]
+    ],
+) -> None:
+    """
+    Saves many sessions' turns in one pipeline. Each turn is (history,
+    messages to append, None or (summary, messages to keep)), applied in
+    the same order as aadd_messages followed by asave_summary.
+    """
+    if not turns:
+        return
+    pipe = turns[0][0].redis_client.pipeline(transaction=False)
+    for history, messages, summary in turns:
+        history._queue_add(pipe, messages)
+        if summary is not None:
+            history._queue_summary(pipe, *summary)
+    await pipe.execute()
+
+
+class HistoryWriter:
+    """
+    Write-behind for chat turns. submit() queues turns and returns at once;
+    a background task saves them in order, up to `batch_size` turns per
+    pipeline. Reads of a session wait_for() its queued turns first, and the
+    session's Redis lock (session_guard) is released only once they are
+    saved, so the next turn sees the previous one in any worker.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        # The queue, task and events belong to the event loop that made them
+        self._loop = None
+        self._queue = None
+        self._task = None
+        # history key -> [turns queued, set once they are all saved]
+        self._pending: Dict[str, list] = {}
+
+    def _start(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending = loop, {}
+            self._queue = asyncio.Queue(self.queue_size)
+            # A fresh context, so flushes aren't timed into whichever
+            # request happened to start the task
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        return self._queue
+
+    async def submit(self, turns) -> None:
+        """
+        Queues turns in asave_turns' format, waiting while the queue is full.
+        Sessions locked by the caller stay locked until their turns are saved.
+        """
+        queue = self._start()
+        for turn in turns:
+            history = turn[0]
+            entry = self._pending.setdefault(history.key, [0, asyncio.Event()])
+            entry[0] += 1
+            hold_session(history.session_id, entry[1].wait)
+            await queue.put(turn)
+
+    async def wait_for(self, key: str) -> None:
+        """Waits until the turns queued for the history `key` are saved."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        entry = self._pending.get(key)
+        if entry is not None:
+            await entry[1].wait()
+
+    async def _run(self):
+        while True:
+            turns = [await self._queue.get()]
+            while len(turns) < self.batch_size and not self._queue.empty():
+                turns.append(self._queue.get_nowait())
+            try:
+                with metrics.timed(metrics.STAGE_SECONDS, stage="history_flush"):
+                    await self._save(turns)
+            except Exception as e:
+                # Don't stall the queue or the sessions waiting on it
+                print(f"Failed to save {len(turns)} chat turns: {e}")
+            for history, _, _ in turns:
+                entry = self._pending[history.key]
+                entry[0] -= 1
+                if entry[0] == 0:
+                    del self._pending[history.key]
+                    entry[1].set()
+                self._queue.task_done()
+
+    async def _save(self, turns):
+        by_client: Dict[int, list] = {}
+        for turn in turns:
+            by_client.setdefault(id(turn[0].redis_client), []).append(turn)
+        for group in by_client.values():
+            await asave_turns(group)
+
+    async def adrain(self, timeout: float = 10) -> None:
+        """Saves everything still queued, then stops the background task."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Gave up saving {self._queue.qsize()} queued chat turns")
+        self._task.cancel()
+        self._loop = self._queue = self._task = None
+
+
+history_writer = HistoryWriter(HISTORY_WRITE_QUEUE_SIZE, HISTORY_WRITE_BATCH_SIZE)
@@ -0,0 +1,121 @@
+import importlib.util
+import json
+import os
+import zlib
+from typing import Optional
+import orjson
+import ormsgpack
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How new history entries are serialized: json | orjson | msgpack.
+# json and orjson write the same plain JSON as before, readable by any worker.
+HISTORY_CODEC = os.getenv("HISTORY_CODEC", "orjson").lower()
+# Compression for entries above the threshold: none | zlib | zstd
+HISTORY_COMPRESSION = os.getenv("HISTORY_COMPRESSION", "none").lower()
+HISTORY_COMPRESS_MIN_BYTES = int(os.getenv("HISTORY_COMPRESS_MIN_BYTES", "1024"))
+
+# Binary entries start with MARKER, a serializer tag and a compression tag.
+# Plain JSON entries always start with "{", so the two never collide and
+# sessions written before this module existed keep decoding.
+MARKER = b"\x00"
+_SERIALIZERS = {b"j": "json", b"m": "msgpack"}
+_COMPRESSIONS = {b"-": "none", b"z": "zlib", b"s": "zstd"}
+
+# zstd needs the optional `zstandard` package; zlib is used without it
+_zstd = None
+if importlib.util.find_spec("zstandard") is not None:
+    import zstandard as _zstd
+
+
+def _serialize(data: dict, codec: str) -> bytes:
+    if codec == "msgpack":
+        return ormsgpack.packb(data)
+    if codec == "json":
+        return json.dumps(data).encode("utf-8")
+    return orjson.dumps(data)
+
+
+def _compress(payload: bytes, compression: str):
+    """Returns (tag, payload); small payloads are left as they are."""
+    if compression == "none" or len(payload) < HISTORY_COMPRESS_MIN_BYTES:
+        return b"-", payload
+    if compression == "zstd" and _zstd is not None:
+        return b"s", _zstd.ZstdCompressor().compress(payload)
+    return b"z", zlib.compress(payload)
+
+
+def encode(
+    data: dict, codec: Optional[str] = None, compression: Optional[str] = None
+) -> bytes:
+    """Serializes a message dict (see message_to_dict) for storage."""
+    codec = codec or HISTORY_CODEC
+    compression = compression or HISTORY_COMPRESSION
+    serializer = b"m" if codec == "msgpack" else b"j"
+    tag, payload = _compress(_serialize(data, codec), compression)
+    if serializer == b"j" and tag == b"-":
+        # Keep uncompressed JSON byte-compatible with the original format
+        return payload
+    return MARKER + serializer + tag + payload
+
+
+def decode(raw) -> dict:
+    """Reads back an entry written by encode or by the original JSON store."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if not raw.startswith(MARKER):
+        return orjson.loads(raw)
+
+    serializer, compression = _SERIALIZERS[raw[1:2]], _COMPRESSIONS[raw[2:3]]
+    payload = raw[3:]
+    if compression == "zlib":
+        payload = zlib.decompress(payload)
+    elif compression == "zstd":
+        if _zstd is None:
+            raise RuntimeError("zstd-compressed history needs the zstandard package")
+        payload = _zstd.ZstdDecompressor().decompress(payload)
+    if serializer == "msgpack":
+        return ormsgpack.unpackb(payload)
+    return orjson.loads(payload)
+
+
+if __name__ == "__main__":
+    # Bytes per message and encode/decode time for each codec, e.g.
+    #   python history_codec.py
+    import timeit
+    from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+    inventory = "\n".join(
+        f"- Sweet {i}: ₹{10 + i * 0.75:.2f} (Stock: {i % 40})" for i in range(60)
+    )
+    samples = {
+        "short": message_to_dict(HumanMessage(content="How much is Gulab Jamun?")),
+        "long": message_to_dict(AIMessage(content=inventory)),
+    }
+    variants = [("baseline json", "json", "none")] + [
+        (f"{codec}+{compression}", codec, compression)
+        for codec in ("orjson", "msgpack")
+        for compression in ("none", "zlib", "zstd")
+    ]
+    number = 2000
+    for label, sample in samples.items():
+        baseline = None
+        print(f"{label} message:")
+        for name, codec, compression in variants:
+            if name == "baseline json":
+                encode_once = lambda: json.dumps(sample)
+                entry = encode_once().encode("utf-8")
+                decode_once = lambda: json.loads(entry.decode("utf-8"))
+            else:
+                encode_once = lambda: encode(sample, codec, compression)
+                entry = encode_once()
+                decode_once = lambda: decode(entry)
+            assert decode_once() == sample
+            encode_us = timeit.timeit(encode_once, number=number) / number * 1e6
+            decode_us = timeit.timeit(decode_once, number=number) / number * 1e6
+            baseline = baseline or len(entry)
+            print(
+                f"  {name:>15}: {len(entry):6d} bytes ({len(entry) / baseline:4.0%}), "
+                f"encode {encode_us:6.1f} us, decode {decode_us:6.1f} us"
+            )
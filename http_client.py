@@ -0,0 +1,145 @@
+import asyncio
+import importlib.util
+import os
+import random
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Your Node.js backend API URL
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000")
+
+# Seconds to establish a connection / wait for a response from the backend
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3"))
+BACKEND_READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "10"))
+# Retries for idempotent calls (GET) on connection errors and 502/503/504
+BACKEND_MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", "2"))
+BACKEND_BACKOFF_SECONDS = float(os.getenv("BACKEND_BACKOFF_SECONDS", "0.2"))
+# Keep-alive connections held open to the backend
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "20"))
+
+RETRY_STATUSES = (502, 503, 504)
+
+_session = None
+_async_client = None
+
+
+def get_session() -> requests.Session:
+    """Returns the shared keep-alive session for sync backend calls."""
+    global _session
+    if _session is None:
+        retry = Retry(
+            total=BACKEND_MAX_RETRIES,
+            backoff_factor=BACKEND_BACKOFF_SECONDS,
+            backoff_jitter=BACKEND_BACKOFF_SECONDS,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE, max_retries=retry
+        )
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the shared keep-alive client for async backend calls."""
+    global _async_client
+    if _async_client is None:
+        transport = httpx.AsyncHTTPTransport(
+            # HTTP/2 needs the optional `h2` package
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=BACKEND_POOL_SIZE,
+                max_keepalive_connections=BACKEND_POOL_SIZE,
+            ),
+            # Retries connection failures (for POSTs too, nothing was sent);
+            # abackend_get retries the other errors and 5xx statuses itself
+            retries=BACKEND_MAX_RETRIES,
+        )
+        _async_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(
+                BACKEND_READ_TIMEOUT, connect=BACKEND_CONNECT_TIMEOUT
+            ),
+        )
+    return _async_client
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter on top."""
+    delay = BACKEND_BACKOFF_SECONDS * (2**attempt)
+    return delay + random.uniform(0, BACKEND_BACKOFF_SECONDS)
+
+
+def _timed(method: str):
+    """Times a backend call, including any retries."""
+    return metrics.timed(
+        metrics.EXTERNAL_SECONDS, "backend", service="backend", operation=method
+    )
+
+
+def backend_get(path: str, **kwargs) -> requests.Response:
+    """GET from the backend; retried with jittered backoff."""
+    kwargs.setdefault("timeout", (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT))
+    with _timed("GET"):
+        return get_session().get(f"{API_BASE_URL}{path}", **kwargs)
+
+
+def backend_post(path: str, **kwargs) -> requests.Response:
+    """POST to the backend; never retried once the request was sent."""
+    kwargs.setdefault("timeout", (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT))
+    with _timed("POST"):
+        return get_session().post(f"{API_BASE_URL}{path}", **kwargs)
+
+
+async def abackend_get(path: str, **kwargs) -> httpx.Response:
+    """Async GET from the backend; retried with jittered backoff."""
+    client = get_async_client()
+    with _timed("GET"):
+        for attempt in range(BACKEND_MAX_RETRIES + 1):
+            last_attempt = attempt == BACKEND_MAX_RETRIES
+            try:
+                response = await client.get(f"{API_BASE_URL}{path}", **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # Already retried by the transport
+                raise
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+            await asyncio.sleep(_backoff(attempt))
+
+
+async def abackend_post(path: str, **kwargs) -> httpx.Response:
+    """Async POST to the backend; never retried once the request was sent."""
+    with _timed("POST"):
+        return await get_async_client().post(f"{API_BASE_URL}{path}", **kwargs)
+
+
+def close_clients():
+    """Closes the shared sync session."""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+async def aclose_clients():
+    """Closes both shared clients, used on application shutdown."""
+    global _async_client
+    close_clients()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,181 @@
+import csv
+import io
+import os
+from typing import Optional
+from tokens import count_tokens
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How inventory tool output is written for the model: lines | table | csv
+INVENTORY_FORMAT = os.getenv("INVENTORY_FORMAT", "lines").lower()
+# Sweets listed by get_available_sweets before the rest are summarized (0 = all)
+INVENTORY_TOP_K = int(os.getenv("INVENTORY_TOP_K", "0"))
+# Send only what changed since the last inventory listing in the same turn
+INVENTORY_DIFF = os.getenv("INVENTORY_DIFF", "false").lower() == "true"
+
+EMPTY_INVENTORY = "No sweets are currently available in our inventory."
+
+
+def _price(sweet) -> Optional[str]:
+    """The price as a 2-decimal string, the raw value if it isn't numeric, or None."""
+    price = sweet.get("price")
+    if price is None:
+        return None
+    try:
+        return f"{float(price):.2f}"
+    except (ValueError, TypeError):
+        return str(price)
+
+
+def format_sweets(sweets, empty_message: str = EMPTY_INVENTORY) -> str:
+    """Formats inventory documents into the text returned to the model."""
+    if not sweets:
+        return empty_message
+
+    # Format the sweets list nicely
+    sweet_list = []
+    for sweet in sweets:
+        name = sweet.get("name", "Unknown")
+        quantity = sweet.get("quantity", 0)
+
+        # Format price with INR symbol
+        price = _price(sweet)
+        price_formatted = f"₹{price}" if price is not None else "Price not available"
+
+        sweet_list.append(f"- {name}: {price_formatted} (Stock: {quantity})")
+
+    return "Here are the sweets currently available:\n" + "\n".join(sweet_list)
+
+
+def format_table(sweets, empty_message: str = EMPTY_INVENTORY) -> str:
+    """One pipe-separated row per sweet under a single header line."""
+    if not sweets:
+        return empty_message
+    rows = [
+        f"{sweet.get('name', 'Unknown')}|{_price(sweet) or '-'}|{sweet.get('quantity', 0)}"
+        for sweet in sweets
+    ]
+    return "Sweets available (name|price INR|stock):\n" + "\n".join(rows)
+
+
+def format_csv(sweets, empty_message: str = EMPTY_INVENTORY) -> str:
+    """The inventory as CSV with a header row; names containing commas are quoted."""
+    if not sweets:
+        return empty_message
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["name", "price_inr", "stock"])
+    for sweet in sweets:
+        writer.writerow(
+            [
+                sweet.get("name", "Unknown"),
+                _price(sweet) or "",
+                sweet.get("quantity", 0),
+            ]
+        )
+    return buffer.getvalue().rstrip("\n")
+
+
+FORMATTERS = {"lines": format_sweets, "table": format_table, "csv": format_csv}
+
+
+def top_k(sweets, k: int):
+    """
+    Keeps the `k` best-stocked sweets (in their original order) and returns
+    (kept, number left out). k <= 0 keeps everything.
+    """
+    if k <= 0 or len(sweets) <= k:
+        return list(sweets), 0
+    ranked = sorted(
+        range(len(sweets)),
+        key=lambda i: sweets[i].get("quantity") or 0,
+        reverse=True,
+    )
+    keep = sorted(ranked[:k])
+    return [sweets[i] for i in keep], len(sweets) - k
+
+
+def diff_sweets(previous, current) -> str:
+    """Describes how `current` differs from the `previous` snapshot, by name."""
+    before = {sweet.get("name"): sweet for sweet in previous}
+    after = {sweet.get("name"): sweet for sweet in current}
+    lines = []
+    for name, sweet in after.items():
+        old = before.get(name)
+        if old is None:
+            lines.append(f"+ {name}|{_price(sweet) or '-'}|{sweet.get('quantity', 0)}")
+        elif _price(old) != _price(sweet) or old.get("quantity") != sweet.get(
+            "quantity"
+        ):
+            lines.append(f"~ {name}|{_price(sweet) or '-'}|{sweet.get('quantity', 0)}")
+    lines.extend(f"- {name}" for name in before if name not in after)
+    if not lines:
+        return "Inventory unchanged since the last check."
+    return "Inventory changes since the last check (name|price INR|stock):\n" + (
+        "\n".join(lines)
+    )
+
+
+def render_inventory(
+    sweets,
+    fmt: str = INVENTORY_FORMAT,
+    k: int = 0,
+    empty_message: str = EMPTY_INVENTORY,
+) -> str:
+    """Formats sweets with the configured formatter, summarizing past the top `k`."""
+    formatter = FORMATTERS.get(fmt, format_sweets)
+    shown, hidden = top_k(sweets, k)
+    text = formatter(shown, empty_message)
+    if hidden:
+        text += (
+            f"\n...and {hidden} more sweets available; "
+            "use search_sweets to look them up."
+        )
+    return text
+
+
+def render_listing(sweets, snapshot: Optional[dict] = None) -> str:
+    """
+    Output of get_available_sweets. `snapshot` is a per-turn dict holding the
+    last listing sent; with INVENTORY_DIFF on, later listings in that turn
+    only report changes. Tool results aren't kept in chat history, so the
+    snapshot never outlives the turn the model saw it in.
+    """
+    previous = snapshot.get("sweets") if snapshot is not None else None
+    if snapshot is not None:
+        snapshot["sweets"] = list(sweets)
+    if INVENTORY_DIFF and previous is not None:
+        return diff_sweets(previous, sweets)
+    return render_inventory(sweets, k=INVENTORY_TOP_K)
+
+
+def measure(sweets) -> dict:
+    """Tokens each format costs for `sweets`, for comparing formats."""
+    return {
+        fmt: count_tokens(formatter(sweets)) for fmt, formatter in FORMATTERS.items()
+    }
+
+
+if __name__ == "__main__":
+    # Token cost of each format for a synthetic catalog, e.g.
+    #   python inventory_format.py 200
+    import sys
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    catalog = [
+        {"name": f"Sweet {i}", "price": 10 + i * 0.75, "quantity": (i * 7) % 40}
+        for i in range(size)
+    ]
+    counts = measure(catalog)
+    baseline = counts["lines"]
+    for fmt, count in counts.items():
+        saved = 100 * (baseline - count) / baseline if baseline else 0
+        print(f"{fmt:>6}: {count:6d} tokens ({saved:5.1f}% saved)")
+    if INVENTORY_TOP_K:
+        text = render_inventory(catalog, k=INVENTORY_TOP_K)
+        count = count_tokens(text)
+        saved = 100 * (baseline - count) / baseline if baseline else 0
+        print(
+            f"{INVENTORY_FORMAT} top {INVENTORY_TOP_K}: {count} tokens ({saved:.1f}% saved)"
+        )
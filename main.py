@@ -1,8 +1,38 @@
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from chatbot import get_agent_with_history
+from starlette.background import BackgroundTask
+from admission import RequestRejected, check_rate_limits, limiter
+from batch import CHAT_BATCH_MAX_ITEMS, BatchItem, arun_batch
+from chatbot import (
+    get_async_agent_with_history,
+    get_streaming_agent_with_history,
+    warm_up,
+)
+from database import (
+    aclose_connections,
+    aensure_indexes,
+    aping,
+    start_inventory_watcher,
+    stop_inventory_watcher,
+)
+from history import aping as aping_redis, history_writer
+from http_client import aclose_clients
+import metrics
+from redis_client import aclose_redis
+from session_guard import (
+    SESSION_BUSY_DETAIL,
+    SessionBusyError,
+    request_key,
+    run_once,
+    session_lock,
+)
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -12,7 +42,37 @@ load_dotenv()
 # Get environment variables
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
-app = FastAPI(title="Sweet Shop Chatbot Service")
+
+async def _warm_up():
+    """Builds the agent and opens backend connections before serving traffic."""
+    warm_up()
+    checks = {
+        "MongoDB": aping(),
+        "Redis": aping_redis(REDIS_URL),
+        # Queries still work without the indexes, just slower
+        "inventory indexes": aensure_indexes(),
+    }
+    results = await asyncio.gather(*checks.values(), return_exceptions=True)
+    for name, result in zip(checks, results):
+        if isinstance(result, Exception):
+            print(f"Warm-up: {name} unavailable: {result}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _warm_up()
+    # Keep the inventory cache in sync with MongoDB while the app is running
+    start_inventory_watcher()
+    yield
+    # Queued chat turns need Redis, so save them before closing it
+    await history_writer.adrain()
+    stop_inventory_watcher()
+    await aclose_clients()
+    await aclose_connections()
+    await aclose_redis()
+
+
+app = FastAPI(title="Sweet Shop Chatbot Service", lifespan=lifespan)
 
 # Allow your Next.js frontend to call this API
 app.add_middleware(
@@ -21,7 +81,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read per-request timings and back off when asked
+    expose_headers=["Server-Timing", "Retry-After"],
 )
+# Outermost, so request timings include every other middleware
+app.add_middleware(metrics.TimingMiddleware)
 
 REDIS_URL = os.getenv("REDIS_URL")
 if not REDIS_URL:
@@ -37,23 +101,152 @@ class ChatRequest(BaseModel):
     session_id: str
 
 
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+    # Send each result as an NDJSON line as soon as it is ready
+    stream: bool = False
+
+
+@app.exception_handler(RequestRejected)
+async def request_rejected_handler(request: Request, exc: RequestRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(default=None),
+):
     if not request.session_id:
         raise HTTPException(status_code=400, detail="session_id is required")
 
     if not REDIS_URL:
         raise HTTPException(status_code=500, detail="Redis URL not configured")
 
-    agent = get_agent_with_history(session_id=request.session_id, redis_url=REDIS_URL)
+    client_ip = http_request.client.host if http_request.client else None
+    await check_rate_limits(request.session_id, client_ip, REDIS_URL)
+
+    agent = get_async_agent_with_history(
+        session_id=request.session_id, redis_url=REDIS_URL
+    )
 
-    # Call the agent with the user's message
-    response_message = agent(request.message)
+    async def respond() -> str:
+        # Call the agent with the user's message without blocking the event loop
+        async with limiter.slot():
+            response_message = await agent(request.message)
 
-    # Extract the content from the response message
-    if isinstance(response_message, AIMessage):
-        response_content = response_message.content
-    else:
-        response_content = str(response_message)
+        # Extract the content from the response message
+        if isinstance(response_message, AIMessage):
+            return response_message.content
+        return str(response_message)
+
+    # One turn per session at a time; duplicates of an in-flight request
+    # (and retries with the same Idempotency-Key) share its reply
+    try:
+        response_content = await run_once(
+            request.session_id,
+            request_key(request.message, idempotency_key),
+            respond,
+            REDIS_URL,
+            replay=idempotency_key is not None,
+        )
+    except SessionBusyError:
+        raise HTTPException(status_code=409, detail=SESSION_BUSY_DETAIL)
 
     return {"response": response_content}
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """Streams the agent's reply as Server-Sent Events."""
+    if not request.session_id:
+        raise HTTPException(status_code=400, detail="session_id is required")
+
+    if not REDIS_URL:
+        raise HTTPException(status_code=500, detail="Redis URL not configured")
+
+    client_ip = http_request.client.host if http_request.client else None
+    await check_rate_limits(request.session_id, client_ip, REDIS_URL)
+    # Take the slot before sending headers, so overload is still a plain 503
+    permit = await limiter.acquire()
+
+    agent = get_streaming_agent_with_history(
+        session_id=request.session_id, redis_url=REDIS_URL
+    )
+
+    async def event_source():
+        try:
+            # Streams can't be shared, so duplicates just wait their turn
+            async with session_lock(request.session_id, REDIS_URL):
+                async for event in agent(request.message):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        except SessionBusyError:
+            yield f"event: error\ndata: {json.dumps(SESSION_BUSY_DETAIL)}\n\n"
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        finally:
+            permit.release()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot if the client left before the stream started
+        background=BackgroundTask(permit.release),
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: ChatBatchRequest, http_request: Request):
+    """
+    Answers many messages in one call. A session's messages are answered in
+    the order given; results carry the `index` of their item.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {CHAT_BATCH_MAX_ITEMS} items per batch",
+        )
+    if not all(item.session_id for item in request.items):
+        raise HTTPException(status_code=400, detail="session_id is required")
+
+    if not REDIS_URL:
+        raise HTTPException(status_code=500, detail="Redis URL not configured")
+
+    # The whole batch costs one token from the client's bucket; sessions are
+    # still limited per item
+    client_ip = http_request.client.host if http_request.client else None
+    await check_rate_limits(None, client_ip, REDIS_URL)
+
+    items = [
+        BatchItem(index, item.session_id, item.message)
+        for index, item in enumerate(request.items)
+    ]
+    results = arun_batch(items, REDIS_URL)
+
+    if request.stream:
+
+        async def lines():
+            async for result in results:
+                yield json.dumps(result) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    collected = [result async for result in results]
+    return {"results": sorted(collected, key=lambda result: result["index"])}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms, token counts and cache hit rates for Prometheus."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,349 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Upper bounds (seconds) shared by the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text format."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[n]) for n in self.labelnames))
+        return series[2] if series else 0
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, le=f"{bound}")
+                    yield f"{self.name}_bucket{labels} {cumulative}"
+                labels = _format_labels(self.labelnames, key)
+                yield f"{self.name}_sum{labels} {total:g}"
+                yield f"{self.name}_count{labels} {count}"
+
+
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds", "HTTP request latency.", ["method", "path", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of a chat turn.",
+    ["stage"],
+)
+NODE_SECONDS = Histogram(
+    "chatbot_node_seconds", "Time spent in each LangGraph node.", ["node"]
+)
+TOOL_SECONDS = Histogram("chatbot_tool_seconds", "Tool call latency.", ["tool"])
+EXTERNAL_SECONDS = Histogram(
+    "chatbot_external_seconds",
+    "Latency of calls to external services.",
+    ["service", "operation"],
+)
+LLM_TOKENS = Counter(
+    "chatbot_llm_tokens_total",
+    "LLM tokens used: prompt (including cached), cached prompt and completion.",
+    ["kind"],
+)
+PROMPT_TOKENS = Histogram(
+    "chatbot_llm_prompt_tokens",
+    "Prompt tokens sent per LLM call.",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+AGENT_ITERATIONS = Histogram(
+    "chatbot_agent_iterations",
+    "LLM calls made per chat turn.",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10),
+)
+MODEL_ESCALATIONS = Counter(
+    "chatbot_model_escalations_total",
+    "Small-model replies redone by the large model.",
+)
+CACHE_REQUESTS = Counter(
+    "chatbot_cache_requests_total", "Cache lookups by outcome.", ["cache", "result"]
+)
+
+
+# --- Per-request timings for the Server-Timing header ---
+_request_timings: contextvars.ContextVar[Optional[Dict[str, list]]] = (
+    contextvars.ContextVar("request_timings", default=None)
+)
+
+
+def _record(name: str, seconds: float):
+    """Adds a span to the current request's Server-Timing entries, if any."""
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def timed(histogram: Histogram, timing_name: Optional[str] = None, **labels):
+    """
+    Times the block into `histogram` and, under a request, the
+    Server-Timing entry `timing_name` (defaults to the first label value).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        _record(timing_name or next(iter(labels.values()), histogram.name), elapsed)
+
+
+def cache_result(cache: str, hit: bool):
+    """Counts one lookup in `cache`."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def server_timing(timings: Dict[str, list], total: float) -> str:
+    """Formats timings as a Server-Timing header value (durations in ms)."""
+    entries = [
+        f'{name};dur={seconds * 1000:.1f};desc="{count}x"'
+        for name, (seconds, count) in list(timings.items())
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that times every HTTP request and adds a Server-Timing
+    header with the spans recorded while building the response. Streaming
+    responses send headers first, so theirs only cover work done up to then.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                header = server_timing(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                # Route templates keep label cardinality bounded
+                path=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
+
+
+def _token_usage(response):
+    """(prompt, cached prompt, completion) tokens of each generation that reports them."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+                yield usage.get("input_tokens", 0), cached or 0, usage.get(
+                    "output_tokens", 0
+                )
+
+
+class GraphMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler timing LangGraph nodes, tool calls and LLM calls, and
+    counting the tokens the LLM reports. Pass it in the run config.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, histogram, timing_name, **labels):
+        with self._lock:
+            self._starts[run_id] = (time.perf_counter(), histogram, timing_name, labels)
+
+    def _end(self, run_id):
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        start, histogram, timing_name, labels = started
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        _record(timing_name, elapsed)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run; skip nested runnables and graph internals
+        if node and kwargs.get("name") == node and not node.startswith("__"):
+            self._start(run_id, NODE_SECONDS, node, node=node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        tool = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._start(run_id, TOOL_SECONDS, f"tool_{tool}", tool=tool)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, EXTERNAL_SECONDS, "llm", service="llm", operation="chat")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(
+            run_id, EXTERNAL_SECONDS, "llm", service="llm", operation="completion"
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        for prompt, cached, completion in _token_usage(response):
+            LLM_TOKENS.inc(prompt, kind="prompt")
+            LLM_TOKENS.inc(cached, kind="cached")
+            LLM_TOKENS.inc(completion, kind="completion")
+            PROMPT_TOKENS.observe(prompt)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+graph_metrics = GraphMetricsHandler()
+
+
+class TokenUsage(BaseCallbackHandler):
+    """
+    Adds up the LLM calls and tokens of one chat turn. Pass a new instance
+    in each turn's run config.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt = 0
+        self.cached = 0
+        self.completion = 0
+
+    def on_llm_end(self, response, **kwargs):
+        for prompt, cached, completion in _token_usage(response):
+            self.calls += 1
+            self.prompt += prompt
+            self.cached += cached
+            self.completion += completion
+
+    def __str__(self):
+        hit_rate = self.cached / self.prompt if self.prompt else 0
+        return (
+            f"calls={self.calls} prompt={self.prompt} "
+            f"cached={self.cached} ({hit_rate:.0%}) completion={self.completion}"
+        )
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+import redis
+from redis import asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connections each process keeps open per Redis URL
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+# Seconds to wait for a free pooled connection before failing the call
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+
+_clients = {}
+# Async connections belong to the event loop that opened them, so each URL
+# remembers the loop its client was created on
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis(url: str) -> redis.Redis:
+    """Returns the shared, pooled sync client for `url`."""
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    url,
+                    max_connections=REDIS_POOL_SIZE,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    health_check_interval=30,
+                )
+                client = _clients[url] = redis.Redis(connection_pool=pool)
+    return client
+
+
+def get_async_redis(url: str) -> aioredis.Redis:
+    """Returns the shared, pooled asyncio client for `url` on the running loop."""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(url)
+    if entry is None or entry[0] is not loop:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=REDIS_POOL_SIZE,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+        entry = _async_clients[url] = (loop, aioredis.Redis(connection_pool=pool))
+    return entry[1]
+
+
+def close_redis():
+    """Closes the shared sync clients."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+            client.connection_pool.disconnect()
+        _clients.clear()
+
+
+async def aclose_redis():
+    """Closes every shared client, used on application shutdown."""
+    close_redis()
+    loop = asyncio.get_running_loop()
+    for url, (client_loop, client) in list(_async_clients.items()):
+        if client_loop is loop:
+            await client.close()
+            await client.connection_pool.disconnect()
+        del _async_clients[url]
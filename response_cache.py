@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+from langchain_core.messages import AIMessage, HumanMessage
+from redis_client import get_async_redis, get_redis
+from database import aget_all_sweets, get_all_sweets, inventory_hash
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Answers to read-only questions can be reused (off by default). Keys ignore
+# the session, so answers are only stored from, and served to, sessions with
+# no earlier history.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+# "local" keeps entries in this process, "redis" shares them across workers
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "local")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# Cosine similarity needed for an embedding match (0 = exact matches only).
+# Every exact-match miss then costs an embeddings API call plus a scan of
+# recent entries, so only enable it when LLM turns are much slower.
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+# Most recent entries compared against a question's embedding
+RESPONSE_CACHE_SIMILARITY_MAX_SCAN = int(
+    os.getenv("RESPONSE_CACHE_SIMILARITY_MAX_SCAN", "256")
+)
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv(
+    "RESPONSE_CACHE_EMBEDDING_MODEL", "text-embedding-3-small"
+)
+
+# Turns that called any of these changed state and must never be replayed
+SIDE_EFFECT_TOOLS = {"buy_sweet", "buy_sweets"}
+# Answers are only reused when built from these inventory lookups
+READ_ONLY_TOOLS = {"get_available_sweets", "search_sweets"}
+
+REDIS_KEY_PREFIX = "response_cache:"
+
+
+class CacheProbe(NamedTuple):
+    """Result of a cache lookup, reused to store the answer on a miss."""
+
+    key: str
+    inventory_version: str
+    embedding: Optional[List[float]]
+    response: Optional[str]
+
+
+def normalize_message(message: str) -> str:
+    """Lowercases and strips punctuation so trivial rewordings share a key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", message.casefold()).split())
+
+
+def is_cacheable(result) -> bool:
+    """
+    Only answers built from read-only inventory lookups, in a turn that saw
+    no earlier history, may be reused. Anything that could depend on the
+    session ("what did I order?") would otherwise reach other customers.
+    """
+    messages = result["messages"]
+    if result.get("summary") or sum(isinstance(m, HumanMessage) for m in messages) != 1:
+        return False
+    tool_names = {
+        tool_call["name"]
+        for message in messages
+        for tool_call in getattr(message, "tool_calls", None) or []
+    }
+    if not tool_names or not tool_names <= READ_ONLY_TOOLS:
+        return False
+    final_message = messages[-1]
+    return isinstance(final_message, AIMessage) and bool(final_message.content)
+
+
+def _unit(vector) -> Optional[List[float]]:
+    """Scales a vector to length 1 so similarity is a plain dot product."""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else None
+
+
+class LocalResponseCache:
+    """In-process LRU cache with TTL and optional embedding-similarity matching."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: int,
+        similarity: float = 0,
+        max_scan: int = RESPONSE_CACHE_SIMILARITY_MAX_SCAN,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_scan = max_scan
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, inventory_version, embedding=None) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                return entry["response"]
+            if not embedding or not self.similarity:
+                return None
+            # Only the newest entries are compared, outside the lock
+            candidates = [
+                entry
+                for _, entry in zip(
+                    range(self.max_scan), reversed(self._entries.values())
+                )
+                if entry["inventory_version"] == inventory_version
+                and entry["embedding"] is not None
+                and entry["expires_at"] > now
+            ]
+        query = _unit(embedding)
+        if query is None:
+            return None
+        best, best_score = None, self.similarity
+        for entry in candidates:
+            score = sum(x * y for x, y in zip(query, entry["embedding"]))
+            if score >= best_score:
+                best, best_score = entry["response"], score
+        return best
+
+    def store(self, key, inventory_version, response, embedding=None):
+        with self._lock:
+            self._entries[key] = {
+                "response": response,
+                "inventory_version": inventory_version,
+                "embedding": _unit(embedding) if embedding else None,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def alookup(self, key, inventory_version, embedding=None):
+        if embedding and self.similarity:
+            # Keep the similarity scan off the event loop
+            return await asyncio.to_thread(
+                self.lookup, key, inventory_version, embedding
+            )
+        return self.lookup(key, inventory_version, embedding)
+
+    async def astore(self, key, inventory_version, response, embedding=None):
+        self.store(key, inventory_version, response, embedding)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisResponseCache:
+    """
+    Exact-match cache shared by every worker through Redis. Entries expire
+    via TTL; configure Redis with an LRU maxmemory policy to bound memory.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        self.ttl = ttl
+        self.url = url
+
+    @property
+    def redis_client(self):
+        return get_redis(self.url)
+
+    @property
+    def async_redis_client(self):
+        return get_async_redis(self.url)
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return REDIS_KEY_PREFIX + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, key, inventory_version, embedding=None) -> Optional[str]:
+        value = self.redis_client.get(self._redis_key(key))
+        return value.decode("utf-8") if value else None
+
+    def store(self, key, inventory_version, response, embedding=None):
+        self.redis_client.set(self._redis_key(key), response, ex=self.ttl)
+
+    async def alookup(self, key, inventory_version, embedding=None):
+        value = await self.async_redis_client.get(self._redis_key(key))
+        return value.decode("utf-8") if value else None
+
+    async def astore(self, key, inventory_version, response, embedding=None):
+        await self.async_redis_client.set(self._redis_key(key), response, ex=self.ttl)
+
+
+def _create_cache():
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisResponseCache(
+            os.getenv("REDIS_URL", "redis://localhost:6379"), RESPONSE_CACHE_TTL
+        )
+    return LocalResponseCache(
+        RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY
+    )
+
+
+cache = _create_cache()
+_embeddings = None
+
+
+def _get_embeddings():
+    """Embedding model for similarity matches, created on first use."""
+    global _embeddings
+    if _embeddings is None:
+        from langchain_openai import OpenAIEmbeddings
+
+        _embeddings = OpenAIEmbeddings(model=RESPONSE_CACHE_EMBEDDING_MODEL)
+    return _embeddings
+
+
+def _uses_embeddings() -> bool:
+    return bool(RESPONSE_CACHE_SIMILARITY) and isinstance(cache, LocalResponseCache)
+
+
+def _key(normalized: str, inventory_version: str) -> str:
+    # The inventory version makes entries unreachable once stock changes
+    return f"{inventory_version}:{normalized}"
+
+
+def probe(user_message: str) -> Optional[CacheProbe]:
+    """
+    Looks up a cached answer; None when the cache is disabled or unreachable,
+    so the turn goes to the LLM. Embeddings are only computed on an exact miss.
+    """
+    if cache is None:
+        return None
+    try:
+        normalized = normalize_message(user_message)
+        version = inventory_hash(get_all_sweets())
+        key = _key(normalized, version)
+        response, embedding = cache.lookup(key, version), None
+        if response is None and _uses_embeddings():
+            embedding = _get_embeddings().embed_query(normalized)
+            response = cache.lookup(key, version, embedding)
+        return CacheProbe(key, version, embedding, response)
+    except Exception:
+        # Let the agent answer (and report inventory errors properly)
+        return None
+
+
+async def aprobe(user_message: str) -> Optional[CacheProbe]:
+    """Async version of probe."""
+    if cache is None:
+        return None
+    try:
+        normalized = normalize_message(user_message)
+        version = inventory_hash(await aget_all_sweets())
+        key = _key(normalized, version)
+        response, embedding = await cache.alookup(key, version), None
+        if response is None and _uses_embeddings():
+            embedding = await _get_embeddings().aembed_query(normalized)
+            response = await cache.alookup(key, version, embedding)
+        return CacheProbe(key, version, embedding, response)
+    except Exception:
+        return None
+
+
+def remember(cache_probe: Optional[CacheProbe], result) -> None:
+    """Stores the turn's answer if it is safe to replay."""
+    if cache_probe is None or not is_cacheable(result):
+        return
+    cache.store(
+        cache_probe.key,
+        cache_probe.inventory_version,
+        result["messages"][-1].content,
+        cache_probe.embedding,
+    )
+
+
+async def aremember(cache_probe: Optional[CacheProbe], result) -> None:
+    """Async version of remember."""
+    if cache_probe is None or not is_cacheable(result):
+        return
+    await cache.astore(
+        cache_probe.key,
+        cache_probe.inventory_version,
+        result["messages"][-1].content,
+        cache_probe.embedding,
+    )
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from redis.exceptions import LockNotOwnedError
+from redis_client import get_async_redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Turns of one session run one at a time across all workers (needs Redis)
+SESSION_REDIS_LOCK = os.getenv("SESSION_REDIS_LOCK", "true").lower() == "true"
+# Seconds a worker may hold a session's lock before it expires on its own
+SESSION_LOCK_TTL = float(os.getenv("SESSION_LOCK_TTL", "120"))
+# Seconds a request waits for its session's lock before giving up
+SESSION_LOCK_WAIT = float(os.getenv("SESSION_LOCK_WAIT", "60"))
+# Seconds a reply stays available for retries with the same Idempotency-Key
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "300"))
+
+LOCK_KEY_PREFIX = "session_lock:"
+RESULT_KEY_PREFIX = "idempotency:"
+
+SESSION_BUSY_DETAIL = "Another request for this session is still running"
+
+
+class SessionBusyError(Exception):
+    """Raised when a session's lock can't be acquired within SESSION_LOCK_WAIT."""
+
+
+# session_id -> [lock, number of requests holding or waiting for it]
+_locks: Dict[str, list] = {}
+# (session_id, key) -> future of the in-flight request's result
+_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+# session_id -> work its Redis lock must outlive, for sessions this context holds
+_held: contextvars.ContextVar[Optional[Dict[str, List[Callable]]]] = (
+    contextvars.ContextVar("session_guard_held", default=None)
+)
+# Releases waiting on that work; referenced so they aren't garbage collected
+_releasing = set()
+
+
+def request_key(message: str, idempotency_key: Optional[str] = None) -> str:
+    """The client's Idempotency-Key, or a hash of the message for double-submits."""
+    if idempotency_key:
+        return idempotency_key
+    return "msg-" + hashlib.sha1(message.encode("utf-8")).hexdigest()
+
+
+@asynccontextmanager
+async def _local_lock(session_id: str):
+    """Serializes a session's turns within this process."""
+    entry = _locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            # Nobody else holds or waits for it, so don't keep it around
+            _locks.pop(session_id, None)
+
+
+@asynccontextmanager
+async def _redis_lock(session_id: str, redis_url: str):
+    """Serializes a session's turns across workers."""
+    if not SESSION_REDIS_LOCK:
+        yield
+        return
+    lock = get_async_redis(redis_url).lock(
+        LOCK_KEY_PREFIX + session_id,
+        timeout=SESSION_LOCK_TTL,
+        blocking_timeout=SESSION_LOCK_WAIT,
+    )
+    if not await lock.acquire():
+        raise SessionBusyError(f"Session {session_id} is busy")
+    # Sessions locked together (a batch chunk) share one registry
+    held, token = _held.get(), None
+    if held is None:
+        held = {}
+        token = _held.set(held)
+    held[session_id] = []
+    try:
+        yield
+    finally:
+        waits = held.pop(session_id)
+        if token is not None:
+            _held.reset(token)
+        if waits:
+            task = asyncio.ensure_future(_release_after(lock, session_id, waits))
+            _releasing.add(task)
+            task.add_done_callback(_releasing.discard)
+        else:
+            await _release(lock, session_id)
+
+
+def hold_session(session_id: str, wait: Callable[[], Awaitable]) -> bool:
+    """
+    Keeps the session's cross-worker lock, if this turn holds it, until
+    `wait()` completes, e.g. until the turn's queued history is saved, so a
+    turn in another worker can't read the history before it. The turn
+    itself returns without waiting. Returns whether the lock is held.
+    """
+    held = _held.get()
+    if held is None or session_id not in held:
+        return False
+    held[session_id].append(wait)
+    return True
+
+
+async def _release_after(lock, session_id: str, waits):
+    try:
+        await asyncio.gather(*(wait() for wait in waits))
+    finally:
+        await _release(lock, session_id)
+
+
+async def _release(lock, session_id: str):
+    try:
+        await lock.release()
+    except LockNotOwnedError:
+        # The turn outlived SESSION_LOCK_TTL and the lock expired (another
+        # worker may hold it now). The reply is still good, so don't fail it.
+        print(f"Session lock for {session_id} expired before the turn finished")
+
+
+@asynccontextmanager
+async def session_lock(session_id: str, redis_url: str):
+    """Holds the session for one turn: in-process first, then across workers."""
+    async with _local_lock(session_id):
+        async with _redis_lock(session_id, redis_url):
+            yield
+
+
+async def run_once(
+    session_id: str,
+    key: str,
+    compute: Callable[[], Awaitable[str]],
+    redis_url: str,
+    replay: bool = False,
+) -> str:
+    """
+    Runs `compute` for one turn of `session_id` while holding the session.
+    Requests with the same key that arrive while it runs wait for and share
+    its result instead of running again. With `replay` (an explicit
+    Idempotency-Key), the result is also kept in Redis for IDEMPOTENCY_TTL
+    so retries reaching any worker later get the same reply.
+    """
+    flight_key = (session_id, key)
+    in_flight = _in_flight.get(flight_key)
+    if in_flight is not None:
+        return await asyncio.shield(in_flight)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[flight_key] = future
+    try:
+        async with session_lock(session_id, redis_url):
+            result = (
+                await _stored_result(session_id, key, redis_url) if replay else None
+            )
+            if result is None:
+                result = await compute()
+                if replay:
+                    await _store_result(session_id, key, result, redis_url)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Duplicates see the exception; don't warn if there were none
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(flight_key, None)
+
+
+def _result_key(session_id: str, key: str) -> str:
+    return f"{RESULT_KEY_PREFIX}{session_id}:{key}"
+
+
+async def _stored_result(session_id: str, key: str, redis_url: str) -> Optional[str]:
+    value = await get_async_redis(redis_url).get(_result_key(session_id, key))
+    return value.decode("utf-8") if value is not None else None
+
+
+async def _store_result(session_id: str, key: str, result: str, redis_url: str):
+    await get_async_redis(redis_url).set(
+        _result_key(session_id, key), result, ex=IDEMPOTENCY_TTL
+    )
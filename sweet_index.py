@@ -0,0 +1,54 @@
+import difflib
+import os
+import re
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Minimum difflib similarity for a fuzzy name match (1.0 disables fuzzy matching)
+SWEET_MATCH_CUTOFF = float(os.getenv("SWEET_MATCH_CUTOFF", "0.85"))
+
+
+def normalize_name(name: str) -> str:
+    """Case-, space- and punctuation-insensitive form of a sweet name."""
+    return re.sub(r"[^0-9a-z]", "", str(name).casefold())
+
+
+class SweetIndex:
+    """
+    Local name -> _id index built from the inventory documents, so purchases
+    can skip the backend's /search round trip.
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def rebuild(self, sweets):
+        """Replaces the index with the names and IDs in `sweets`."""
+        ids = {}
+        for sweet in sweets:
+            if sweet.get("_id") is None or not sweet.get("name"):
+                continue
+            ids.setdefault(normalize_name(sweet["name"]), set()).add(str(sweet["_id"]))
+        # Swap in one assignment so readers never see a half-built index
+        self._ids = ids
+
+    def lookup(self, name: str) -> Optional[str]:
+        """
+        Returns the ID of the one sweet matching `name`, or None when there
+        is no match or the match is ambiguous.
+        """
+        ids = self._ids
+        key = normalize_name(name)
+        matches = ids.get(key)
+        if matches is None:
+            close = difflib.get_close_matches(
+                key, ids.keys(), n=2, cutoff=SWEET_MATCH_CUTOFF
+            )
+            if len(close) != 1:
+                return None
+            matches = ids[close[0]]
+        if len(matches) != 1:
+            return None
+        return next(iter(matches))
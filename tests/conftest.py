@@ -7,6 +7,18 @@ from unittest.mock import Mock
 from langchain_core.messages import AIMessage, HumanMessage
 
 
+@pytest.fixture(autouse=True)
+def reset_inventory_cache():
+    """Keep the in-process inventory cache and name index from leaking between tests."""
+    from database import inventory_cache, sweet_index
+
+    inventory_cache.invalidate()
+    sweet_index.rebuild([])
+    yield
+    inventory_cache.invalidate()
+    sweet_index.rebuild([])
+
+
 @pytest.fixture
 def sample_sweets_data():
     """Sample sweets data for testing."""
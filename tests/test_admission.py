@@ -0,0 +1,115 @@
+"""
+Simple unit tests for admission.py module.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from redis.exceptions import ConnectionError as RedisConnectionError
+from admission import (
+    ConcurrencyLimiter,
+    RequestRejected,
+    check_rate_limits,
+    REJECTED_REQUESTS,
+)
+
+REDIS_URL = "redis://localhost:6379/0"
+
+
+class TestConcurrencyLimiter:
+    """Basic tests for the per-worker concurrency limit."""
+
+    @pytest.mark.asyncio
+    async def test_running_turns_never_exceed_the_limit(self):
+        """Test that extra turns queue for a slot instead of running at once."""
+        # Arrange
+        limiter = ConcurrencyLimiter(limit=2, queue_size=10, queue_timeout=5)
+        running = peak = 0
+
+        async def turn():
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        # Act
+        await asyncio.gather(*(turn() for _ in range(6)))
+
+        # Assert
+        assert peak == 2
+        assert limiter.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_is_rejected_at_once(self):
+        """Test that requests beyond the queue get a 503 with Retry-After."""
+        # Arrange
+        limiter = ConcurrencyLimiter(limit=1, queue_size=0, queue_timeout=5)
+        before = REJECTED_REQUESTS.value(reason="queue_full")
+
+        # Act
+        permit = await limiter.acquire()
+        with pytest.raises(RequestRejected) as excinfo:
+            await limiter.acquire()
+        permit.release()
+        permit.release()
+
+        # Assert
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.retry_after >= 1
+        assert REJECTED_REQUESTS.value(reason="queue_full") == before + 1
+        # The slot came back exactly once
+        await limiter.acquire()
+        assert limiter._get_semaphore().locked()
+
+    @pytest.mark.asyncio
+    async def test_queued_turn_times_out(self):
+        """Test that a turn waiting longer than the queue timeout gets a 503."""
+        # Arrange
+        limiter = ConcurrencyLimiter(limit=1, queue_size=5, queue_timeout=0.01)
+
+        # Act
+        await limiter.acquire()
+        with pytest.raises(RequestRejected) as excinfo:
+            await limiter.acquire()
+
+        # Assert
+        assert excinfo.value.status_code == 503
+        assert limiter.waiting == 0
+
+
+class TestRateLimits:
+    """Basic tests for the Redis token buckets."""
+
+    @pytest.mark.asyncio
+    async def test_empty_bucket_is_rejected_with_retry_after(self):
+        """Test that a session out of tokens gets a 429 telling it when to retry."""
+        # Arrange
+        take_token = AsyncMock(side_effect=[(True, 0.0), (False, 2.4)])
+
+        # Act
+        with patch("admission._take_token", take_token):
+            with pytest.raises(RequestRejected) as excinfo:
+                await check_rate_limits("s1", "10.0.0.1", REDIS_URL)
+
+        # Assert
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.retry_after == 3
+        keys = [call.args[1] for call in take_token.await_args_list]
+        assert keys == ["session:s1", "ip:10.0.0.1"]
+
+    @pytest.mark.asyncio
+    async def test_disabled_limits_and_redis_outages_let_requests_through(self):
+        """Test that a limit of 0 skips its bucket and Redis errors fail open."""
+        # Arrange
+        take_token = AsyncMock(side_effect=RedisConnectionError("down"))
+
+        # Act
+        with patch("admission._take_token", take_token), patch(
+            "admission.SESSION_RATE_LIMIT", 0
+        ):
+            await check_rate_limits("s1", "10.0.0.1", REDIS_URL)
+
+        # Assert
+        assert take_token.await_args.args[1] == "ip:10.0.0.1"
@@ -0,0 +1,118 @@
+"""
+Simple unit tests for batch.py module.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from fakeredis import aioredis as fake_aioredis
+from langchain_core.messages import AIMessage
+from admission import RequestRejected
+from batch import BatchItem, arun_batch, waves
+from history import AsyncRedisChatMessageHistory
+
+REDIS_URL = "redis://localhost:6379/0"
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    """Histories in fakeredis; no Lua there for Redis locks or rate limits."""
+    redis = fake_aioredis.FakeRedis()
+    with patch("history.get_async_redis", return_value=redis), patch(
+        "session_guard.SESSION_REDIS_LOCK", False
+    ), patch("batch.check_rate_limits", new_callable=AsyncMock):
+        yield redis
+
+
+async def fake_turn(session_id, new_message, load_history):
+    """Replies with how many stored messages the turn saw."""
+    messages, _ = await load_history()
+    if new_message.content == "fail":
+        raise RuntimeError("LLM down")
+    reply = f"{new_message.content} after {len(messages)}"
+    return {"messages": [AIMessage(content=reply)]}, None
+
+
+class TestWaves:
+    """Basic tests for grouping batch items."""
+
+    def test_each_session_appears_once_per_wave_in_order(self):
+        """Test that wave k holds every session's k-th message."""
+        # Arrange
+        items = [
+            BatchItem(0, "s1", "a"),
+            BatchItem(1, "s2", "b"),
+            BatchItem(2, "s1", "c"),
+            BatchItem(3, "s1", "d"),
+        ]
+
+        # Act
+        grouped = waves(items)
+
+        # Assert
+        assert [[item.index for item in wave] for wave in grouped] == [
+            [0, 1],
+            [2],
+            [3],
+        ]
+
+
+class TestRunBatch:
+    """Basic tests for answering a batch."""
+
+    @pytest.mark.asyncio
+    @patch("batch.arun_turn", side_effect=fake_turn)
+    @patch("batch.CHAT_BATCH_CHUNK_SIZE", 2)
+    async def test_session_turns_see_earlier_ones_and_are_saved(self, mock_turn):
+        """Test that a session's later message sees the earlier turn and all turns are stored."""
+        # Arrange
+        items = [
+            BatchItem(0, "s1", "first"),
+            BatchItem(1, "s2", "hello"),
+            BatchItem(2, "s3", "hey"),
+            BatchItem(3, "s1", "second"),
+        ]
+
+        # Act
+        results = [result async for result in arun_batch(items, REDIS_URL)]
+
+        # Assert
+        responses = {result["index"]: result["response"] for result in results}
+        assert responses == {
+            0: "first after 0",
+            1: "hello after 0",
+            2: "hey after 0",
+            3: "second after 2",
+        }
+        stored = await AsyncRedisChatMessageHistory("s1").aget_messages()
+        assert [m.content for m in stored] == [
+            "first",
+            "first after 0",
+            "second",
+            "second after 2",
+        ]
+
+    @pytest.mark.asyncio
+    @patch("batch.arun_turn", side_effect=fake_turn)
+    async def test_failed_items_do_not_affect_others(self, mock_turn):
+        """Test that failing and rate-limited items get errors while the rest are answered."""
+        # Arrange
+        items = [
+            BatchItem(0, "s1", "fail"),
+            BatchItem(1, "s2", "hello"),
+            BatchItem(2, "s3", "hey"),
+        ]
+
+        async def rate_limit(session_id, client_ip, redis_url):
+            if session_id == "s3":
+                raise RequestRejected(429, "slow down", 1)
+
+        # Act
+        with patch("batch.check_rate_limits", side_effect=rate_limit):
+            results = [result async for result in arun_batch(items, REDIS_URL)]
+
+        # Assert
+        by_index = {result["index"]: result for result in results}
+        assert by_index[0]["status"] == 500
+        assert by_index[1]["response"] == "hello after 0"
+        assert by_index[2]["status"] == 429
+        assert await AsyncRedisChatMessageHistory("s1").aget_messages() == []
@@ -0,0 +1,40 @@
+"""
+Smoke tests for the offline benchmark harness.
+"""
+
+from benchmarks.harness import BenchmarkConfig, compare, run_benchmark
+
+
+class TestBenchmarkHarness:
+    """Basic tests for the load-test harness."""
+
+    def test_harness_runs_the_real_app_offline(self):
+        """Test that scripted sessions complete against the local stand-ins."""
+        # Act
+        result = run_benchmark(
+            BenchmarkConfig(sessions=3, turns=3, llm_latency=0, backend_latency=0)
+        )
+
+        # Assert
+        assert result.requests == 9
+        assert result.errors == 0
+        assert 0 < result.p50_ms <= result.p95_ms <= result.p99_ms
+
+    def test_compare_flags_slower_and_failing_runs(self):
+        """Test that latency, throughput and errors beyond tolerance are regressions."""
+        # Arrange
+        baseline = {
+            "p50_ms": 100,
+            "p95_ms": 200,
+            "p99_ms": 300,
+            "requests_per_second": 50,
+            "errors": 0,
+        }
+        result = dict(baseline, p95_ms=260, requests_per_second=30, errors=1)
+
+        # Act
+        problems = compare(result, baseline, tolerance=0.25)
+
+        # Assert
+        assert len(problems) == 3
+        assert compare(baseline, baseline, tolerance=0.25) == []
@@ -3,19 +3,31 @@ Simple unit tests for chatbot.py module.
 """
 
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from chatbot import AgentState, call_model, should_continue, graph
+from chatbot import (
+    AgentState,
+    acall_model,
+    call_model,
+    should_continue,
+    should_summarize,
+    summarize_history,
+    get_agent_graph,
+)
 
 
 class TestAgentGraph:
     """Basic tests for the agent graph."""
 
     def test_graph_compiles_successfully(self):
-        """Test that the graph compiles without errors."""
-        # Act & Assert
+        """Test that the graph compiles (lazily, on first use) without errors."""
+        # Act
+        graph = get_agent_graph()
+
+        # Assert
         assert graph is not None
         assert hasattr(graph, "invoke")
+        assert get_agent_graph() is graph
 
     @patch("chatbot.llm_with_tools")
     def test_call_model_adds_system_prompt(self, mock_llm):
@@ -38,6 +50,24 @@ class TestAgentGraph:
         assert len(called_messages) == 2
         assert isinstance(called_messages[0], SystemMessage)
 
+    @pytest.mark.asyncio
+    @patch("chatbot.llm_with_tools")
+    async def test_acall_model_adds_system_prompt(self, mock_llm):
+        """Test that the async node also prepends the system prompt."""
+        # Arrange
+        mock_response = AIMessage(content="Hello! How can I help?")
+        mock_llm.ainvoke = AsyncMock(return_value=mock_response)
+
+        state = AgentState(messages=[HumanMessage(content="Hello")])
+
+        # Act
+        result = await acall_model(state)
+
+        # Assert
+        assert result["messages"][0] == mock_response
+        called_messages = mock_llm.ainvoke.call_args[0][0]
+        assert isinstance(called_messages[0], SystemMessage)
+
     def test_should_continue_with_tool_calls(self):
         """Test should_continue returns 'call_tool' when AI has tool calls."""
         # Arrange
@@ -66,10 +96,279 @@ class TestAgentGraph:
         assert result == "end"
 
 
+class TestIterationCap:
+    """Basic tests for bounding agent <-> tools loops."""
+
+    @patch("chatbot.MAX_AGENT_ITERATIONS", 3)
+    @patch("chatbot.llm_without_tool_calls")
+    @patch("chatbot.llm_with_tools")
+    def test_last_iteration_cannot_call_tools(self, mock_llm, mock_final_llm):
+        """Test that the final allowed LLM call uses the no-tool-calls model."""
+        # Arrange
+        mock_final_llm.invoke.return_value = AIMessage(content="Final answer")
+        state = AgentState(messages=[HumanMessage(content="Hi")], iterations=2)
+
+        # Act
+        result = call_model(state)
+
+        # Assert
+        assert result["messages"][0].content == "Final answer"
+        mock_llm.invoke.assert_not_called()
+
+    @patch("chatbot.MAX_AGENT_ITERATIONS", 3)
+    @patch("tools.get_all_sweets", return_value=[])
+    @patch("chatbot.llm_without_tool_calls")
+    @patch("chatbot.llm_with_tools")
+    def test_runaway_tool_loop_is_stopped(
+        self, mock_llm, mock_final_llm, mock_get_all_sweets
+    ):
+        """Test that a model that always calls tools still ends the turn."""
+        # Arrange
+        mock_llm.invoke.side_effect = lambda messages: AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "get_available_sweets",
+                    "args": {},
+                    "id": f"call_{len(messages)}",
+                }
+            ],
+        )
+        mock_final_llm.invoke.return_value = AIMessage(content="Final answer")
+
+        # Act
+        result = get_agent_graph().invoke({"messages": [HumanMessage(content="Hi")]})
+
+        # Assert
+        assert result["messages"][-1].content == "Final answer"
+        assert mock_llm.invoke.call_count == 2
+        assert result["iterations"] == 3
+
+
+class TestModelRouting:
+    """Basic tests for small/large model tiers."""
+
+    _tool_call = {"name": "get_available_sweets", "args": {}, "id": "call_1"}
+
+    @patch("chatbot.MODEL_ROUTING", True)
+    @patch("chatbot.small_llm_with_tools")
+    @patch("chatbot.llm_with_tools")
+    def test_small_model_picks_tools_and_large_model_answers(
+        self, mock_llm, mock_small_llm
+    ):
+        """Test that the first hop uses the small model and the answer the large one."""
+        # Arrange
+        from langchain_core.messages import ToolMessage
+
+        tool_request = AIMessage(content="", tool_calls=[self._tool_call])
+        mock_small_llm.invoke.return_value = tool_request
+        mock_llm.invoke.return_value = AIMessage(content="We have Ladoo.")
+        question = HumanMessage(content="What do you have?")
+        tool_result = ToolMessage(content="- Ladoo", tool_call_id="call_1")
+
+        # Act
+        first = call_model(AgentState(messages=[question]))
+        second = call_model(
+            AgentState(messages=[question, tool_request, tool_result], iterations=1)
+        )
+
+        # Assert
+        assert first["messages"][0] is tool_request
+        assert second["messages"][0].content == "We have Ladoo."
+        mock_small_llm.invoke.assert_called_once()
+        mock_llm.invoke.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("chatbot.MODEL_ROUTING", True)
+    @patch("chatbot.small_llm_with_tools")
+    @patch("chatbot.llm_with_tools")
+    async def test_direct_small_model_answer_is_escalated(
+        self, mock_llm, mock_small_llm
+    ):
+        """Test that a small-model reply without a tool call is redone by the large model."""
+        # Arrange
+        from metrics import MODEL_ESCALATIONS
+
+        before = MODEL_ESCALATIONS.value()
+        mock_small_llm.ainvoke = AsyncMock(return_value=AIMessage(content="Maybe?"))
+        mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content="Which sweet?"))
+        state = AgentState(messages=[HumanMessage(content="the usual please")])
+
+        # Act
+        result = await acall_model(state)
+
+        # Assert
+        assert result["messages"][0].content == "Which sweet?"
+        assert MODEL_ESCALATIONS.value() == before + 1
+
+    @patch(
+        "chatbot.MODEL_TIERS",
+        {"route": "small", "answer": "small", "summarize": "small"},
+    )
+    @patch("chatbot.MODEL_ROUTING", True)
+    @patch("chatbot.small_llm_with_tools")
+    @patch("chatbot.llm_with_tools")
+    def test_small_answer_tier_is_not_escalated(self, mock_llm, mock_small_llm):
+        """Test that with answer=small a final answer from tool results stays on the small model."""
+        # Arrange
+        from langchain_core.messages import ToolMessage
+        from metrics import MODEL_ESCALATIONS
+
+        before = MODEL_ESCALATIONS.value()
+        tool_request = AIMessage(content="", tool_calls=[self._tool_call])
+        mock_small_llm.invoke.side_effect = [
+            tool_request,
+            AIMessage(content="We have Ladoo."),
+        ]
+        question = HumanMessage(content="What do you have?")
+        tool_result = ToolMessage(content="- Ladoo", tool_call_id="call_1")
+
+        # Act
+        call_model(AgentState(messages=[question]))
+        answer = call_model(
+            AgentState(messages=[question, tool_request, tool_result], iterations=1)
+        )
+
+        # Assert
+        assert answer["messages"][0].content == "We have Ladoo."
+        mock_llm.invoke.assert_not_called()
+        assert MODEL_ESCALATIONS.value() == before
+
+    @patch("chatbot.llm_with_tools")
+    @patch("chatbot.small_llm_with_tools")
+    def test_routing_is_off_by_default(self, mock_small_llm, mock_llm):
+        """Test that every step uses the large model unless MODEL_ROUTING is set."""
+        # Arrange
+        mock_llm.invoke.return_value = AIMessage(content="Hello!")
+
+        # Act
+        call_model(AgentState(messages=[HumanMessage(content="Hi")]))
+
+        # Assert
+        mock_small_llm.invoke.assert_not_called()
+
+    def test_small_model_tokens_are_not_streamed(self):
+        """Test that tokens from a small-model run, which may be discarded, aren't forwarded."""
+        # Arrange
+        from chatbot import SMALL_MODEL_TAG, _client_event
+        from langchain_core.messages import AIMessageChunk
+
+        event = {
+            "event": "on_chat_model_stream",
+            "data": {"chunk": AIMessageChunk(content="Maybe")},
+            "metadata": {"langgraph_node": "agent"},
+        }
+
+        # Act / Assert
+        assert _client_event(event) == {"event": "token", "data": "Maybe"}
+        assert _client_event({**event, "tags": [SMALL_MODEL_TAG]}) is None
+
+    def test_tier_rules_are_validated(self):
+        """Test that MODEL_TIERS rules override defaults and typos are rejected."""
+        # Arrange
+        from chatbot import _parse_model_tiers
+
+        # Act
+        tiers = _parse_model_tiers("answer=small, summarize=large")
+
+        # Assert
+        assert tiers == {"route": "small", "answer": "small", "summarize": "large"}
+        with pytest.raises(ValueError):
+            _parse_model_tiers("answer=medium")
+
+
+class TestSummarization:
+    """Basic tests for rolling conversation summarization."""
+
+    @staticmethod
+    def _long_history(turns):
+        messages = []
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"question {i} " * 20))
+            messages.append(AIMessage(content=f"answer {i} " * 20))
+        return messages + [HumanMessage(content="latest question")]
+
+    @patch("chatbot.SUMMARY_TRIGGER_TOKENS", 50)
+    @patch("chatbot.SUMMARY_ENABLED", True)
+    def test_should_summarize_when_over_budget(self):
+        """Test that long histories are routed through the summarize node."""
+        # Arrange
+        state = AgentState(messages=self._long_history(5))
+
+        # Act & Assert
+        assert should_summarize(state) == "summarize"
+
+    def test_should_not_summarize_when_disabled(self):
+        """Test that summarization is skipped by default."""
+        # Arrange
+        state = AgentState(messages=self._long_history(5))
+
+        # Act & Assert
+        assert should_summarize(state) == "agent"
+
+    @patch("chatbot.SUMMARY_KEEP_MESSAGES", 4)
+    @patch("chatbot.llm")
+    def test_summarize_history_folds_whole_exchanges(self, mock_llm):
+        """Test that older turns are folded and the kept tail starts on a human turn."""
+        # Arrange
+        mock_llm.invoke.return_value = AIMessage(content="Customer likes barfi.")
+        messages = self._long_history(5)
+        state = AgentState(messages=messages)
+
+        # Act
+        result = summarize_history(state)
+
+        # Assert
+        assert result["summary"] == "Customer likes barfi."
+        assert isinstance(messages[result["summarized_count"]], HumanMessage)
+        assert len(messages) - result["summarized_count"] <= 5
+
+    @patch("chatbot.SUMMARY_ENABLED", True)
+    @patch("chatbot.llm")
+    def test_turns_leaving_the_window_are_summarized_before_trimming(self, mock_llm):
+        """Test that stored turns outside the prompt window are folded, not dropped."""
+        # Arrange
+        from chatbot import _kept_after_summary, _turn_state
+
+        mock_llm.invoke.return_value = AIMessage(content="Customer likes barfi.")
+        *stored, new_message = self._long_history(15)
+        state = _turn_state(stored, "", new_message)
+
+        # Act
+        route = should_summarize(state)
+        result = summarize_history(state)
+        keep = _kept_after_summary(result, len(stored))
+
+        # Assert
+        assert state["older_count"] > 0
+        assert route == "summarize"
+        assert result["summarized_count"] >= state["older_count"]
+        # Everything trimmed from the stored list went into the summary
+        assert len(stored) - (keep - 2) == result["summarized_count"]
+
+    @patch("chatbot.llm_with_tools")
+    def test_call_model_sends_summary_and_recent_turns_only(self, mock_llm):
+        """Test that folded turns are replaced by the summary in the prompt."""
+        # Arrange
+        mock_llm.invoke.return_value = AIMessage(content="Sure!")
+        messages = self._long_history(3)
+        state = AgentState(
+            messages=messages, summary="Customer likes barfi.", summarized_count=4
+        )
+
+        # Act
+        call_model(state)
+
+        # Assert
+        called_messages = mock_llm.invoke.call_args[0][0]
+        assert "Customer likes barfi." in called_messages[1].content
+        assert called_messages[2:] == messages[4:]
+
+
 class TestAgentWithHistory:
     """Basic tests for agent with chat history."""
 
-    @patch("chatbot.RedisChatMessageHistory")
+    @patch("chatbot.WindowedRedisChatMessageHistory")
     @patch("chatbot.graph")
     def test_agent_with_history_basic_flow(self, mock_graph, mock_redis):
         """Test basic agent with history functionality."""
@@ -77,7 +376,7 @@ class TestAgentWithHistory:
         from chatbot import get_agent_with_history
 
         mock_history = Mock()
-        mock_history.messages = []
+        mock_history.get_recent_messages.return_value = []
         mock_redis.return_value = mock_history
 
         mock_graph.invoke.return_value = {"messages": [AIMessage(content="Response")]}
@@ -89,4 +388,217 @@ class TestAgentWithHistory:
         # Assert
         assert isinstance(result, AIMessage)
         assert result.content == "Response"
-        assert mock_history.add_message.call_count == 2  # User + AI message
+        # User + AI message written together in one call
+        mock_history.add_messages.assert_called_once()
+        assert len(mock_history.add_messages.call_args[0][0]) == 2
+
+    @pytest.mark.asyncio
+    @patch("chatbot.AsyncRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    async def test_async_agent_with_history_basic_flow(self, mock_graph, mock_redis):
+        """Test the async agent loads history, awaits the graph and saves both messages."""
+        # Arrange
+        from chatbot import get_async_agent_with_history
+
+        mock_history = Mock()
+        mock_history.aget_recent_messages = AsyncMock(return_value=[])
+        mock_history.aget_summary = AsyncMock(return_value="")
+        mock_history.aadd_messages = AsyncMock()
+        mock_redis.return_value = mock_history
+
+        mock_graph.ainvoke = AsyncMock(
+            return_value={"messages": [AIMessage(content="Response")]}
+        )
+
+        # Act
+        agent = get_async_agent_with_history("test_session")
+        result = await agent("Hello")
+
+        # Assert
+        assert result.content == "Response"
+        saved = mock_history.aadd_messages.call_args[0][0]
+        assert isinstance(saved[0], HumanMessage)
+        assert saved[1] == result
+
+    @pytest.mark.asyncio
+    @patch("chatbot.history_writer")
+    @patch("chatbot.HISTORY_WRITE_BEHIND", True)
+    @patch("chatbot.AsyncRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    async def test_async_agent_queues_history_with_write_behind(
+        self, mock_graph, mock_redis, mock_writer
+    ):
+        """Test that write-behind hands the turn to the writer instead of saving it."""
+        # Arrange
+        from chatbot import get_async_agent_with_history
+
+        mock_history = Mock()
+        mock_history.aget_recent_messages = AsyncMock(return_value=[])
+        mock_history.aget_summary = AsyncMock(return_value="")
+        mock_history.aadd_messages = AsyncMock()
+        mock_redis.return_value = mock_history
+        mock_writer.submit = AsyncMock()
+
+        mock_graph.ainvoke = AsyncMock(
+            return_value={"messages": [AIMessage(content="Response")]}
+        )
+
+        # Act
+        agent = get_async_agent_with_history("test_session")
+        result = await agent("Hello")
+
+        # Assert
+        mock_history.aadd_messages.assert_not_awaited()
+        [(history, saved, summary)] = mock_writer.submit.call_args[0][0]
+        assert history is mock_history
+        assert saved[1] == result
+        assert summary is None
+
+    @pytest.mark.asyncio
+    @patch("chatbot.AsyncRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    async def test_streaming_agent_yields_tokens_and_saves_history(
+        self, mock_graph, mock_redis
+    ):
+        """Test the streaming agent forwards tokens and tool events, then saves history."""
+        # Arrange
+        from chatbot import get_streaming_agent_with_history
+        from langchain_core.messages import AIMessageChunk
+
+        mock_history = Mock()
+        mock_history.aget_recent_messages = AsyncMock(return_value=[])
+        mock_history.aget_summary = AsyncMock(return_value="")
+        mock_history.aadd_messages = AsyncMock()
+        mock_redis.return_value = mock_history
+
+        final_message = AIMessage(content="Hi there")
+
+        async def fake_events(state, config, version):
+            yield {
+                "event": "on_tool_start",
+                "name": "get_available_sweets",
+                "data": {"input": {}},
+                "parent_ids": ["root"],
+            }
+            yield {
+                "event": "on_tool_end",
+                "name": "get_available_sweets",
+                "data": {"output": "stock"},
+                "parent_ids": ["root"],
+            }
+            yield {
+                "event": "on_chat_model_stream",
+                "data": {"chunk": AIMessageChunk(content="Hi there")},
+                "metadata": {"langgraph_node": "agent"},
+                "parent_ids": ["root"],
+            }
+            yield {
+                "event": "on_chain_end",
+                "name": "LangGraph",
+                "data": {"output": {"messages": [final_message]}},
+                "parent_ids": [],
+            }
+
+        mock_graph.astream_events = fake_events
+
+        # Act
+        agent = get_streaming_agent_with_history("test_session")
+        events = [event async for event in agent("Hello")]
+
+        # Assert
+        assert [e["event"] for e in events] == [
+            "tool_start",
+            "tool_end",
+            "token",
+            "end",
+        ]
+        assert events[-1]["data"] == "Hi there"
+        saved = mock_history.aadd_messages.call_args[0][0]
+        assert saved[1] == final_message
+
+    @patch("chatbot.fast_path.answer", return_value=None)
+    @patch("chatbot.response_cache.probe")
+    @patch("chatbot.WindowedRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    def test_cached_answer_skips_the_graph(
+        self, mock_graph, mock_redis, mock_probe, mock_fast_path
+    ):
+        """Test that a response cache hit is answered without running the graph."""
+        # Arrange
+        from chatbot import get_agent_with_history
+        from response_cache import CacheProbe
+
+        mock_history = Mock()
+        mock_history.get_recent_messages.return_value = []
+        mock_history.get_summary.return_value = ""
+        mock_redis.return_value = mock_history
+        mock_probe.return_value = CacheProbe("key", "v1", None, "We have Barfi.")
+
+        # Act
+        agent = get_agent_with_history("test_session")
+        result = agent("What sweets do you have?")
+
+        # Assert
+        assert result.content == "We have Barfi."
+        mock_graph.invoke.assert_not_called()
+        mock_history.add_messages.assert_called_once()
+
+    @patch("chatbot.fast_path.answer", return_value=None)
+    @patch("chatbot.response_cache.probe")
+    @patch("chatbot.WindowedRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    def test_session_with_history_never_gets_cached_answer(
+        self, mock_graph, mock_redis, mock_probe, mock_fast_path
+    ):
+        """Test that a follow-up in an ongoing session goes to the graph."""
+        # Arrange
+        from chatbot import get_agent_with_history
+
+        mock_history = Mock()
+        mock_history.get_recent_messages.return_value = [
+            AIMessage(content="Confirm 2 Gulab Jamun for ₹50?")
+        ]
+        mock_history.get_summary.return_value = ""
+        mock_redis.return_value = mock_history
+        mock_graph.invoke.return_value = {
+            "messages": [AIMessage(content="Bought 2 Gulab Jamun.")]
+        }
+
+        # Act
+        agent = get_agent_with_history("test_session")
+        result = agent("yes")
+
+        # Assert
+        assert result.content == "Bought 2 Gulab Jamun."
+        mock_probe.assert_not_called()
+        mock_graph.invoke.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("fast_path.aget_all_sweets", new_callable=AsyncMock)
+    @patch("chatbot.AsyncRedisChatMessageHistory")
+    @patch("chatbot.graph")
+    async def test_fast_path_answers_without_llm_and_saves_history(
+        self, mock_graph, mock_redis, mock_aget_all_sweets, sample_sweets_data
+    ):
+        """Test that a price question is answered from inventory and still recorded."""
+        # Arrange
+        from chatbot import get_async_agent_with_history
+
+        mock_aget_all_sweets.return_value = sample_sweets_data
+        mock_history = Mock()
+        mock_history.aadd_messages = AsyncMock()
+        mock_redis.return_value = mock_history
+        mock_graph.ainvoke = AsyncMock()
+
+        # Act
+        agent = get_async_agent_with_history("test_session")
+        result = await agent("How much is Gulab Jamun?")
+
+        # Assert
+        assert result.content == "Gulab Jamun costs ₹25.50."
+        mock_graph.ainvoke.assert_not_called()
+        saved = mock_history.aadd_messages.call_args[0][0]
+        assert [m.content for m in saved] == [
+            "How much is Gulab Jamun?",
+            result.content,
+        ]
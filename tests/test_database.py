@@ -2,9 +2,23 @@
 Simple unit tests for database.py module.
 """
 
+import threading
+import fakeredis
 import pytest
-from unittest.mock import patch
-from database import get_all_sweets
+from unittest.mock import MagicMock, Mock, patch
+from database import (
+    INVENTORY_PROJECTION,
+    SWEET_PROJECTION,
+    RedisInventoryCache,
+    _WatcherLease,
+    find_sweet_id,
+    find_sweets,
+    sweets_filter,
+    get_all_sweets,
+    invalidate_inventory_cache,
+    _inventory_fingerprint,
+)
+from sweet_index import SweetIndex
 
 
 class TestDatabase:
@@ -23,7 +37,7 @@ class TestDatabase:
         assert len(result) == 2
         assert result[0]["name"] == "Gulab Jamun"
         assert result[1]["name"] == "Rasgulla"
-        mock_collection.find.assert_called_once_with({}, {"_id": 0})
+        mock_collection.find.assert_called_once_with({}, INVENTORY_PROJECTION)
 
     @patch("database.sweets_collection")
     def test_get_all_sweets_empty_database(self, mock_collection):
@@ -36,3 +50,285 @@ class TestDatabase:
 
         # Assert
         assert result == []
+
+    @patch("database.sweets_collection")
+    def test_get_all_sweets_hides_ids_but_indexes_them(self, mock_collection):
+        """Test that IDs are kept out of results but feed the name index."""
+        # Arrange
+        mock_collection.find.return_value = [
+            {"_id": "sweet1", "name": "Gulab Jamun", "price": 25.5, "quantity": 10}
+        ]
+
+        # Act
+        result = get_all_sweets()
+
+        # Assert
+        assert "_id" not in result[0]
+        assert find_sweet_id("gulab jamun") == "sweet1"
+
+
+class TestConnection:
+    """Basic tests for lazily created MongoDB clients."""
+
+    @patch("database.sweets_collection", None)
+    @patch("database.pymongo.MongoClient")
+    def test_client_is_created_on_first_use_only(self, mock_client_class):
+        """Test that the sync client connects once, on the first query."""
+        # Arrange
+        collection = mock_client_class.return_value.get_database.return_value.sweets
+        collection.find.return_value = []
+
+        # Act
+        get_all_sweets()
+        invalidate_inventory_cache()
+        get_all_sweets()
+
+        # Assert
+        mock_client_class.assert_called_once()
+        assert collection.find.call_count == 2
+
+
+class TestFindSweets:
+    """Basic tests for server-side filtered inventory queries."""
+
+    def test_filter_combines_conditions(self):
+        """Test that every filter becomes a MongoDB condition."""
+        # Act
+        query = sweets_filter(
+            name="jamun", min_price=10, max_price=30, in_stock_only=True
+        )
+
+        # Assert
+        assert query == {
+            "name": {"$regex": "jamun", "$options": "i"},
+            "price": {"$gte": 10, "$lte": 30},
+            "quantity": {"$gt": 0},
+        }
+
+    def test_filter_escapes_regex_characters(self):
+        """Test that customer text is matched literally."""
+        # Act & Assert
+        assert sweets_filter(name="a.*")["name"]["$regex"] == "a\\.\\*"
+
+    @patch("database.sweets_collection")
+    def test_top_n_query_is_sorted_limited_and_projected(self, mock_collection):
+        """Test that top-N questions only fetch N documents and the shown fields."""
+        # Arrange
+        mock_collection.find.return_value = [
+            {"name": "Rasgulla", "price": 20.0, "quantity": 15}
+        ]
+
+        # Act
+        result = find_sweets(sort_by="price", limit=1, in_stock_only=True)
+
+        # Assert
+        assert result[0]["name"] == "Rasgulla"
+        mock_collection.find.assert_called_once_with(
+            {"quantity": {"$gt": 0}},
+            projection=SWEET_PROJECTION,
+            limit=1,
+            sort=[("price", 1)],
+        )
+
+    def test_unknown_sort_field_is_rejected(self):
+        """Test that only known fields can be sorted on."""
+        # Act & Assert
+        with pytest.raises(ValueError):
+            find_sweets(sort_by="secret")
+
+
+class TestInventoryCache:
+    """Basic tests for the inventory cache in front of get_all_sweets."""
+
+    @patch("database.sweets_collection")
+    def test_repeated_reads_hit_the_cache(self, mock_collection, sample_sweets_data):
+        """Test that a second read within the TTL does not query MongoDB."""
+        # Arrange
+        mock_collection.find.return_value = sample_sweets_data
+
+        # Act
+        first = get_all_sweets()
+        second = get_all_sweets()
+
+        # Assert
+        assert first == second
+        mock_collection.find.assert_called_once()
+
+    @patch("database.sweets_collection")
+    def test_invalidate_forces_reload(self, mock_collection, sample_sweets_data):
+        """Test that invalidation makes the next read go to MongoDB."""
+        # Arrange
+        mock_collection.find.return_value = sample_sweets_data
+        get_all_sweets()
+
+        # Act
+        invalidate_inventory_cache()
+        get_all_sweets()
+
+        # Assert
+        assert mock_collection.find.call_count == 2
+
+    @patch("database.sweets_collection")
+    def test_expired_entries_are_reloaded(self, mock_collection, sample_sweets_data):
+        """Test that snapshots older than the TTL are not served."""
+        # Arrange
+        mock_collection.find.return_value = sample_sweets_data
+
+        # Act
+        with patch("database.time.monotonic", side_effect=[0, 100, 100]):
+            get_all_sweets()
+            get_all_sweets()
+
+        # Assert
+        assert mock_collection.find.call_count == 2
+
+    @patch("database.sweets_collection")
+    def test_fingerprint_tracks_latest_update(self, mock_collection):
+        """Test that the polling fingerprint combines count and latest updatedAt."""
+        # Arrange
+        mock_collection.estimated_document_count.return_value = 2
+        mock_collection.find_one.return_value = {"updatedAt": "2024-01-01"}
+
+        # Act
+        fingerprint = _inventory_fingerprint()
+
+        # Assert
+        assert fingerprint == (2, "2024-01-01")
+
+    @patch("database.inventory_cache")
+    @patch("database._inventory_fingerprint")
+    def test_poller_survives_mongo_being_down_at_start(
+        self, mock_fingerprint, mock_cache
+    ):
+        """Test that a failed first poll doesn't kill the watcher and later changes still count."""
+        # Arrange
+        from pymongo.errors import ServerSelectionTimeoutError
+        from database import _poll_inventory
+
+        mock_fingerprint.side_effect = [
+            ServerSelectionTimeoutError("mongo down"),
+            (2, "2024-01-01"),
+            (2, "2024-01-01"),
+            (2, "2024-01-02"),
+        ]
+        stop = Mock(wait=Mock(side_effect=[False, False, False, True]))
+
+        # Act
+        _poll_inventory(stop)
+
+        # Assert
+        mock_cache.invalidate.assert_called_once()
+
+    @patch("database.inventory_cache")
+    @patch("database.get_sweets_collection")
+    def test_local_watcher_restarts_after_an_error(
+        self, mock_get_collection, mock_cache
+    ):
+        """Test that a dropped change stream is watched again rather than abandoned."""
+        # Arrange
+        from pymongo.errors import ServerSelectionTimeoutError
+        from database import _run_watcher
+
+        stop = threading.Event()
+        stream = MagicMock()
+        stream.__enter__.return_value.try_next.side_effect = lambda: stop.set() or {}
+        mock_get_collection.return_value.watch.side_effect = [
+            ServerSelectionTimeoutError("mongo down"),
+            stream,
+        ]
+
+        # Act
+        with patch("database.INVENTORY_POLL_INTERVAL", 0):
+            _run_watcher(stop)
+
+        # Assert
+        assert mock_get_collection.return_value.watch.call_count == 2
+        mock_cache.invalidate.assert_called_once()
+
+
+class TestSharedInventoryCache:
+    """Basic tests for the inventory snapshot shared through Redis."""
+
+    @pytest.fixture
+    def shared_cache(self):
+        """A Redis-backed inventory cache over fakeredis."""
+        server = fakeredis.FakeServer()
+        cache = RedisInventoryCache("redis://localhost:6379/0", ttl=30)
+        with patch(
+            "database.get_redis",
+            side_effect=lambda url: fakeredis.FakeRedis(server=server),
+        ), patch("database.inventory_cache", cache):
+            yield cache
+
+    @patch("database.sweets_collection")
+    def test_workers_share_one_load(
+        self, mock_collection, shared_cache, sample_sweets_data
+    ):
+        """Test that a snapshot loaded by one worker is served to the others."""
+        # Arrange
+        mock_collection.find.return_value = [
+            {"_id": i, **sweet} for i, sweet in enumerate(sample_sweets_data)
+        ]
+        get_all_sweets()
+
+        # Act: another worker, with an empty name index
+        with patch("database.sweet_index", SweetIndex()), patch(
+            "database._indexed_version", None
+        ):
+            result = get_all_sweets()
+            sweet_id = find_sweet_id("Rasgulla")
+
+        # Assert
+        assert result == sample_sweets_data
+        assert sweet_id == "1"
+        mock_collection.find.assert_called_once()
+
+    def test_snapshot_from_before_an_invalidation_is_ignored(
+        self, shared_cache, sample_sweets_data
+    ):
+        """Test that a slow load finishing after a stock change can't be served."""
+        # Arrange
+        _, generation = shared_cache.lookup()
+
+        # Act
+        invalidate_inventory_cache()
+        shared_cache.set(sample_sweets_data, generation)
+
+        # Assert
+        assert shared_cache.lookup() == (None, generation + 1)
+
+    @pytest.mark.asyncio
+    async def test_async_invalidation_uses_async_client(
+        self, shared_cache, sample_sweets_data
+    ):
+        """Test that the async purchase path invalidates without sync Redis calls."""
+        # Arrange
+        from fakeredis import aioredis as fake_aioredis
+        from database import ainvalidate_inventory_cache
+
+        server = fakeredis.FakeServer()
+        with patch(
+            "database.get_async_redis",
+            return_value=fake_aioredis.FakeRedis(server=server),
+        ), patch("database.get_redis", side_effect=AssertionError("sync Redis")):
+            _, generation = await shared_cache.alookup()
+            await shared_cache.aset(sample_sweets_data, generation)
+
+            # Act
+            await ainvalidate_inventory_cache()
+
+            # Assert
+            assert await shared_cache.alookup() == (None, generation + 1)
+
+    def test_only_one_worker_watches_the_inventory(self, shared_cache):
+        """Test that the watcher lease is held by one worker until released."""
+        # Arrange
+        stop = threading.Event()
+        first = _WatcherLease(stop, shared_cache.url)
+        second = _WatcherLease(stop, shared_cache.url)
+
+        # Act / Assert
+        assert first.hold() and first.hold()
+        assert not second.hold()
+        first.release()
+        assert second.hold()
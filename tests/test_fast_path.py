@@ -0,0 +1,93 @@
+"""
+Simple unit tests for fast_path.py module.
+"""
+
+import pytest
+from unittest.mock import patch
+from fast_path import (
+    LIST_INTENT,
+    PRICE_INTENT,
+    STOCK_INTENT,
+    answer,
+    detect_intent,
+    render,
+)
+
+
+class TestDetectIntent:
+    """Basic tests for the keyword/regex intent router."""
+
+    @pytest.mark.parametrize(
+        "message, expected",
+        [
+            ("What sweets do you have?", (LIST_INTENT, None)),
+            ("Show me the menu", (LIST_INTENT, None)),
+            ("How much is Gulab Jamun?", (PRICE_INTENT, "gulab jamun")),
+            ("What's the price of Rasgulla please", (PRICE_INTENT, "rasgulla")),
+            ("Is Gulab Jamun available?", (STOCK_INTENT, "gulab jamun")),
+            ("How many rasgullas do you have?", (STOCK_INTENT, "rasgullas")),
+        ],
+    )
+    def test_simple_inventory_questions_are_recognised(self, message, expected):
+        """Test that listing, price and stock questions are routed to the fast path."""
+        # Act & Assert
+        assert detect_intent(message) == expected
+
+    @pytest.mark.parametrize(
+        "message",
+        ["Hello", "I want to buy 2 Gulab Jamun", "Which sweet is best for Diwali?"],
+    )
+    def test_other_messages_go_to_the_llm(self, message):
+        """Test that greetings, orders and open questions are not answered directly."""
+        # Act & Assert
+        assert detect_intent(message) is None
+
+
+class TestRender:
+    """Basic tests for formatting fast-path answers."""
+
+    def test_stock_answer_uses_inventory_name(self, sample_sweets_data):
+        """Test that fuzzy names are answered with the catalogue's spelling."""
+        # Act
+        result = render(STOCK_INTENT, "rasgullas", sample_sweets_data)
+
+        # Assert
+        assert result == "Yes, we have 15 Rasgulla in stock."
+
+    def test_unknown_sweet_falls_back_to_llm(self, sample_sweets_data):
+        """Test that sweets not in the inventory are left to the agent."""
+        # Act & Assert
+        assert render(PRICE_INTENT, "Kaju Katli", sample_sweets_data) is None
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            "How much for 10 gulab jamun?",
+            "How much are 3 rasgulla",
+            "What's the price of two dozen Gulab Jamun?",
+            "Do you have twenty rasgullas?",
+        ],
+    )
+    @patch("fast_path.get_all_sweets")
+    def test_questions_about_quantities_go_to_the_llm(
+        self, mock_get_all_sweets, message, sample_sweets_data
+    ):
+        """Test that a count in the name (digits or words) isn't answered with a unit price."""
+        # Arrange
+        mock_get_all_sweets.return_value = sample_sweets_data
+
+        # Act & Assert
+        assert answer(message) is None
+
+    @patch("fast_path.get_all_sweets")
+    def test_answer_lists_inventory(self, mock_get_all_sweets, sample_sweets_data):
+        """Test that a listing question is answered like get_available_sweets."""
+        # Arrange
+        mock_get_all_sweets.return_value = sample_sweets_data
+
+        # Act
+        result = answer("What sweets do you have?")
+
+        # Assert
+        assert result.startswith("Here are the sweets currently available:")
+        assert "Gulab Jamun: ₹25.50 (Stock: 10)" in result
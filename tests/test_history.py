@@ -0,0 +1,303 @@
+"""
+Simple unit tests for history.py module.
+"""
+
+import asyncio
+import pytest
+import fakeredis
+from fakeredis import aioredis as fake_aioredis
+from unittest.mock import AsyncMock, Mock, patch
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+from history import (
+    AsyncRedisChatMessageHistory,
+    HistoryWriter,
+    WindowedRedisChatMessageHistory,
+    aload_histories,
+    asave_turns,
+    stable_window,
+    window_messages,
+)
+
+
+def _conversation(turns):
+    """Builds alternating human/AI messages for `turns` exchanges."""
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i}"))
+        messages.append(AIMessage(content=f"answer {i}"))
+    return messages
+
+
+class TestAsyncRedisChatMessageHistory:
+    """Basic tests for the async Redis history store."""
+
+    @pytest.mark.asyncio
+    async def test_round_trip_preserves_order(self):
+        """Test that messages come back oldest first."""
+        # Arrange
+        with patch("history.get_async_redis", return_value=fake_aioredis.FakeRedis()):
+            history = AsyncRedisChatMessageHistory("session_1")
+
+        # Act
+        await history.aadd_messages(
+            [HumanMessage(content="Hi"), AIMessage(content="Hello!")]
+        )
+        messages = await history.aget_messages()
+
+        # Assert
+        assert [m.content for m in messages] == ["Hi", "Hello!"]
+
+    @pytest.mark.asyncio
+    async def test_reads_sessions_written_by_sync_store(self):
+        """Test that the async store shares its storage format with the sync one."""
+        # Arrange
+        server = fakeredis.FakeServer()
+        sync_history = RedisChatMessageHistory("session_2")
+        sync_history.redis_client = fakeredis.FakeRedis(server=server)
+        sync_history.add_message(HumanMessage(content="Hi"))
+
+        with patch(
+            "history.get_async_redis",
+            return_value=fake_aioredis.FakeRedis(server=server),
+        ):
+            history = AsyncRedisChatMessageHistory("session_2")
+
+        # Act
+        messages = await history.aget_messages()
+
+        # Assert
+        assert messages == [HumanMessage(content="Hi")]
+
+    @pytest.mark.asyncio
+    async def test_many_sessions_share_one_round_trip(self):
+        """Test that batch saves and loads use one pipeline for all sessions."""
+        # Arrange
+        redis = fake_aioredis.FakeRedis()
+        with patch("history.get_async_redis", return_value=redis):
+            first = AsyncRedisChatMessageHistory("session_a")
+            second = AsyncRedisChatMessageHistory("session_b")
+        await second.aadd_messages(_conversation(2))
+
+        # Act
+        with patch.object(redis, "pipeline", wraps=redis.pipeline) as mock_pipeline:
+            await asave_turns(
+                [
+                    (first, _conversation(1), None),
+                    (second, _conversation(3)[4:], ("Asked twice.", 2)),
+                ]
+            )
+            loaded = await aload_histories([first, second])
+
+        # Assert
+        assert mock_pipeline.call_count == 2
+        assert [[m.content for m in messages] for messages, _ in loaded] == [
+            ["question 0", "answer 0"],
+            ["question 2", "answer 2"],
+        ]
+        assert [summary for _, summary in loaded] == ["", "Asked twice."]
+
+    @pytest.mark.asyncio
+    async def test_whole_load_includes_messages_outside_the_window(self):
+        """Test that whole loads return every stored message for summarization."""
+        # Arrange
+        with patch("history.get_async_redis", return_value=fake_aioredis.FakeRedis()):
+            history = AsyncRedisChatMessageHistory("session_1")
+        await history.aadd_messages(_conversation(15))
+
+        # Act
+        ((windowed, _),) = await aload_histories([history])
+        ((whole, _),) = await aload_histories([history], whole=True)
+
+        # Assert
+        assert len(windowed) < 30
+        assert [m.content for m in whole] == [m.content for m in _conversation(15)]
+
+
+class TestHistoryWindow:
+    """Basic tests for bounded history loading."""
+
+    def test_window_keeps_newest_messages_starting_on_human(self):
+        """Test that the window is cut from the end and starts on a human turn."""
+        # Arrange
+        messages = _conversation(5)
+
+        # Act
+        window = window_messages(messages, max_messages=3, max_tokens=0)
+
+        # Assert
+        assert [m.content for m in window] == ["question 4", "answer 4"]
+
+    def test_window_respects_token_budget(self):
+        """Test that a token budget drops older turns."""
+        # Arrange
+        messages = _conversation(5)
+
+        # Act
+        with patch("history.count_message_tokens", new=lambda m: 10 * len(m)):
+            window = window_messages(messages, max_messages=10, max_tokens=25)
+
+        # Assert
+        assert [m.content for m in window] == ["question 4", "answer 4"]
+
+    def test_window_start_moves_in_steps(self):
+        """Test that the window keeps the same first message for several turns."""
+        # Arrange
+        conversation = _conversation(20)
+
+        # Act: the newest 20 messages as loaded after turns 13 to 16
+        windows = [
+            stable_window(conversation[: 2 * turns][-20:], 2 * turns, 20, step=10)
+            for turns in range(13, 17)
+        ]
+
+        # Assert
+        assert [w[0].content for w in windows] == ["question 5"] * 3 + ["question 10"]
+        assert [len(w) for w in windows] == [16, 18, 20, 12]
+        assert stable_window(conversation[:8], 8, 20, step=10) == conversation[:8]
+
+    def test_sync_store_reads_tail_and_trims_with_ttl(self):
+        """Test that only the tail is read and the stored list is capped."""
+        # Arrange
+        history = WindowedRedisChatMessageHistory("session_3", ttl=60, max_stored=4)
+        history.redis_client = fakeredis.FakeRedis()
+
+        # Act
+        for message in _conversation(3):
+            history.add_message(message)
+        recent = history.get_recent_messages(max_messages=2)
+
+        # Assert
+        assert history.redis_client.llen(history.key) == 4
+        assert 0 < history.redis_client.ttl(history.key) <= 60
+        assert [m.content for m in recent] == ["question 2", "answer 2"]
+
+    def test_add_messages_is_one_round_trip(self):
+        """Test that a turn's user and AI messages are written in one pipeline."""
+        # Arrange
+        history = WindowedRedisChatMessageHistory("session_5", ttl=60)
+        history.redis_client = fakeredis.FakeRedis()
+
+        # Act
+        with patch.object(
+            history.redis_client, "pipeline", wraps=history.redis_client.pipeline
+        ) as mock_pipeline:
+            history.add_messages(_conversation(1))
+
+        # Assert
+        mock_pipeline.assert_called_once()
+        assert [m.content for m in history.messages] == ["question 0", "answer 0"]
+
+    def test_save_summary_replaces_folded_turns(self):
+        """Test that saving a summary stores it and trims the folded messages."""
+        # Arrange
+        history = WindowedRedisChatMessageHistory("session_4", ttl=60)
+        history.redis_client = fakeredis.FakeRedis()
+        for message in _conversation(3):
+            history.add_message(message)
+
+        # Act
+        history.save_summary("Customer asked three questions.", keep_messages=2)
+
+        # Assert
+        assert history.get_summary() == "Customer asked three questions."
+        assert [m.content for m in history.messages] == ["question 2", "answer 2"]
+
+
+class TestHistoryWriter:
+    """Basic tests for write-behind history saves."""
+
+    @pytest.mark.asyncio
+    async def test_next_turn_reads_queued_writes(self):
+        """Test that a read waits for the session's queued turns, saved in one pipeline."""
+        # Arrange
+        redis = fake_aioredis.FakeRedis()
+        writer = HistoryWriter(queue_size=10, batch_size=10)
+        with patch("history.get_async_redis", return_value=redis):
+            first = AsyncRedisChatMessageHistory("session_a")
+            second = AsyncRedisChatMessageHistory("session_b")
+
+        # Act
+        with patch("history.history_writer", writer), patch.object(
+            redis, "pipeline", wraps=redis.pipeline
+        ) as mock_pipeline:
+            await writer.submit(
+                [
+                    (first, _conversation(1), None),
+                    (second, _conversation(1), None),
+                    (first, _conversation(2)[2:], ("Asked once.", 2)),
+                ]
+            )
+            messages = await first.aget_recent_messages()
+            summary = await first.aget_summary()
+            saves = mock_pipeline.call_count - 1
+            await writer.adrain()
+
+        # Assert
+        assert [m.content for m in messages] == ["question 1", "answer 1"]
+        assert summary == "Asked once."
+        assert saves == 1
+
+    @pytest.mark.asyncio
+    async def test_session_lock_is_held_until_turn_is_saved(self):
+        """Test that other workers can't take the session before its queued turn is saved."""
+        # Arrange
+        from session_guard import session_lock
+
+        writer = HistoryWriter(queue_size=10, batch_size=10)
+        lock = Mock(acquire=AsyncMock(return_value=True), release=AsyncMock())
+        with patch("history.get_async_redis", return_value=fake_aioredis.FakeRedis()):
+            history = AsyncRedisChatMessageHistory("session_a")
+
+        # Act
+        with patch("session_guard.SESSION_REDIS_LOCK", True), patch(
+            "session_guard.get_async_redis",
+            return_value=Mock(lock=Mock(return_value=lock)),
+        ):
+            async with session_lock("session_a", "redis://localhost:6379/0"):
+                await writer.submit([(history, _conversation(1), None)])
+            released_before_save = lock.release.await_count
+            await writer.adrain()
+            await asyncio.sleep(0.01)
+
+        # Assert
+        assert released_before_save == 0
+        lock.release.assert_awaited_once()
+        assert len(await history.aget_messages()) == 2
+
+    @pytest.mark.asyncio
+    async def test_full_queue_waits_and_drain_saves_everything(self):
+        """Test that a full queue holds submitters back and shutdown saves what's left."""
+        # Arrange
+        redis = fake_aioredis.FakeRedis()
+        writer = HistoryWriter(queue_size=1, batch_size=1)
+        with patch("history.get_async_redis", return_value=redis):
+            history = AsyncRedisChatMessageHistory("session_a")
+
+        # Act
+        for turn in range(3):
+            await writer.submit([(history, _conversation(turn + 1)[-2:], None)])
+        await writer.adrain()
+
+        # Assert
+        assert [m.content for m in await history.aget_messages()] == [
+            m.content for m in _conversation(3)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_failed_save_does_not_block_readers(self):
+        """Test that a failed flush releases sessions waiting on it."""
+        # Arrange
+        writer = HistoryWriter(queue_size=10, batch_size=10)
+        with patch("history.get_async_redis", return_value=fake_aioredis.FakeRedis()):
+            history = AsyncRedisChatMessageHistory("session_a")
+
+        # Act
+        with patch("history.asave_turns", new_callable=AsyncMock) as mock_save:
+            mock_save.side_effect = ConnectionError("redis down")
+            await writer.submit([(history, _conversation(1), None)])
+            await writer.wait_for(history.key)
+            await writer.adrain()
+
+        # Assert
+        mock_save.assert_awaited_once()
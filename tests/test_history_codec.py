@@ -0,0 +1,73 @@
+"""
+Simple unit tests for history_codec.py module.
+"""
+
+import json
+import fakeredis
+import pytest
+from unittest.mock import patch
+from langchain_core.messages import AIMessage, message_to_dict
+from history import WindowedRedisChatMessageHistory
+from history_codec import MARKER, decode, encode
+
+
+@pytest.fixture
+def long_message():
+    """A message large enough to be compressed."""
+    return message_to_dict(AIMessage(content="Gulab Jamun: ₹25.50\n" * 200))
+
+
+class TestHistoryCodec:
+    """Basic tests for encoding stored history entries."""
+
+    @pytest.mark.parametrize("codec", ["json", "orjson", "msgpack"])
+    @pytest.mark.parametrize("compression", ["none", "zlib", "zstd"])
+    def test_round_trip(self, codec, compression, long_message):
+        """Test that every codec and compression combination decodes losslessly."""
+        # Act & Assert
+        assert decode(encode(long_message, codec, compression)) == long_message
+
+    def test_uncompressed_json_matches_original_format(self):
+        """Test that older workers can still read entries written by orjson."""
+        # Arrange
+        data = message_to_dict(AIMessage(content="Hello"))
+
+        # Act
+        entry = encode(data, "orjson", "none")
+
+        # Assert
+        assert json.loads(entry.decode("utf-8")) == data
+
+    def test_small_entries_are_not_compressed(self):
+        """Test that compression only applies above the size threshold."""
+        # Arrange
+        data = message_to_dict(AIMessage(content="Hello"))
+
+        # Act & Assert
+        assert not encode(data, "orjson", "zlib").startswith(MARKER)
+
+    def test_compression_shrinks_large_entries(self, long_message):
+        """Test that long messages take less Redis memory when compressed."""
+        # Act & Assert
+        assert len(encode(long_message, "msgpack", "zlib")) < (
+            len(encode(long_message, "orjson", "none")) / 4
+        )
+
+
+class TestBackwardsCompatibility:
+    """Basic tests for reading sessions written before the codec existed."""
+
+    def test_mixed_old_and_new_entries_are_read(self):
+        """Test that a session with JSON and msgpack entries reads in order."""
+        # Arrange
+        history = WindowedRedisChatMessageHistory("session_codec")
+        history.redis_client = fakeredis.FakeRedis()
+        old_entry = json.dumps(message_to_dict(AIMessage(content="old")))
+        history.redis_client.lpush(history.key, old_entry)
+
+        # Act
+        with patch("history_codec.HISTORY_CODEC", "msgpack"):
+            history.add_message(AIMessage(content="new"))
+
+        # Assert
+        assert [m.content for m in history.messages] == ["old", "new"]
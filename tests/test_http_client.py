@@ -0,0 +1,96 @@
+"""
+Simple unit tests for http_client.py module.
+"""
+
+import httpcore
+import httpx
+import pytest
+import responses
+from unittest.mock import AsyncMock, patch
+import http_client
+from http_client import abackend_get, backend_get, get_session
+
+
+class TestSyncBackendClient:
+    """Basic tests for the pooled requests session."""
+
+    def test_session_is_shared_and_retries_gets_only(self):
+        """Test that one session is reused and only idempotent calls are retried."""
+        # Act
+        session = get_session()
+        retry = session.get_adapter("http://localhost:5000").max_retries
+
+        # Assert
+        assert get_session() is session
+        assert retry.total == http_client.BACKEND_MAX_RETRIES
+        assert "GET" in retry.allowed_methods
+        assert "POST" not in retry.allowed_methods
+
+    @responses.activate
+    def test_backend_get_applies_timeouts(self):
+        """Test that every call carries connect and read timeouts."""
+        # Arrange
+        responses.add(responses.GET, "http://localhost:5000/search", json=[])
+
+        # Act
+        with patch.object(get_session(), "get", wraps=get_session().get) as spy:
+            backend_get("/search", params={"name": "Barfi"})
+
+        # Assert
+        assert spy.call_args.kwargs["timeout"] == (
+            http_client.BACKEND_CONNECT_TIMEOUT,
+            http_client.BACKEND_READ_TIMEOUT,
+        )
+
+
+class TestAsyncBackendClient:
+    """Basic tests for the pooled httpx client."""
+
+    @pytest.mark.asyncio
+    async def test_abackend_get_retries_unavailable_backend(self):
+        """Test that 503s are retried with backoff before succeeding."""
+        # Arrange
+        statuses = iter([503, 200])
+
+        def handler(request):
+            return httpx.Response(next(statuses), json=[])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        # Act
+        with patch("http_client._async_client", client), patch(
+            "http_client.asyncio.sleep", new_callable=AsyncMock
+        ) as mock_sleep:
+            response = await abackend_get("/search")
+
+        # Assert
+        assert response.status_code == 200
+        mock_sleep.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_abackend_get_connects_once_per_retry(self):
+        """Test that a refused connection is retried by one layer only."""
+        # Arrange
+        attempts = []
+
+        class RefusingBackend(httpcore.AsyncNetworkBackend):
+            async def connect_tcp(self, *args, **kwargs):
+                attempts.append(kwargs)
+                raise httpcore.ConnectError("refused")
+
+            async def sleep(self, seconds):
+                pass
+
+        with patch("http_client._async_client", None):
+            client = http_client.get_async_client()
+        client._transport._pool._network_backend = RefusingBackend()
+
+        # Act
+        with patch("http_client._async_client", client), patch(
+            "http_client.asyncio.sleep", new_callable=AsyncMock
+        ):
+            with pytest.raises(httpx.ConnectError):
+                await abackend_get("/search")
+
+        # Assert
+        assert len(attempts) == http_client.BACKEND_MAX_RETRIES + 1
@@ -29,8 +29,8 @@ class TestBasicIntegration:
         mock_get_sweets.assert_called_once()
 
     @patch("tools.get_all_sweets")
-    @patch("tools.requests.get")
-    @patch("tools.requests.post")
+    @patch("tools.backend_get")
+    @patch("tools.backend_post")
     def test_buy_sweet_flow(self, mock_post, mock_get, mock_get_sweets):
         """Test basic flow of buying a sweet."""
         # Arrange
@@ -0,0 +1,96 @@
+"""
+Simple unit tests for inventory_format.py module.
+"""
+
+from unittest.mock import patch
+from inventory_format import (
+    diff_sweets,
+    format_csv,
+    format_sweets,
+    format_table,
+    measure,
+    render_inventory,
+    render_listing,
+)
+
+
+class TestFormats:
+    """Basic tests for the inventory output formats."""
+
+    def test_table_and_csv_rows(self, sample_sweets_data):
+        """Test that compact formats keep name, price and stock for every sweet."""
+        # Act & Assert
+        assert format_table(sample_sweets_data).splitlines()[1:] == [
+            "Gulab Jamun|25.50|10",
+            "Rasgulla|20.00|15",
+        ]
+        assert format_csv(sample_sweets_data) == (
+            "name,price_inr,stock\nGulab Jamun,25.50,10\nRasgulla,20.00,15"
+        )
+
+    def test_compact_formats_cost_fewer_tokens(self):
+        """Test that table and CSV output is cheaper than the default lines."""
+        # Arrange
+        catalog = [
+            {"name": f"Sweet {i}", "price": 10 + i, "quantity": i} for i in range(50)
+        ]
+
+        # Act
+        counts = measure(catalog)
+
+        # Assert
+        assert counts["table"] < counts["lines"]
+        assert counts["csv"] < counts["lines"]
+
+    def test_top_k_keeps_best_stocked_and_marks_the_rest(self, sample_sweets_data):
+        """Test that truncated listings say more sweets exist."""
+        # Act
+        result = render_inventory(sample_sweets_data, fmt="table", k=1)
+
+        # Assert
+        assert "Rasgulla|20.00|15" in result
+        assert "Gulab Jamun" not in result
+        assert "...and 1 more sweets available" in result
+
+    def test_unknown_format_falls_back_to_lines(self, sample_sweets_data):
+        """Test that a misconfigured format still produces readable output."""
+        # Act & Assert
+        assert render_inventory(sample_sweets_data, fmt="yaml") == format_sweets(
+            sample_sweets_data
+        )
+
+
+class TestDiff:
+    """Basic tests for listing only inventory changes."""
+
+    def test_diff_reports_added_changed_and_removed(self, sample_sweets_data):
+        """Test that each kind of change gets its own line."""
+        # Arrange
+        current = [
+            {"name": "Gulab Jamun", "price": 25.50, "quantity": 8},
+            {"name": "Barfi", "price": 30, "quantity": 5},
+        ]
+
+        # Act
+        result = diff_sweets(sample_sweets_data, current)
+
+        # Assert
+        assert result.splitlines()[1:] == [
+            "~ Gulab Jamun|25.50|8",
+            "+ Barfi|30.00|5",
+            "- Rasgulla",
+        ]
+
+    @patch("inventory_format.INVENTORY_DIFF", True)
+    def test_repeat_listing_in_a_turn_is_a_diff(self, sample_sweets_data):
+        """Test that only the first listing of a turn is sent in full."""
+        # Arrange
+        snapshot = {}
+
+        # Act
+        first = render_listing(sample_sweets_data, snapshot)
+        second = render_listing(sample_sweets_data, snapshot)
+
+        # Assert
+        assert first == format_sweets(sample_sweets_data)
+        assert second == "Inventory unchanged since the last check."
@@ -3,10 +3,13 @@ Simple unit tests for main.py FastAPI application.
 """
 
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from langchain_core.messages import AIMessage
+import json
 import os
+import subprocess
+import sys
 
 
 class TestMainApp:
@@ -16,16 +19,61 @@ class TestMainApp:
     def client(self):
         """Create test client."""
         with patch.dict(os.environ, {"REDIS_URL": "redis://localhost:6379"}):
-            with patch("main.get_agent_with_history"):
+            with patch("main.get_async_agent_with_history"):
                 from main import app
 
-                return TestClient(app)
+            # No Redis here; the in-process session lock still applies
+            with patch("session_guard.SESSION_REDIS_LOCK", False), patch(
+                "main.check_rate_limits", new_callable=AsyncMock
+            ):
+                yield TestClient(app)
 
-    @patch("main.get_agent_with_history")
+    @patch("main.history_writer")
+    @patch("main.aclose_connections", new_callable=AsyncMock)
+    @patch("main.aclose_clients", new_callable=AsyncMock)
+    @patch("main.stop_inventory_watcher")
+    @patch("main.start_inventory_watcher")
+    @patch("main.aensure_indexes", new_callable=AsyncMock)
+    @patch("main.aping_redis", new_callable=AsyncMock)
+    @patch("main.aping", new_callable=AsyncMock)
+    @patch("main.warm_up")
+    def test_lifespan_warms_up_and_closes_clients(
+        self,
+        mock_warm_up,
+        mock_aping,
+        mock_aping_redis,
+        mock_aensure_indexes,
+        mock_start_watcher,
+        mock_stop_watcher,
+        mock_aclose_clients,
+        mock_aclose_connections,
+        mock_history_writer,
+    ):
+        """Test that startup builds the agent and pings backends, and shutdown closes them."""
+        # Arrange
+        from main import app
+
+        mock_aping_redis.side_effect = ConnectionError("redis down")
+        mock_history_writer.adrain = AsyncMock()
+
+        # Act
+        with TestClient(app):
+            # Assert: a failed ping is reported but doesn't stop startup
+            mock_warm_up.assert_called_once()
+            mock_aping.assert_awaited_once()
+            mock_aensure_indexes.assert_awaited_once()
+            mock_aclose_connections.assert_not_awaited()
+
+        mock_history_writer.adrain.assert_awaited_once()
+        mock_stop_watcher.assert_called_once()
+        mock_aclose_clients.assert_awaited_once()
+        mock_aclose_connections.assert_awaited_once()
+
+    @patch("main.get_async_agent_with_history")
     def test_chat_endpoint_success(self, mock_get_agent, client):
         """Test successful chat endpoint call."""
         # Arrange
-        mock_agent = Mock()
+        mock_agent = AsyncMock()
         mock_agent.return_value = AIMessage(content="Here are our available sweets!")
         mock_get_agent.return_value = mock_agent
 
@@ -43,6 +91,115 @@ class TestMainApp:
         assert "response" in data
         assert data["response"] == "Here are our available sweets!"
 
+    @patch("main.get_streaming_agent_with_history")
+    def test_chat_stream_endpoint_emits_sse_events(self, mock_get_agent, client):
+        """Test that the streaming endpoint forwards agent events as SSE."""
+
+        # Arrange
+        async def fake_stream(message):
+            yield {
+                "event": "tool_start",
+                "data": {"name": "get_available_sweets", "input": {}},
+            }
+            yield {"event": "token", "data": "Hello"}
+            yield {"event": "end", "data": "Hello"}
+
+        mock_get_agent.return_value = fake_stream
+        request_data = {"message": "Hi", "session_id": "test_session_123"}
+
+        # Act
+        response = client.post("/chat/stream", json=request_data)
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: tool_start" in response.text
+        assert 'event: token\ndata: "Hello"' in response.text
+        assert "event: end" in response.text
+
+    @patch("main.arun_batch")
+    def test_chat_batch_endpoint_returns_results_in_order(
+        self, mock_arun_batch, client
+    ):
+        """Test that batch results come back by index, or as NDJSON when streamed."""
+
+        # Arrange
+        async def fake_batch(items, redis_url):
+            for item in reversed(items):
+                yield {
+                    "index": item.index,
+                    "session_id": item.session_id,
+                    "response": "Hi",
+                }
+
+        mock_arun_batch.side_effect = fake_batch
+        items = [{"message": "Hi", "session_id": f"s{i}"} for i in range(3)]
+
+        # Act
+        response = client.post("/chat/batch", json={"items": items})
+        streamed = client.post("/chat/batch", json={"items": items, "stream": True})
+
+        # Assert
+        assert response.status_code == 200
+        assert [result["index"] for result in response.json()["results"]] == [0, 1, 2]
+        assert streamed.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line)["index"] for line in streamed.text.splitlines()] == [
+            2,
+            1,
+            0,
+        ]
+
+    @patch("main.CHAT_BATCH_MAX_ITEMS", 2)
+    def test_chat_batch_endpoint_rejects_oversized_batch(self, client):
+        """Test that a batch over the item limit gets a 413."""
+        # Arrange
+        items = [{"message": "Hi", "session_id": "s1"}] * 3
+
+        # Act
+        response = client.post("/chat/batch", json={"items": items})
+
+        # Assert
+        assert response.status_code == 413
+
+    @patch("main.run_once", new_callable=AsyncMock)
+    @patch("main.get_async_agent_with_history")
+    def test_chat_endpoint_busy_session(self, mock_get_agent, mock_run_once, client):
+        """Test that a session still busy in another worker gets a 409."""
+        # Arrange
+        from session_guard import SessionBusyError
+
+        mock_run_once.side_effect = SessionBusyError("busy")
+        request_data = {"message": "Hi", "session_id": "test_session_123"}
+
+        # Act
+        response = client.post(
+            "/chat", json=request_data, headers={"Idempotency-Key": "abc"}
+        )
+
+        # Assert
+        assert response.status_code == 409
+        assert mock_run_once.call_args.args[1] == "abc"
+        assert mock_run_once.call_args.kwargs["replay"] is True
+
+    @patch("main.check_rate_limits", new_callable=AsyncMock)
+    def test_rate_limited_request_gets_429_with_retry_after(
+        self, mock_check_rate_limits, client
+    ):
+        """Test that a rejected request is answered at once with Retry-After."""
+        # Arrange
+        from admission import RequestRejected
+
+        mock_check_rate_limits.side_effect = RequestRejected(429, "slow down", 1.5)
+        request_data = {"message": "Hi", "session_id": "test_session_123"}
+
+        # Act
+        response = client.post("/chat/stream", json=request_data)
+
+        # Assert
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "2"
+        assert response.json() == {"detail": "slow down"}
+
     def test_chat_endpoint_missing_session_id(self, client):
         """Test chat endpoint with missing session_id."""
         # Arrange
@@ -74,3 +231,45 @@ class TestMainApp:
         # Assert
         assert docs_response.status_code == 200
         assert openapi_response.status_code == 200
+
+    @patch("main.get_async_agent_with_history")
+    def test_responses_carry_server_timing_and_metrics_are_exposed(
+        self, mock_get_agent, client
+    ):
+        """Test that /chat sends Server-Timing and /metrics renders its latency."""
+        # Arrange
+        mock_get_agent.return_value = AsyncMock(return_value=AIMessage(content="Hi"))
+
+        # Act
+        chat_response = client.post("/chat", json={"message": "Hi", "session_id": "s1"})
+        metrics_response = client.get("/metrics")
+
+        # Assert
+        assert "total;dur=" in chat_response.headers["server-timing"]
+        assert metrics_response.status_code == 200
+        assert metrics_response.headers["content-type"].startswith("text/plain")
+        assert (
+            'chatbot_request_seconds_count{method="POST",path="/chat",status="200"}'
+            in metrics_response.text
+        )
+
+    def test_import_is_safe_to_fork(self):
+        """Test that importing the app opens nothing a forked worker would inherit."""
+        # Arrange
+        check = (
+            "import threading, main, chatbot, database, http_client, redis_client;"
+            "assert threading.active_count() == 1, threading.enumerate();"
+            "assert chatbot.graph is None and chatbot.llm is None;"
+            "assert database.client is None and database.async_client is None;"
+            "assert not redis_client._clients and not redis_client._async_clients;"
+            "assert http_client._session is None and http_client._async_client is None"
+        )
+        env = {**os.environ, "REDIS_URL": "redis://localhost:6379"}
+
+        # Act
+        result = subprocess.run(
+            [sys.executable, "-c", check], env=env, capture_output=True, text=True
+        )
+
+        # Assert
+        assert result.returncode == 0, result.stderr
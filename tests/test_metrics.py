@@ -0,0 +1,154 @@
+"""
+Simple unit tests for metrics.py module.
+"""
+
+import uuid
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from metrics import (
+    LLM_TOKENS,
+    NODE_SECONDS,
+    Counter,
+    GraphMetricsHandler,
+    Histogram,
+    TokenUsage,
+    _request_timings,
+    server_timing,
+    timed,
+)
+
+
+class TestPrometheusFormat:
+    """Basic tests for rendering metrics in the Prometheus text format."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that each bucket counts every observation at or below its bound."""
+        # Arrange
+        histogram = Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1))
+
+        # Act
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, stage="load")
+        lines = list(histogram.render())
+
+        # Assert
+        assert 'test_seconds_bucket{stage="load",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{stage="load",le="1"} 2' in lines
+        assert 'test_seconds_bucket{stage="load",le="+Inf"} 3' in lines
+        assert 'test_seconds_count{stage="load"} 3' in lines
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes in label values can't break the exposition format."""
+        # Arrange
+        counter = Counter("test_total", "Test.", ["name"])
+
+        # Act
+        counter.inc(name='say "hi"')
+
+        # Assert
+        assert 'test_total{name="say \\"hi\\""} 1' in list(counter.render())
+
+
+class TestSpans:
+    """Basic tests for timing spans and the Server-Timing header."""
+
+    def test_timed_span_is_recorded_for_the_request(self):
+        """Test that spans inside a request show up in its Server-Timing entries."""
+        # Arrange
+        histogram = Histogram("test_span_seconds", "Test.", ["stage"])
+        timings = {}
+        token = _request_timings.set(timings)
+
+        # Act
+        try:
+            with timed(histogram, stage="history_load"):
+                pass
+        finally:
+            _request_timings.reset(token)
+
+        # Assert
+        assert histogram.count(stage="history_load") == 1
+        assert server_timing(timings, 0.25).startswith("history_load;dur=")
+        assert server_timing(timings, 0.25).endswith("total;dur=250.0")
+
+
+class TestGraphMetricsHandler:
+    """Basic tests for the LangGraph callback handler."""
+
+    def test_node_runs_are_timed(self):
+        """Test that a node's own run is timed but nested runnables are not."""
+        # Arrange
+        handler = GraphMetricsHandler()
+        before = NODE_SECONDS.count(node="agent")
+        node_run, nested_run = uuid.uuid4(), uuid.uuid4()
+
+        # Act
+        handler.on_chain_start(
+            {}, {}, run_id=node_run, metadata={"langgraph_node": "agent"}, name="agent"
+        )
+        handler.on_chain_start(
+            {},
+            {},
+            run_id=nested_run,
+            metadata={"langgraph_node": "agent"},
+            name="call_model",
+        )
+        handler.on_chain_end({}, run_id=nested_run)
+        handler.on_chain_end({}, run_id=node_run)
+
+        # Assert
+        assert NODE_SECONDS.count(node="agent") == before + 1
+
+    def test_llm_token_usage_is_counted(self):
+        """Test that reported usage is added to the token counters."""
+        # Arrange
+        handler = GraphMetricsHandler()
+        before = LLM_TOKENS.value(kind="prompt")
+        message = AIMessage(
+            content="Hi",
+            usage_metadata={"input_tokens": 12, "output_tokens": 4, "total_tokens": 16},
+        )
+        run_id = uuid.uuid4()
+
+        # Act
+        handler.on_chat_model_start({}, [[]], run_id=run_id)
+        handler.on_llm_end(
+            LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id
+        )
+
+        # Assert
+        assert LLM_TOKENS.value(kind="prompt") == before + 12
+
+    def test_cached_tokens_are_counted_per_turn(self):
+        """Test that cached prompt tokens reach the counters and the turn's usage."""
+        # Arrange
+        handler = GraphMetricsHandler()
+        usage = TokenUsage()
+        before = LLM_TOKENS.value(kind="cached")
+        message = AIMessage(
+            content="Hi",
+            usage_metadata={
+                "input_tokens": 1200,
+                "output_tokens": 10,
+                "total_tokens": 1210,
+                "input_token_details": {"cache_read": 1024},
+            },
+        )
+        result = LLMResult(generations=[[ChatGeneration(message=message)]])
+
+        # Act
+        for _ in range(2):
+            run_id = uuid.uuid4()
+            handler.on_chat_model_start({}, [[]], run_id=run_id)
+            handler.on_llm_end(result, run_id=run_id)
+            usage.on_llm_end(result, run_id=run_id)
+
+        # Assert
+        assert LLM_TOKENS.value(kind="cached") == before + 2048
+        assert (usage.calls, usage.prompt, usage.cached, usage.completion) == (
+            2,
+            2400,
+            2048,
+            20,
+        )
+        assert "cached=2048 (85%)" in str(usage)
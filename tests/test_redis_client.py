@@ -0,0 +1,46 @@
+"""
+Simple unit tests for redis_client.py module.
+"""
+
+import pytest
+from unittest.mock import patch
+from history import AsyncRedisChatMessageHistory, WindowedRedisChatMessageHistory
+from redis_client import aclose_redis, close_redis, get_async_redis, get_redis
+
+
+class TestSharedClients:
+    """Basic tests for the process-wide Redis clients."""
+
+    def test_sync_client_is_shared_per_url(self):
+        """Test that every history store for a URL uses the same pooled client."""
+        # Act
+        first = WindowedRedisChatMessageHistory("a", url="redis://localhost:6379/0")
+        second = WindowedRedisChatMessageHistory("b", url="redis://localhost:6379/0")
+
+        # Assert
+        assert first.redis_client is second.redis_client
+        assert get_redis("redis://localhost:6379/1") is not first.redis_client
+        close_redis()
+
+    @pytest.mark.asyncio
+    async def test_async_client_is_shared_within_a_loop(self):
+        """Test that async stores on one event loop share a client and it closes cleanly."""
+        # Act
+        first = AsyncRedisChatMessageHistory("a", url="redis://localhost:6379/0")
+        second = AsyncRedisChatMessageHistory("b", url="redis://localhost:6379/0")
+
+        # Assert
+        assert first.redis_client is second.redis_client
+        await aclose_redis()
+        assert get_async_redis("redis://localhost:6379/0") is not first.redis_client
+        await aclose_redis()
+
+    def test_pool_is_bounded(self):
+        """Test that concurrent sessions can't open unbounded connections."""
+        # Act
+        with patch("redis_client.REDIS_POOL_SIZE", 7):
+            client = get_redis("redis://localhost:6379/2")
+
+        # Assert
+        assert client.connection_pool.max_connections == 7
+        close_redis()
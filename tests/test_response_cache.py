@@ -0,0 +1,189 @@
+"""
+Simple unit tests for response_cache.py module.
+"""
+
+from unittest.mock import patch
+from langchain_core.messages import AIMessage, HumanMessage
+import response_cache
+from response_cache import (
+    LocalResponseCache,
+    is_cacheable,
+    normalize_message,
+    probe,
+    remember,
+)
+
+
+class TestResponseCacheRules:
+    """Basic tests for what may be cached."""
+
+    def test_normalize_message_ignores_case_and_punctuation(self):
+        """Test that trivial rewordings share a cache key."""
+        # Act & Assert
+        assert normalize_message("What sweets do you have?") == normalize_message(
+            "  what SWEETS do you have "
+        )
+
+    def test_read_only_turns_are_cacheable(self):
+        """Test that inventory lookups can be replayed."""
+        # Arrange
+        result = {
+            "messages": [
+                HumanMessage(content="What do you have?"),
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {"name": "get_available_sweets", "args": {}, "id": "call_1"}
+                    ],
+                ),
+                AIMessage(content="We have Barfi."),
+            ]
+        }
+
+        # Act & Assert
+        assert is_cacheable(result)
+
+    def test_turns_with_history_or_without_lookups_are_not_cached(self):
+        """Test that answers which may depend on the session are never replayed."""
+        # Arrange
+        lookup = AIMessage(
+            content="",
+            tool_calls=[{"name": "get_available_sweets", "args": {}, "id": "call_1"}],
+        )
+        from_history = {
+            "messages": [
+                HumanMessage(content="Buy 2 Kaju Katli"),
+                AIMessage(content="Purchased 2 Kaju Katli."),
+                HumanMessage(content="What did I order?"),
+                lookup,
+                AIMessage(content="You ordered 2 Kaju Katli."),
+            ]
+        }
+        from_summary = {
+            "messages": [HumanMessage(content="What did I order?"), lookup],
+            "summary": "Customer bought 2 Kaju Katli.",
+        }
+        no_tools = {
+            "messages": [
+                HumanMessage(content="What did I order?"),
+                AIMessage(content="You ordered 2 Kaju Katli."),
+            ]
+        }
+
+        # Act & Assert
+        assert not is_cacheable(from_history)
+        assert not is_cacheable(from_summary)
+        assert not is_cacheable(no_tools)
+
+    def test_purchases_are_never_cached(self):
+        """Test that turns with side-effecting tool calls are not replayed."""
+        # Arrange
+        result = {
+            "messages": [
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": "buy_sweet",
+                            "args": {"sweet_name": "Barfi", "quantity": 1},
+                            "id": "call_1",
+                        }
+                    ],
+                ),
+                AIMessage(content="Bought!"),
+            ]
+        }
+
+        # Act & Assert
+        assert not is_cacheable(result)
+
+
+class TestLocalResponseCache:
+    """Basic tests for the in-process cache backend."""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that the cache stays within its size bound."""
+        # Arrange
+        cache = LocalResponseCache(max_entries=2, ttl=60)
+        cache.store("a", "v1", "A")
+        cache.store("b", "v1", "B")
+        cache.lookup("a", "v1")
+
+        # Act
+        cache.store("c", "v1", "C")
+
+        # Assert
+        assert cache.lookup("a", "v1") == "A"
+        assert cache.lookup("b", "v1") is None
+
+    def test_similar_question_matches_same_inventory_only(self):
+        """Test embedding matches are limited to the current inventory version."""
+        # Arrange
+        cache = LocalResponseCache(max_entries=10, ttl=60, similarity=0.9)
+        cache.store("v1:what sweets", "v1", "We have Barfi.", embedding=[1.0, 0.0])
+
+        # Act & Assert
+        assert cache.lookup("v1:which sweets", "v1", [0.99, 0.05]) == "We have Barfi."
+        assert cache.lookup("v2:which sweets", "v2", [0.99, 0.05]) is None
+
+    def test_similarity_scan_is_limited_to_recent_entries(self):
+        """Test that only the newest max_scan entries are compared."""
+        # Arrange
+        cache = LocalResponseCache(max_entries=10, ttl=60, similarity=0.9, max_scan=1)
+        cache.store("v1:what sweets", "v1", "We have Barfi.", embedding=[1.0, 0.0])
+        cache.store("v1:where are you", "v1", "In Mumbai.", embedding=[0.0, 1.0])
+
+        # Act & Assert
+        assert cache.lookup("v1:which sweets", "v1", [0.99, 0.05]) is None
+        assert cache.lookup("v1:where is the shop", "v1", [0.05, 0.99]) == "In Mumbai."
+
+
+class TestProbeAndRemember:
+    """Basic tests for the chatbot-facing helpers."""
+
+    @patch("response_cache.get_all_sweets")
+    def test_answer_is_reused_until_inventory_changes(
+        self, mock_get_all_sweets, sample_sweets_data
+    ):
+        """Test that a stored answer is keyed on the inventory snapshot."""
+        # Arrange
+        mock_get_all_sweets.return_value = sample_sweets_data
+        result = {
+            "messages": [
+                HumanMessage(content="What sweets do you have?"),
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {"name": "get_available_sweets", "args": {}, "id": "call_1"}
+                    ],
+                ),
+                AIMessage(content="We have Gulab Jamun."),
+            ]
+        }
+
+        with patch.object(response_cache, "cache", LocalResponseCache(10, 60)):
+            # Act
+            remember(probe("What sweets do you have?"), result)
+            hit = probe("what sweets do you have")
+            mock_get_all_sweets.return_value = sample_sweets_data[:1]
+            miss = probe("what sweets do you have")
+
+        # Assert
+        assert hit.response == "We have Gulab Jamun."
+        assert miss.response is None
+
+    @patch("response_cache.get_all_sweets", side_effect=Exception("DB down"))
+    def test_probe_errors_fall_back_to_the_llm(self, mock_get_all_sweets):
+        """Test that a failing lookup is treated as a miss, not an error."""
+        # Arrange
+        with patch.object(response_cache, "cache", LocalResponseCache(10, 60)):
+            # Act
+            cache_probe = probe("What sweets do you have?")
+
+        # Assert
+        assert cache_probe is None
+
+    def test_probe_is_disabled_by_default(self):
+        """Test that the cache is opt-in."""
+        # Act & Assert
+        assert probe("What sweets do you have?") is None
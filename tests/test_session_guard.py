@@ -0,0 +1,217 @@
+"""
+Simple unit tests for session_guard.py module.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from fakeredis import aioredis as fake_aioredis
+import session_guard
+from session_guard import (
+    SessionBusyError,
+    hold_session,
+    request_key,
+    run_once,
+    session_lock,
+)
+
+REDIS_URL = "redis://localhost:6379/0"
+
+
+@pytest.fixture(autouse=True)
+def no_redis_lock():
+    """fakeredis can't run the Lua scripts Redis locks use."""
+    with patch("session_guard.SESSION_REDIS_LOCK", False):
+        yield
+
+
+class TestRequestKey:
+    """Basic tests for request keys."""
+
+    def test_idempotency_key_wins_over_message_hash(self):
+        """Test that an explicit key is used as is and messages hash stably."""
+        # Assert
+        assert request_key("hi", "abc") == "abc"
+        assert request_key("hi") == request_key("hi")
+        assert request_key("hi") != request_key("hello")
+
+
+class TestRunOnce:
+    """Basic tests for per-session serialization and coalescing."""
+
+    @pytest.mark.asyncio
+    async def test_duplicates_share_one_call(self):
+        """Test that a double-submit waits for and reuses the first request's reply."""
+        # Arrange
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "Here are our sweets"
+
+        # Act
+        results = await asyncio.gather(
+            *(run_once("s1", "k", compute, REDIS_URL) for _ in range(3))
+        )
+
+        # Assert
+        assert results == ["Here are our sweets"] * 3
+        assert calls == 1
+        assert not session_guard._in_flight and not session_guard._locks
+
+    @pytest.mark.asyncio
+    async def test_turns_of_a_session_run_one_at_a_time(self):
+        """Test that different messages in one session never overlap, unlike other sessions."""
+        # Arrange
+        running = {"s1": 0, "s2": 0}
+        peak = {"s1": 0, "s2": 0}
+
+        def compute(session_id):
+            async def turn():
+                running[session_id] += 1
+                peak[session_id] = max(peak[session_id], running[session_id])
+                await asyncio.sleep(0.01)
+                running[session_id] -= 1
+                return session_id
+
+            return turn
+
+        # Act
+        await asyncio.gather(
+            *(
+                run_once(session_id, f"k{i}", compute(session_id), REDIS_URL)
+                for i in range(3)
+                for session_id in ("s1", "s1", "s2")
+            )
+        )
+
+        # Assert
+        assert peak == {"s1": 1, "s2": 1}
+
+    @pytest.mark.asyncio
+    async def test_failure_reaches_every_duplicate(self):
+        """Test that a failed turn fails its duplicates instead of leaving them waiting."""
+        # Arrange
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("LLM down")
+
+        # Act
+        results = await asyncio.gather(
+            run_once("s1", "k", compute, REDIS_URL),
+            run_once("s1", "k", compute, REDIS_URL),
+            return_exceptions=True,
+        )
+
+        # Assert
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_with_idempotency_key_replays_stored_reply(self):
+        """Test that a later retry with the same key gets the stored reply."""
+        # Arrange
+        compute = AsyncMock(return_value="Purchased 2 Ladoo")
+
+        # Act
+        with patch(
+            "session_guard.get_async_redis", return_value=fake_aioredis.FakeRedis()
+        ):
+            first = await run_once("s1", "buy-1", compute, REDIS_URL, replay=True)
+            retry = await run_once("s1", "buy-1", compute, REDIS_URL, replay=True)
+
+        # Assert
+        assert first == retry == "Purchased 2 Ladoo"
+        compute.assert_awaited_once()
+
+
+class TestRedisLock:
+    """Basic tests for the cross-worker lock."""
+
+    @pytest.mark.asyncio
+    async def test_lock_is_acquired_and_released(self):
+        """Test that a turn holds the session's Redis lock for its duration."""
+        # Arrange
+        lock = Mock(acquire=AsyncMock(return_value=True), release=AsyncMock())
+        redis = Mock(lock=Mock(return_value=lock))
+
+        # Act
+        with patch("session_guard.SESSION_REDIS_LOCK", True), patch(
+            "session_guard.get_async_redis", return_value=redis
+        ):
+            async with session_lock("s1", REDIS_URL):
+                lock.release.assert_not_awaited()
+
+        # Assert
+        assert redis.lock.call_args.args[0] == "session_lock:s1"
+        lock.release.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_busy_session_raises(self):
+        """Test that a session held elsewhere past the wait raises SessionBusyError."""
+        # Arrange
+        lock = Mock(acquire=AsyncMock(return_value=False), release=AsyncMock())
+        redis = Mock(lock=Mock(return_value=lock))
+
+        # Act / Assert
+        with patch("session_guard.SESSION_REDIS_LOCK", True), patch(
+            "session_guard.get_async_redis", return_value=redis
+        ):
+            with pytest.raises(SessionBusyError):
+                async with session_lock("s1", REDIS_URL):
+                    pass
+        lock.release.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_expired_lock_does_not_fail_the_turn(self):
+        """Test that a lock which expired during a long turn still lets its reply through."""
+        # Arrange
+        from redis.exceptions import LockNotOwnedError
+
+        lock = Mock(
+            acquire=AsyncMock(return_value=True),
+            release=AsyncMock(side_effect=LockNotOwnedError("expired")),
+        )
+        redis = Mock(lock=Mock(return_value=lock))
+        compute = AsyncMock(return_value="Here are our sweets")
+
+        # Act
+        with patch("session_guard.SESSION_REDIS_LOCK", True), patch(
+            "session_guard.get_async_redis", return_value=redis
+        ):
+            result = await run_once("s1", "k", compute, REDIS_URL)
+
+        # Assert
+        assert result == "Here are our sweets"
+        lock.release.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_held_work_keeps_the_lock_after_the_turn(self):
+        """Test that the lock is released only once work the turn handed off is done."""
+        # Arrange
+        lock = Mock(acquire=AsyncMock(return_value=True), release=AsyncMock())
+        redis = Mock(lock=Mock(return_value=lock))
+        saved = asyncio.Event()
+
+        # Act
+        with patch("session_guard.SESSION_REDIS_LOCK", True), patch(
+            "session_guard.get_async_redis", return_value=redis
+        ):
+            async with session_lock("s1", REDIS_URL):
+                held = hold_session("s1", saved.wait)
+            await asyncio.sleep(0.01)
+            released_before_save = lock.release.await_count
+            saved.set()
+            await asyncio.sleep(0.01)
+
+        # Assert
+        assert held
+        assert released_before_save == 0
+        lock.release.assert_awaited_once()
+        assert not hold_session("s1", saved.wait)
@@ -0,0 +1,44 @@
+"""
+Simple unit tests for sweet_index.py module.
+"""
+
+from sweet_index import SweetIndex, normalize_name
+
+
+class TestSweetIndex:
+    """Basic tests for the local name -> ID index."""
+
+    def _index(self):
+        index = SweetIndex()
+        index.rebuild(
+            [
+                {"_id": "sweet1", "name": "Gulab Jamun"},
+                {"_id": "sweet2", "name": "Rasgulla"},
+                {"_id": "sweet3", "name": "Kaju Barfi"},
+                {"_id": "sweet4", "name": "Kaju-Barfi"},
+            ]
+        )
+        return index
+
+    def test_normalize_name_ignores_case_spaces_and_punctuation(self):
+        """Test that spelling variants normalize to the same key."""
+        # Act & Assert
+        assert normalize_name(" Gulab-Jamun ") == normalize_name("gulab jamun")
+
+    def test_lookup_exact_and_fuzzy(self):
+        """Test exact, normalized and fuzzy matches resolve to the right ID."""
+        # Arrange
+        index = self._index()
+
+        # Act & Assert
+        assert index.lookup("GULAB JAMUN") == "sweet1"
+        assert index.lookup("rasgullas") == "sweet2"
+
+    def test_lookup_misses_and_ambiguous_names_return_none(self):
+        """Test that unknown or ambiguous names fall back to the backend search."""
+        # Arrange
+        index = self._index()
+
+        # Act & Assert
+        assert index.lookup("Jalebi") is None
+        assert index.lookup("kaju barfi") is None
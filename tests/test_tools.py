@@ -2,10 +2,21 @@
 Simple unit tests for tools.py module.
 """
 
+import asyncio
+import time
+import httpx
 import pytest
 import responses
-from unittest.mock import patch
-from tools import buy_sweet, get_available_sweets
+from unittest.mock import AsyncMock, patch
+from langchain_core.tools import StructuredTool
+from tools import (
+    SEARCH_MAX_RESULTS,
+    buy_sweet,
+    buy_sweets,
+    get_available_sweets,
+    search_sweets,
+    with_timeout,
+)
 
 
 class TestBuySweet:
@@ -34,6 +45,49 @@ class TestBuySweet:
         # Assert
         assert result == "Successfully purchased 2 of Gulab Jamun."
 
+    @responses.activate
+    @patch("tools.invalidate_inventory_cache")
+    def test_buy_sweet_success_invalidates_inventory_cache(self, mock_invalidate):
+        """Test that a successful purchase drops the cached inventory."""
+        # Arrange
+        responses.add(
+            responses.GET,
+            "http://localhost:5000/search",
+            json=[{"_id": "sweet1", "name": "Gulab Jamun"}],
+            status=200,
+        )
+        responses.add(
+            responses.POST,
+            "http://localhost:5000/purchase/sweet1",
+            json={"message": "Purchase successful"},
+            status=200,
+        )
+
+        # Act
+        buy_sweet.invoke({"sweet_name": "Gulab Jamun", "quantity": 2})
+
+        # Assert
+        mock_invalidate.assert_called_once()
+
+    @responses.activate
+    @patch("tools.find_sweet_id", return_value="sweet1")
+    def test_buy_sweet_uses_local_index(self, mock_find_sweet_id):
+        """Test that an indexed sweet is purchased without calling /search."""
+        # Arrange
+        responses.add(
+            responses.POST,
+            "http://localhost:5000/purchase/sweet1",
+            json={"message": "Purchase successful"},
+            status=200,
+        )
+
+        # Act
+        result = buy_sweet.invoke({"sweet_name": "gulab jamun", "quantity": 1})
+
+        # Assert
+        assert result == "Successfully purchased 1 of gulab jamun."
+        assert len(responses.calls) == 1
+
     @responses.activate
     def test_buy_sweet_not_found(self):
         """Test purchase when sweet is not found."""
@@ -48,6 +102,89 @@ class TestBuySweet:
         # Assert
         assert "Could not find a sweet named 'Nonexistent Sweet'" in result
 
+    @pytest.mark.asyncio
+    @patch("tools.invalidate_inventory_cache")
+    @patch("tools.ainvalidate_inventory_cache", new_callable=AsyncMock)
+    @patch("tools.abackend_post", new_callable=AsyncMock)
+    @patch("tools.abackend_get", new_callable=AsyncMock)
+    async def test_buy_sweet_async_success(
+        self, mock_get, mock_post, mock_ainvalidate, mock_invalidate
+    ):
+        """Test the async purchase path through the shared HTTP client."""
+        # Arrange
+        mock_get.return_value = httpx.Response(
+            200, json=[{"_id": "sweet1", "name": "Gulab Jamun"}]
+        )
+        mock_post.return_value = httpx.Response(200, json={"message": "ok"})
+
+        # Act
+        result = await buy_sweet.ainvoke({"sweet_name": "Gulab Jamun", "quantity": 2})
+
+        # Assert
+        assert result == "Successfully purchased 2 of Gulab Jamun."
+        mock_post.assert_awaited_once_with("/purchase/sweet1", json={"quantity": 2})
+        # Invalidation must not block the event loop on Redis
+        mock_ainvalidate.assert_awaited_once()
+        mock_invalidate.assert_not_called()
+
+
+class TestBuySweets:
+    """Basic tests for the multi-item buy_sweets tool."""
+
+    @patch("tools._buy_sweet")
+    def test_buy_sweets_reports_each_item_in_order(self, mock_buy_sweet):
+        """Test that every item gets its own result line, in order."""
+        # Arrange
+        mock_buy_sweet.side_effect = lambda name, quantity: f"bought {quantity} {name}"
+
+        # Act
+        result = buy_sweets.invoke(
+            {
+                "items": [
+                    {"sweet_name": "Gulab Jamun", "quantity": 2},
+                    {"sweet_name": "Rasgulla", "quantity": 3},
+                ]
+            }
+        )
+
+        # Assert
+        assert result.splitlines() == [
+            "- Gulab Jamun x2: bought 2 Gulab Jamun",
+            "- Rasgulla x3: bought 3 Rasgulla",
+        ]
+
+    @pytest.mark.asyncio
+    @patch("tools._abuy_sweet")
+    async def test_buy_sweets_async_runs_items_concurrently(self, mock_abuy_sweet):
+        """Test that the async batch purchases all items at the same time."""
+        # Arrange
+        in_flight = []
+        peak = []
+
+        async def fake_purchase(name, quantity):
+            in_flight.append(name)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(name)
+            return "ok"
+
+        mock_abuy_sweet.side_effect = fake_purchase
+
+        # Act
+        result = await buy_sweets.ainvoke(
+            {
+                "items": [
+                    {"sweet_name": "Gulab Jamun", "quantity": 2},
+                    {"sweet_name": "Rasgulla", "quantity": 3},
+                    {"sweet_name": "Barfi", "quantity": 1},
+                ]
+            }
+        )
+
+        # Assert
+        assert max(peak) == 3
+        assert len(result.splitlines()) == 3
+
 
 class TestGetAvailableSweets:
     """Basic tests for get_available_sweets tool."""
@@ -79,3 +216,131 @@ class TestGetAvailableSweets:
 
         # Assert
         assert result == "No sweets are currently available in our inventory."
+
+    @pytest.mark.asyncio
+    @patch("tools.aget_all_sweets", new_callable=AsyncMock)
+    async def test_get_available_sweets_async(
+        self, mock_aget_all_sweets, sample_sweets_data
+    ):
+        """Test the async tool path reads inventory without blocking."""
+        # Arrange
+        mock_aget_all_sweets.return_value = sample_sweets_data
+
+        # Act
+        result = await get_available_sweets.ainvoke({})
+
+        # Assert
+        assert "Gulab Jamun: ₹25.50" in result
+
+
+class TestSearchSweets:
+    """Basic tests for search_sweets tool."""
+
+    @patch("tools.find_sweets")
+    def test_search_sweets_passes_filters(self, mock_find_sweets, sample_sweets_data):
+        """Test that the model's filters reach the database query."""
+        # Arrange
+        mock_find_sweets.return_value = sample_sweets_data[1:]
+
+        # Act
+        result = search_sweets.invoke({"max_price": 22, "sort_by": "price"})
+
+        # Assert
+        assert "Rasgulla: ₹20.00" in result
+        assert "Gulab Jamun" not in result
+        kwargs = mock_find_sweets.call_args.kwargs
+        assert kwargs["max_price"] == 22
+        assert kwargs["sort_by"] == "price"
+        assert kwargs["in_stock_only"] is True
+
+    @patch("tools.find_sweets", return_value=[])
+    def test_search_sweets_caps_limit(self, mock_find_sweets):
+        """Test that a search can't return more than SEARCH_MAX_RESULTS sweets."""
+        # Act
+        result = search_sweets.invoke({"limit": 10_000})
+
+        # Assert
+        assert result == "No sweets in our inventory match that search."
+        assert mock_find_sweets.call_args.kwargs["limit"] == SEARCH_MAX_RESULTS
+
+    @pytest.mark.asyncio
+    @patch("tools.afind_sweets", new_callable=AsyncMock)
+    async def test_search_sweets_async(self, mock_afind_sweets, sample_sweets_data):
+        """Test the async tool path queries MongoDB without blocking."""
+        # Arrange
+        mock_afind_sweets.return_value = sample_sweets_data[:1]
+
+        # Act
+        result = await search_sweets.ainvoke({"name": "jamun"})
+
+        # Assert
+        assert "Gulab Jamun: ₹25.50" in result
+
+
+class TestToolTimeout:
+    """Basic tests for per-tool timeouts."""
+
+    @staticmethod
+    def _slow_tool():
+        def slow() -> str:
+            """Takes too long."""
+            time.sleep(0.5)
+            return "done"
+
+        async def aslow() -> str:
+            await asyncio.sleep(0.5)
+            return "done"
+
+        return StructuredTool.from_function(func=slow, coroutine=aslow, name="slow")
+
+    def test_sync_call_times_out(self):
+        """Test that a slow sync tool returns a timeout error instead of hanging."""
+        # Arrange
+        tool = with_timeout(self._slow_tool(), seconds=0.05)
+
+        # Act
+        result = tool.invoke({})
+
+        # Assert
+        assert result == "Error: slow timed out after 0.05 seconds. Please try again."
+
+    @pytest.mark.asyncio
+    async def test_async_call_times_out(self):
+        """Test that a slow async tool is cancelled after the timeout."""
+        # Arrange
+        tool = with_timeout(self._slow_tool(), seconds=0.05)
+
+        # Act
+        result = await tool.ainvoke({})
+
+        # Assert
+        assert "timed out" in result
+        assert tool.name == "slow"
+
+    @pytest.mark.asyncio
+    async def test_timed_out_purchase_reports_unknown_outcome(self):
+        """Test that a slow purchase isn't cut off and the agent isn't told to retry."""
+        # Arrange
+        finished = asyncio.Event()
+
+        async def abuy() -> str:
+            await asyncio.sleep(0.1)
+            finished.set()
+            return "Successfully purchased 2 of Ladoo."
+
+        purchase = StructuredTool.from_function(
+            func=lambda: "unused",
+            coroutine=abuy,
+            name="buy_sweet",
+            description="Buys a sweet.",
+        )
+        tool = with_timeout(purchase, seconds=0.02, side_effects=True)
+
+        # Act
+        result = await tool.ainvoke({})
+        await asyncio.wait_for(finished.wait(), 1)
+
+        # Assert
+        assert "outcome is unknown" in result
+        assert "check the inventory before trying again" in result
+        assert "Please try again" not in result
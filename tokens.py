@@ -0,0 +1,43 @@
+import os
+from functools import lru_cache
+from typing import Sequence
+from langchain_core.messages import BaseMessage
+
+# Model whose tokenizer is used for budgets and measurements
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o")
+
+# Per-message overhead OpenAI adds for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Loads the tiktoken encoding, or None if it can't be loaded (e.g. offline)."""
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens in a string with tiktoken, approximating when unavailable."""
+    encoding = _get_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Counts the prompt tokens a list of chat messages will cost."""
+    total = 0
+    for message in messages:
+        content = message.content
+        if not isinstance(content, str):
+            content = str(content)
+        total += count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += count_tokens(tool_call["name"] + str(tool_call["args"]))
+    return total
@@ -1,42 +1,134 @@
-import requests
+import asyncio
+import contextvars
+import functools
 import os
-from langchain_core.tools import tool
-from database import get_all_sweets
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+from database import (
+    get_all_sweets,
+    aget_all_sweets,
+    find_sweets,
+    afind_sweets,
+    find_sweet_id,
+    invalidate_inventory_cache,
+    ainvalidate_inventory_cache,
+)
+from inventory_format import render_inventory, render_listing
+from http_client import abackend_get, abackend_post, backend_get, backend_post
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Your Node.js backend API URL
-API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000")
+# Items of one batch order purchased at the same time
+BATCH_PURCHASE_CONCURRENCY = int(os.getenv("BATCH_PURCHASE_CONCURRENCY", "5"))
+# Seconds a single tool call may run before the agent gets a timeout error
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+# Worker threads shared by sync tool calls running under a timeout
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+# Most sweets a single search_sweets call returns to the model
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "20"))
 
+_tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool"
+)
 
-@tool
-def buy_sweet(sweet_name: str, quantity: int) -> str:
+
+class PurchaseItem(BaseModel):
+    """One line of a multi-item order."""
+
+    sweet_name: str = Field(description="Name of the sweet to buy")
+    quantity: int = Field(description="How many to buy")
+
+
+class SweetSearch(BaseModel):
+    """Filters for looking up part of the inventory."""
+
+    name: Optional[str] = Field(
+        default=None, description="Part of the sweet's name, e.g. 'jamun'"
+    )
+    category: Optional[str] = Field(default=None, description="Exact category")
+    min_price: Optional[float] = Field(default=None, description="Lowest price in INR")
+    max_price: Optional[float] = Field(default=None, description="Highest price in INR")
+    in_stock_only: bool = Field(default=True, description="Skip sold-out sweets")
+    sort_by: Optional[Literal["price", "quantity", "name"]] = Field(
+        default=None, description="Field to order the results by"
+    )
+    descending: bool = Field(default=False, description="Largest values first")
+    limit: int = Field(
+        default=SEARCH_MAX_RESULTS,
+        description=f"Number of sweets to return (at most {SEARCH_MAX_RESULTS})",
+    )
+
+
+def _search_result(search_response, sweet_name: str):
+    """Returns (sweet_id, error) from a backend /search response."""
+    if search_response.status_code != 200 or not search_response.json():
+        return None, f"Error: Could not find a sweet named '{sweet_name}'."
+
+    sweets = search_response.json()
+    if len(sweets) > 1:
+        return (
+            None,
+            f"Error: Found multiple sweets matching '{sweet_name}'. Please be more specific.",
+        )
+
+    return sweets[0]["_id"], None
+
+
+def _buy_sweet(sweet_name: str, quantity: int) -> str:
     """
     Buys a specified quantity of a single sweet.
     First finds the sweet by name to get its ID, then calls the purchase endpoint.
     """
     try:
-        # Find the sweet by name to get its ID
-        search_response = requests.get(
-            f"{API_BASE_URL}/search", params={"name": sweet_name}
+        # Resolve the ID from the inventory we already loaded, and only ask
+        # the backend to search when the local index misses
+        sweet_id = find_sweet_id(sweet_name)
+        if sweet_id is None:
+            search_response = backend_get("/search", params={"name": sweet_name})
+            sweet_id, error = _search_result(search_response, sweet_name)
+            if error:
+                return error
+
+        # Call the purchase endpoint with the ID and quantity
+        purchase_response = backend_post(
+            f"/purchase/{sweet_id}", json={"quantity": quantity}
         )
-        if search_response.status_code != 200 or not search_response.json():
-            return f"Error: Could not find a sweet named '{sweet_name}'."
 
-        sweets = search_response.json()
-        if len(sweets) > 1:
-            return f"Error: Found multiple sweets matching '{sweet_name}'. Please be more specific."
+        if purchase_response.status_code == 200:
+            # Stock changed, so the next inventory read must hit MongoDB
+            invalidate_inventory_cache()
+            return f"Successfully purchased {quantity} of {sweet_name}."
+        else:
+            # Pass the error message from the backend API
+            return f"Failed to purchase: {purchase_response.json().get('message', 'Unknown error')}"
 
-        sweet_id = sweets[0]["_id"]
+    except Exception as e:
+        return f"An unexpected error occurred: {str(e)}"
+
+
+async def _abuy_sweet(sweet_name: str, quantity: int) -> str:
+    """Async variant of buy_sweet used when the graph runs via ainvoke."""
+    try:
+        sweet_id = find_sweet_id(sweet_name)
+        if sweet_id is None:
+            search_response = await abackend_get("/search", params={"name": sweet_name})
+            sweet_id, error = _search_result(search_response, sweet_name)
+            if error:
+                return error
 
         # Call the purchase endpoint with the ID and quantity
-        purchase_response = requests.post(
-            f"{API_BASE_URL}/purchase/{sweet_id}", json={"quantity": quantity}
+        purchase_response = await abackend_post(
+            f"/purchase/{sweet_id}", json={"quantity": quantity}
         )
 
         if purchase_response.status_code == 200:
+            # Stock changed, so the next inventory read must hit MongoDB
+            await ainvalidate_inventory_cache()
             return f"Successfully purchased {quantity} of {sweet_name}."
         else:
             # Pass the error message from the backend API
@@ -46,36 +138,222 @@ def buy_sweet(sweet_name: str, quantity: int) -> str:
         return f"An unexpected error occurred: {str(e)}"
 
 
-@tool
-def get_available_sweets() -> str:
+def _format_batch(items, results) -> str:
+    """One result line per ordered item, in order."""
+    return "\n".join(
+        f"- {item.sweet_name} x{item.quantity}: {result}"
+        for item, result in zip(items, results)
+    )
+
+
+def _buy_sweets(items: List[PurchaseItem]) -> str:
+    """
+    Buys several sweets in one order, e.g. "2 gulab jamun and 3 rasgulla".
+    Each item is purchased independently and reported on its own line.
+    """
+    if not items:
+        return "Error: No items to purchase."
+
+    with ThreadPoolExecutor(max_workers=BATCH_PURCHASE_CONCURRENCY) as executor:
+        results = list(
+            executor.map(lambda item: _buy_sweet(item.sweet_name, item.quantity), items)
+        )
+    return _format_batch(items, results)
+
+
+async def _abuy_sweets(items: List[PurchaseItem]) -> str:
+    """Async variant of buy_sweets used when the graph runs via ainvoke."""
+    if not items:
+        return "Error: No items to purchase."
+
+    semaphore = asyncio.Semaphore(BATCH_PURCHASE_CONCURRENCY)
+
+    async def purchase(item: PurchaseItem) -> str:
+        async with semaphore:
+            return await _abuy_sweet(item.sweet_name, item.quantity)
+
+    results = await asyncio.gather(*(purchase(item) for item in items))
+    return _format_batch(items, results)
+
+
+def _inventory_snapshot(config: Optional[RunnableConfig]):
+    """The per-turn dict the chatbot passes for inventory diffs, if any."""
+    return ((config or {}).get("configurable") or {}).get("inventory_snapshot")
+
+
+def _get_available_sweets(config: RunnableConfig = None) -> str:
     """
     Gets the list of all available sweets currently in the database inventory.
     Use this when customers ask about what items are available or what you have in stock.
     """
     try:
-        sweets = get_all_sweets()
-        if not sweets:
-            return "No sweets are currently available in our inventory."
-
-        # Format the sweets list nicely
-        sweet_list = []
-        for sweet in sweets:
-            name = sweet.get("name", "Unknown")
-            price = sweet.get("price", "N/A")
-            quantity = sweet.get("quantity", 0)
-
-            # Format price with INR symbol
-            if price != "N/A":
-                try:
-                    price_formatted = f"₹{float(price):.2f}"
-                except (ValueError, TypeError):
-                    price_formatted = f"₹{price}"
-            else:
-                price_formatted = "Price not available"
-
-            sweet_list.append(f"- {name}: {price_formatted} (Stock: {quantity})")
-
-        return "Here are the sweets currently available:\n" + "\n".join(sweet_list)
+        return render_listing(get_all_sweets(), _inventory_snapshot(config))
+
+    except Exception as e:
+        return f"Sorry, I couldn't retrieve the current inventory: {str(e)}"
+
+
+async def _aget_available_sweets(config: RunnableConfig = None) -> str:
+    """Async variant of get_available_sweets used when the graph runs via ainvoke."""
+    try:
+        return render_listing(await aget_all_sweets(), _inventory_snapshot(config))
 
     except Exception as e:
         return f"Sorry, I couldn't retrieve the current inventory: {str(e)}"
+
+
+NO_SEARCH_RESULTS = "No sweets in our inventory match that search."
+
+
+def _search_args(
+    name, category, min_price, max_price, in_stock_only, sort_by, descending, limit
+) -> dict:
+    """find_sweets arguments, with the result count clamped to SEARCH_MAX_RESULTS."""
+    return dict(
+        name=name,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock_only=in_stock_only,
+        sort_by=sort_by,
+        descending=descending,
+        limit=min(limit, SEARCH_MAX_RESULTS) if limit > 0 else SEARCH_MAX_RESULTS,
+    )
+
+
+def _search_sweets(
+    name: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock_only: bool = True,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    limit: int = SEARCH_MAX_RESULTS,
+) -> str:
+    """
+    Finds sweets matching a name, category, price range or stock filter, optionally sorted.
+    Use this for specific questions (e.g. "sweets under ₹30", "cheapest sweet") instead of listing everything.
+    """
+    try:
+        sweets = find_sweets(
+            **_search_args(
+                name,
+                category,
+                min_price,
+                max_price,
+                in_stock_only,
+                sort_by,
+                descending,
+                limit,
+            )
+        )
+        return render_inventory(sweets, empty_message=NO_SEARCH_RESULTS)
+
+    except Exception as e:
+        return f"Sorry, I couldn't search the inventory: {str(e)}"
+
+
+async def _asearch_sweets(
+    name: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock_only: bool = True,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    limit: int = SEARCH_MAX_RESULTS,
+) -> str:
+    """Async variant of search_sweets used when the graph runs via ainvoke."""
+    try:
+        sweets = await afind_sweets(
+            **_search_args(
+                name,
+                category,
+                min_price,
+                max_price,
+                in_stock_only,
+                sort_by,
+                descending,
+                limit,
+            )
+        )
+        return render_inventory(sweets, empty_message=NO_SEARCH_RESULTS)
+
+    except Exception as e:
+        return f"Sorry, I couldn't search the inventory: {str(e)}"
+
+
+# Each tool carries a sync and an async implementation so the same tool list
+# works for both graph.invoke and graph.ainvoke.
+buy_sweet = StructuredTool.from_function(
+    func=_buy_sweet, coroutine=_abuy_sweet, name="buy_sweet"
+)
+buy_sweets = StructuredTool.from_function(
+    func=_buy_sweets, coroutine=_abuy_sweets, name="buy_sweets"
+)
+get_available_sweets = StructuredTool.from_function(
+    func=_get_available_sweets,
+    coroutine=_aget_available_sweets,
+    name="get_available_sweets",
+)
+search_sweets = StructuredTool.from_function(
+    func=_search_sweets,
+    coroutine=_asearch_sweets,
+    name="search_sweets",
+    args_schema=SweetSearch,
+)
+
+
+def with_timeout(
+    tool: StructuredTool,
+    seconds: float = TOOL_TIMEOUT_SECONDS,
+    side_effects: bool = False,
+) -> StructuredTool:
+    """
+    Returns a copy of `tool` whose calls give up after `seconds`.
+    A timed-out call returns an error string like any other tool failure,
+    so the agent can tell the customer instead of hanging the turn.
+    With `side_effects` (purchases) the call may already have reached the
+    backend, so it is left to finish and the agent is told the outcome is
+    unknown rather than invited to retry.
+    """
+    if side_effects:
+        message = (
+            f"Error: {tool.name} timed out after {seconds:g} seconds and may "
+            "still have gone through. The outcome is unknown: check the "
+            "inventory before trying again."
+        )
+    else:
+        message = (
+            f"Error: {tool.name} timed out after {seconds:g} seconds. "
+            "Please try again."
+        )
+    func, coroutine = tool.func, tool.coroutine
+
+    # functools.wraps keeps the signature, so injected arguments like
+    # `config` still reach the wrapped function
+    @functools.wraps(func)
+    def timed_func(*args, **kwargs):
+        # Run in a copy of the caller's context so per-request state
+        # (e.g. Server-Timing spans) follows the call into the worker
+        context = contextvars.copy_context()
+        future = _tool_executor.submit(context.run, func, *args, **kwargs)
+        try:
+            return future.result(timeout=seconds)
+        except FutureTimeoutError:
+            return message
+
+    @functools.wraps(coroutine)
+    async def timed_coroutine(*args, **kwargs):
+        call = coroutine(*args, **kwargs)
+        if side_effects:
+            # Like the sync worker thread, a purchase in flight runs to the
+            # end (and invalidates the inventory cache) after we stop waiting
+            call = asyncio.shield(asyncio.ensure_future(call))
+        try:
+            return await asyncio.wait_for(call, seconds)
+        except asyncio.TimeoutError:
+            return message
+
+    return tool.model_copy(update={"func": timed_func, "coroutine": timed_coroutine})